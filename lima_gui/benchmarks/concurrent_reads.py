@@ -0,0 +1,132 @@
+"""Latency of `GET /chat/{id}` while a large import runs in parallel.
+
+Run with `python -m lima_gui.benchmarks.concurrent_reads`. The app is served
+by uvicorn on a temporary database; reader threads request random chats
+first on an idle server, then while another client uploads a large JSONL
+file to `/import`, and p50/p99 latencies of both phases are reported.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+import uvicorn
+
+
+def _chat_line(i: int, n_messages: int) -> str:
+    messages = [
+        {"role": "user" if j % 2 == 0 else "assistant", "content": f"chat {i} message {j} " * 8}
+        for j in range(n_messages)
+    ]
+    return json.dumps({"name": f"Chat {i}", "tags": [f"group-{i % 10}"], "messages": messages}) + "\n"
+
+
+def _jsonl(n_chats: int, n_messages: int) -> bytes:
+    return "".join(_chat_line(i, n_messages) for i in range(n_chats)).encode("utf-8")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def _measure_reads(base_url: str, n_chats: int, readers: int, until) -> List[float]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def reader(seed: int):
+        rng = random.Random(seed)
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while not until():
+                started = time.perf_counter()
+                response = client.get(f"/chat/{rng.randint(1, n_chats)}")
+                elapsed = time.perf_counter() - started
+                response.raise_for_status()
+                with lock:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def _report(name: str, latencies: List[float], duration: float) -> None:
+    print(
+        f"{name:<16}{len(latencies):>10}{len(latencies) / duration:>12.1f}"
+        f"{_percentile(latencies, 0.5) * 1000:>12.1f}{_percentile(latencies, 0.99) * 1000:>12.1f}"
+        f"{max(latencies, default=0) * 1000:>12.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed-chats", type=int, default=2000, help="Chats present before the benchmark")
+    parser.add_argument("--import-chats", type=int, default=50000, help="Chats in the concurrent import")
+    parser.add_argument("--messages", type=int, default=8, help="Messages per chat")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["CHAT_DB_URL"] = f"sqlite:///{Path(directory) / 'chat.db'}"
+        from lima_gui.main import app
+
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        server_thread = threading.Thread(target=server.run, daemon=True)
+        server_thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        base_url = f"http://127.0.0.1:{port}"
+
+        with httpx.Client(base_url=base_url, timeout=None) as client:
+            seed = _jsonl(args.seed_chats, args.messages)
+            client.post("/import", files={"file": ("seed.jsonl", seed, "application/jsonl")}).raise_for_status()
+
+        print(f"{'phase':<16}{'requests':>10}{'req/s':>12}{'p50 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+
+        deadline = time.perf_counter() + args.idle_seconds
+        idle = _measure_reads(base_url, args.seed_chats, args.readers, lambda: time.perf_counter() > deadline)
+        _report("idle", idle, args.idle_seconds)
+
+        payload = _jsonl(args.import_chats, args.messages)
+        import_done = threading.Event()
+        import_time = []
+
+        def run_import():
+            started = time.perf_counter()
+            with httpx.Client(base_url=base_url, timeout=None) as client:
+                response = client.post("/import", files={"file": ("big.jsonl", payload, "application/jsonl")})
+                response.raise_for_status()
+            import_time.append(time.perf_counter() - started)
+            import_done.set()
+
+        importer = threading.Thread(target=run_import)
+        importer.start()
+        during = _measure_reads(base_url, args.seed_chats, args.readers, import_done.is_set)
+        importer.join()
+        _report("during import", during, import_time[0])
+        print(f"import of {args.import_chats} chats took {import_time[0]:.1f}s")
+
+        server.should_exit = True
+        server_thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Concurrent read/write throughput of the chat database under each engine profile.
+
+Run with `python -m lima_gui.benchmarks.engine_profiles`. Each profile gets a
+fresh temporary database seeded with chats; reader threads load random chats
+the way `GET /chat/{id}` does while writer threads append messages, and the
+number of completed operations and read latencies are reported.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from lima_gui.models.chat import ChatBase, Message, RoleEnum
+from lima_gui.models.db import ENGINE_PROFILES, create_chat_engine, get_engine_profile
+from lima_gui.services.chat import get_chat
+from lima_gui.services.importer import ChatImporter
+
+
+def _seed_lines(n_chats: int, n_messages: int):
+    for i in range(n_chats):
+        messages = [
+            {"role": "user" if j % 2 == 0 else "assistant", "content": f"chat {i} message {j} " * 8}
+            for j in range(n_messages)
+        ]
+        yield f'{{"name": "Chat {i}", "messages": {json.dumps(messages)}}}'
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_profile(profile_name: str, directory: Path, args) -> Dict[str, float]:
+    profile = get_engine_profile(profile_name)
+    engine = create_chat_engine(f"sqlite:///{directory / f'{profile_name}.db'}", profile)
+    # Keep the cost of echo (formatting and emitting records) without flooding the terminal.
+    for handler in logging.getLogger("sqlalchemy.engine.Engine").handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(open(os.devnull, "w"))
+
+    ChatBase.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        ChatImporter(db).import_lines(_seed_lines(args.chats, args.messages))
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    read_latencies: List[float] = []
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+
+    def reader(seed: int):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with Session() as db:
+                    get_chat(rng.randint(1, args.chats), db)
+            except OperationalError:
+                with lock:
+                    counts["errors"] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                counts["reads"] += 1
+                read_latencies.append(elapsed)
+
+    def writer(seed: int):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            try:
+                with Session() as db:
+                    db.add(Message(
+                        chat_id=rng.randint(1, args.chats),
+                        role=RoleEnum.user,
+                        content="benchmark message " * 8,
+                        position=args.messages + rng.randint(1, 10 ** 6),
+                    ))
+                    db.commit()
+            except OperationalError:
+                with lock:
+                    counts["errors"] += 1
+                continue
+            with lock:
+                counts["writes"] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {
+        "reads/s": counts["reads"] / args.duration,
+        "writes/s": counts["writes"] / args.duration,
+        "errors": counts["errors"],
+        "read p50 ms": _percentile(read_latencies, 0.5) * 1000,
+        "read p99 ms": _percentile(read_latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=sorted(ENGINE_PROFILES), choices=sorted(ENGINE_PROFILES))
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=10, help="Messages per seeded chat")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per profile")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for profile_name in args.profiles:
+            results[profile_name] = run_profile(profile_name, Path(directory), args)
+
+    columns = list(next(iter(results.values())))
+    print(f"{'profile':<12}" + "".join(f"{column:>14}" for column in columns))
+    for profile_name, result in results.items():
+        print(f"{profile_name:<12}" + "".join(f"{result[column]:>14.1f}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Bulk import throughput for chats of different lengths.
+
+Run with `python -m lima_gui.benchmarks.import_throughput`. Imports generated
+JSONL chats into a temporary file database with the production engine
+profile, once per chat length, and reports chats and messages per second.
+Parsing alone is timed too, as it bounds what the database side can gain.
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from lima_gui.models.db import PRODUCTION_PROFILE, create_chat_engine, get_engine_profile
+from lima_gui.models.migrations import migrate
+from lima_gui.services.importer import DEFAULT_BATCH_SIZE, ChatImporter, parse_chat_line
+
+
+def _chat_lines(n_chats: int, n_messages: int):
+    lines = []
+    for i in range(n_chats):
+        messages = [
+            {"role": "user" if j % 2 == 0 else "assistant", "content": f"chat {i} message {j}, a few more words of text"}
+            for j in range(n_messages)
+        ]
+        lines.append(json.dumps({"name": f"Chat {i}", "tags": [f"tag-{i % 100}"], "messages": messages}))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=50000)
+    parser.add_argument("--messages", type=int, nargs="+", default=[2, 6], help="Messages per chat")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8}{'parse chats/s':>16}{'import chats/s':>16}{'messages/s':>14}")
+    for n_messages in args.messages:
+        lines = _chat_lines(args.chats, n_messages)
+
+        started = time.perf_counter()
+        for line in lines:
+            parse_chat_line(line)
+        parse_rate = args.chats / (time.perf_counter() - started)
+
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_chat_engine(
+                f"sqlite:///{Path(directory) / 'chat.db'}", get_engine_profile(PRODUCTION_PROFILE)
+            )
+            migrate(engine)
+            started = time.perf_counter()
+            with Session(engine) as db:
+                result = ChatImporter(db, batch_size=args.batch_size).import_lines(lines)
+            elapsed = time.perf_counter() - started
+            engine.dispose()
+
+        assert result.chats_added == args.chats
+        print(
+            f"{n_messages:>8}{parse_rate:>16.0f}{args.chats / elapsed:>16.0f}"
+            f"{args.chats * n_messages / elapsed:>14.0f}",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
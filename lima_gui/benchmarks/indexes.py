@@ -0,0 +1,112 @@
+"""Query timings before and after the foreign key index migration.
+
+Run with `python -m lima_gui.benchmarks.indexes`. Builds a temporary database
+with about a million messages, drops the indexes added by migration 2 to
+get the pre-migration schema, times the hot read paths, applies the
+migration and times them again.
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from lima_gui.models.chat import Message
+from lima_gui.models.migrations import migrate, schema_migrations
+from lima_gui.services.chat import get_chat, list_chats
+from lima_gui.services.importer import ChatImporter
+
+
+INDEXES = [
+    "ix_messages_chat_id_position",
+    "ix_tool_calls_message_id",
+    "ix_chat_tag_chat_id_tag_name",
+    "ix_chat_tag_tag_name_chat_id",
+]
+
+
+def _chat_lines(n_chats: int, n_messages: int):
+    for i in range(n_chats):
+        messages = [
+            {"role": "user" if j % 2 == 0 else "assistant", "content": f"chat {i} message {j}"}
+            for j in range(n_messages)
+        ]
+        messages[-1]["function_call"] = {"name": "search", "arguments": "{}"}
+        yield json.dumps({"name": f"Chat {i}", "tags": [f"tag-{i % 1000}"], "messages": messages})
+
+
+def _time(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def _measure(engine, args) -> dict:
+    rng = random.Random(0)
+    with Session(engine) as db:
+        def load_chat():
+            get_chat(rng.randint(1, args.chats), db)
+            db.expunge_all()
+
+        def last_message():
+            db.execute(
+                select(Message.position).where(Message.chat_id == rng.randint(1, args.chats))
+                .order_by(Message.position.desc()).limit(1)
+            ).first()
+
+        def tool_calls():
+            db.execute(text("SELECT * FROM tool_calls WHERE message_id = :id"), {"id": rng.randint(1, args.chats)}).all()
+
+        def tag_filter():
+            # Without an index every chat checked scans all of chat_tag, so
+            # fetch a single match: the first page is already slow enough.
+            list_chats(db, tag=f"tag-{rng.randint(0, 999)}", limit=1)
+
+        return {
+            "GET /chat/{id}": _time(load_chat, args.repeat),
+            "last message": _time(last_message, args.repeat),
+            "tool calls": _time(tool_calls, args.repeat),
+            "tag filter": _time(tag_filter, max(1, args.repeat // 10)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=10, help="Messages per chat")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs of each query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'chat.db'}")
+        migrate(engine)
+        started = time.perf_counter()
+        with Session(engine) as db:
+            ChatImporter(db).import_lines(_chat_lines(args.chats, args.messages))
+        print(f"Imported {args.chats} chats, {args.chats * args.messages} messages in {time.perf_counter() - started:.1f}s", flush=True)
+
+        with engine.begin() as connection:
+            for index in INDEXES:
+                connection.execute(text(f"DROP INDEX {index}"))
+            connection.execute(schema_migrations.delete().where(schema_migrations.c.version >= 2))
+
+        before = _measure(engine, args)
+        started = time.perf_counter()
+        migrate(engine)
+        migration_time = time.perf_counter() - started
+        after = _measure(engine, args)
+
+        print(f"{'query':<16}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+        for name in before:
+            print(f"{name:<16}{before[name]:>12.2f}{after[name]:>12.2f}{before[name] / after[name]:>9.0f}x")
+        print(f"Migration took {migration_time:.1f}s")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Sharded export throughput as the worker pool grows.
+
+Run with `python -m lima_gui.benchmarks.sharded_export`. Imports generated
+chats into a temporary file database with the production engine profile,
+then exports them once per worker count and reports chats and
+uncompressed megabytes per second. Workers serialize and compress; the
+reader only fetches raw rows, so throughput should grow with the pool
+until the reader or the cores run out.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from lima_gui.models.db import PRODUCTION_PROFILE, create_chat_engine, get_engine_profile
+from lima_gui.models.migrations import migrate
+from lima_gui.services.importer import ChatImporter
+from lima_gui.services.sharded_export import ShardedExportOptions, export_shards
+
+
+def _chat_lines(n_chats: int, n_messages: int):
+    lines = []
+    for i in range(n_chats):
+        messages = [
+            {"role": "user" if j % 2 == 0 else "assistant", "content": f"chat {i} message {j}, " * 20}
+            for j in range(n_messages)
+        ]
+        lines.append(json.dumps({"name": f"Chat {i}", "tags": [f"tag-{i % 100}"], "messages": messages}))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=50000)
+    parser.add_argument("--messages", type=int, default=6, help="Messages per chat")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default="gzip")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores")
+    print(f"{'workers':>8}{'chats/s':>12}{'MB/s':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_chat_engine(f"sqlite:///{Path(directory) / 'chat.db'}", get_engine_profile(PRODUCTION_PROFILE))
+        migrate(engine)
+        with Session(engine) as db:
+            ChatImporter(db).import_lines(_chat_lines(args.chats, args.messages))
+
+        for workers in args.workers:
+            options = ShardedExportOptions(
+                compression=args.compression, chunk_size=args.chunk_size, workers=workers
+            )
+            started = time.perf_counter()
+            manifest = export_shards(engine, str(Path(directory) / f"out-{workers}"), options)
+            elapsed = time.perf_counter() - started
+
+            assert manifest.chats == args.chats
+            uncompressed = sum(shard.uncompressed_bytes for shard in manifest.shards)
+            print(f"{workers:>8}{args.chats / elapsed:>12.0f}{uncompressed / elapsed / 1e6:>10.1f}", flush=True)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# Token counts in the tests are whitespace-based, independent of the
+# tokenizer configured (or cached) on the machine running them.
+os.environ.setdefault("LIMA_GUI_TOKENIZER", "whitespace")
+# Each app started by a test gets an empty in-memory completion cache.
+os.environ.setdefault("COMPLETION_CACHE_DB_URL", "sqlite://")
+# Apps started by tests (and their startup recount) use a throwaway chat
+# database, never the one in the user's app data directory.
+os.environ.setdefault("CHAT_DB_URL", f"sqlite:///{tempfile.mkdtemp(prefix='lima-gui-tests-')}/chat.db")
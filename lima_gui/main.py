@@ -1,8 +1,13 @@
 from contextlib import asynccontextmanager
+import anyio.to_thread
 from fastapi import FastAPI, HTTPException
-from lima_gui.routers import main_router, chat_router, settings_router
-from lima_gui.models.db import init_databases
+from lima_gui.routers import main_router, chat_router, settings_router, jobs_router
+from lima_gui.models.db import get_chat_engine, get_engine_profile, init_databases
 from lima_gui.config import ConfigManager
+from lima_gui.services.completion_cache import open_completion_cache
+from lima_gui.services.generation import OpenAIClientPool
+from lima_gui.services.retokenize import retokenize_if_stale
+from lima_gui.services.tokenizer import get_token_counter
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -13,13 +18,34 @@ async def lifespan(app: FastAPI):
 
     # Initialize databases
     init_databases()
+
+    # Completion API clients, shared so their connections are reused
+    app.state.openai_clients = OpenAIClientPool()
+    # Completions already paid for, answered again without calling the API
+    app.state.completion_cache = open_completion_cache()
+
+    # Load the tokenizer once per process, before the first request needs it
+    get_token_counter()
+    # Counts stored by a different tokenizer on a previous run are recounted
+    await anyio.to_thread.run_sync(retokenize_if_stale, get_chat_engine())
+
+    # Database endpoints are sync and run in anyio's worker threads; bound
+    # them by the connection pool so a thread never waits for a connection.
+    profile = get_engine_profile()
+    if profile.pool_size is not None:
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        limiter.total_tokens = profile.pool_size + (profile.max_overflow or 0)
     
     # Log application startup
     from loguru import logger
     logger.info("LIMA-GUI application started")
     
     yield
-    
+
+    await app.state.openai_clients.aclose()
+    if app.state.completion_cache is not None:
+        app.state.completion_cache.close()
+
     # Log application shutdown
     logger.info("LIMA-GUI application stopped")
 
@@ -35,6 +61,7 @@ app.add_middleware(
 app.include_router(main_router)
 app.include_router(chat_router)
 app.include_router(settings_router)
+app.include_router(jobs_router)
 
 # from fastapi.staticfiles import StaticFiles
 # from fastapi.responses import FileResponse
@@ -1,3 +1,3 @@
 from .db import get_chat_db
 
-from .chat import Chat, Message, Tool, ToolCall, init_chat, Tag
+from .chat import Chat, Message, Tool, ToolCall, init_chat, Tag, TokenCacheEntry
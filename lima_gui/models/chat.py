@@ -1,6 +1,7 @@
 from sqlalchemy import (
-    create_engine, Column, Integer, String, 
-    ForeignKey, Enum, Table, Text, UniqueConstraint, PrimaryKeyConstraint
+    create_engine, Column, Integer, String, DateTime, DDL, LargeBinary,
+    ForeignKey, Enum, FetchedValue, Table, Text, UniqueConstraint, PrimaryKeyConstraint, Index,
+    event, func
 )
 
 from sqlalchemy.ext.declarative import declarative_base
@@ -22,8 +23,11 @@ class RoleEnum(enum.Enum):
 # Association table for Chat <-> Tag many-to-many relationship
 chat_tag_association = Table(
     "chat_tag", ChatBase.metadata,
-    Column("chat_id", Integer, ForeignKey("chats.id")),
-    Column("tag_name", String, ForeignKey("tags.name"))  # Reference `Tag.name`
+    Column("chat_id", Integer, ForeignKey("chats.id", ondelete="CASCADE")),
+    Column("tag_name", String, ForeignKey("tags.name", ondelete="CASCADE")),  # Reference `Tag.name`
+    # Tags of a chat, and chats with a tag (tag filters)
+    Index("ix_chat_tag_chat_id_tag_name", "chat_id", "tag_name"),
+    Index("ix_chat_tag_tag_name_chat_id", "tag_name", "chat_id"),
 )
 
 # Tag model with `name` as the primary key
@@ -39,22 +43,46 @@ class Chat(ChatBase):
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     language = Column(String, nullable=False)
-    messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
+    # Denormalized aggregates, kept current by the triggers below.
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    token_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_modified = Column(DateTime, server_default=func.current_timestamp())
+    preview = Column(String, nullable=True)  # Start of the first user message
+    # Dataset version of the chat's last change, set by the version triggers.
+    version = Column(Integer, nullable=False, server_default="0", server_onupdate=FetchedValue(), index=True)
+    messages = relationship(
+        "Message", back_populates="chat", cascade="all, delete-orphan", order_by="Message.position"
+    )
     tools = relationship("Tool", back_populates="chat", cascade="all, delete-orphan")
     tags = relationship("Tag", secondary=chat_tag_association, backref="chats")
 
 
+# Messages are ordered by `position`, spaced POSITION_GAP apart, so a message
+# can be inserted or moved between two others by writing only its own row.
+POSITION_GAP = 1024
+
+
 class Message(ChatBase):
     __tablename__ = 'messages'
 
     id = Column(Integer, primary_key=True)
-    chat_id = Column(Integer, ForeignKey('chats.id'))
+    chat_id = Column(Integer, ForeignKey('chats.id', ondelete="CASCADE"))
     role = Column(Enum(RoleEnum), nullable=False)
     content = Column(String)
     position = Column(Integer, nullable=False)
+    token_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Tokenizer and content hash `token_count` was computed for.
+    tokenizer = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True)
     chat = relationship("Chat", back_populates="messages")
     tool_calls = relationship("ToolCall", back_populates="message", cascade="all, delete-orphan")
 
+    # Ordered per-chat access, also serves lookups by chat_id alone and the
+    # aggregate triggers.
+    __table_args__ = (
+        Index("ix_messages_chat_id_position", "chat_id", "position"),
+    )
+
 
 class ToolCall(ChatBase):
     __tablename__ = 'tool_calls'
@@ -63,14 +91,22 @@ class ToolCall(ChatBase):
     tool_call_id = Column(Integer, nullable=True)  # External ID for ToolCall, not primary key
     name = Column(String, nullable=False)
     arguments = Column(Text, nullable=True)
-    message_id = Column(Integer, ForeignKey('messages.id'))
+    message_id = Column(Integer, ForeignKey('messages.id', ondelete="CASCADE"), index=True)
     message = relationship("Message", back_populates="tool_calls")
 
 
+class TokenCacheEntry(ChatBase):
+    __tablename__ = 'token_cache'
+
+    tokenizer = Column(String, primary_key=True)
+    content_hash = Column(String, primary_key=True)
+    token_count = Column(Integer, nullable=False)
+
+
 class Tool(ChatBase):
     __tablename__ = 'tools'
 
-    chat_id = Column(Integer, ForeignKey('chats.id'))
+    chat_id = Column(Integer, ForeignKey('chats.id', ondelete="CASCADE"))
     name = Column(String, nullable=False)
     description = Column(String)
     parameters = Column(JSON, nullable=True)
@@ -87,11 +123,383 @@ class Tool(ChatBase):
         if value:
             try:
                 validate(instance={}, schema=value)  # Basic validation with an empty instance
-            except jsonschema.exceptions.ValidationError as e:
+            except (jsonschema.exceptions.SchemaError, jsonschema.exceptions.ValidationError) as e:
                 raise ValueError(f"Invalid JSON schema: {e.message}")
         return value
 
 
+PREVIEW_LENGTH = 200
+
+_PREVIEW_SQL = (
+    "(SELECT substr(content, 1, {length}) FROM messages "
+    "WHERE chat_id = {{chat_id}} AND role = 'user' ORDER BY position, id LIMIT 1)"
+).format(length=PREVIEW_LENGTH)
+
+_TOUCH_CHAT_SQL = "UPDATE chats SET last_modified = CURRENT_TIMESTAMP WHERE id = {chat_id};"
+
+# Set while the bulk importer writes a batch (see `lima_gui.services.importer`).
+# The per-row INSERT triggers below skip their work while it is set, and the
+# importer does the same work set-based once per batch. It is only ever set
+# inside the importer's own write transaction, so other connections always
+# see it cleared.
+bulk_import_state = Table(
+    "bulk_import_state", ChatBase.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("active", Integer, nullable=False, server_default="0"),
+)
+
+NOT_BULK_IMPORT = "(SELECT active FROM bulk_import_state WHERE id = 1) IS NOT 1"
+
+# Triggers guarded by NOT_BULK_IMPORT; recreated by the migration that added the guard.
+BULK_IMPORT_GUARDED_TRIGGERS = [
+    "messages_aggregate_insert",
+    "tool_calls_touch_insert",
+    "tools_touch_insert",
+    "chat_tag_touch_insert",
+    "chats_version_insert",
+    "chats_stats_insert",
+    "chat_tag_stats_insert",
+    "messages_stats_insert",
+    "messages_search_insert",
+]
+
+# Triggers maintaining the aggregate columns of `chats`. They run inside the
+# statement that mutates the child rows, so the aggregates are always updated
+# in the same transaction, whether the write comes from the ORM or from Core
+# bulk statements.
+CHAT_AGGREGATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_aggregate_insert AFTER INSERT ON messages WHEN {NOT_BULK_IMPORT} BEGIN
+        UPDATE chats SET
+            message_count = message_count + 1,
+            token_count = token_count + COALESCE(NEW.token_count, 0),
+            last_modified = CURRENT_TIMESTAMP
+        WHERE id = NEW.chat_id;
+        UPDATE chats SET preview = {_PREVIEW_SQL.format(chat_id="NEW.chat_id")}
+        WHERE id = NEW.chat_id AND NEW.role = 'user';
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_aggregate_delete AFTER DELETE ON messages BEGIN
+        UPDATE chats SET
+            message_count = message_count - 1,
+            token_count = token_count - COALESCE(OLD.token_count, 0),
+            last_modified = CURRENT_TIMESTAMP
+        WHERE id = OLD.chat_id;
+        UPDATE chats SET preview = {_PREVIEW_SQL.format(chat_id="OLD.chat_id")}
+        WHERE id = OLD.chat_id AND OLD.role = 'user';
+    END
+    """,
+    # Replaced by the narrower update triggers below.
+    "DROP TRIGGER IF EXISTS messages_aggregate_update",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_aggregate_move
+    AFTER UPDATE OF chat_id ON messages WHEN OLD.chat_id IS NOT NEW.chat_id BEGIN
+        UPDATE chats SET
+            message_count = message_count - 1,
+            token_count = token_count - COALESCE(OLD.token_count, 0),
+            last_modified = CURRENT_TIMESTAMP
+        WHERE id = OLD.chat_id;
+        UPDATE chats SET
+            message_count = message_count + 1,
+            token_count = token_count + COALESCE(NEW.token_count, 0),
+            last_modified = CURRENT_TIMESTAMP
+        WHERE id = NEW.chat_id;
+        UPDATE chats SET preview = {_PREVIEW_SQL.format(chat_id="OLD.chat_id")}
+        WHERE id = OLD.chat_id AND OLD.role = 'user';
+        UPDATE chats SET preview = {_PREVIEW_SQL.format(chat_id="NEW.chat_id")}
+        WHERE id = NEW.chat_id AND NEW.role = 'user';
+    END
+    """,
+    # Token-only updates (e.g. a bulk recount) adjust the total and nothing
+    # else, so they don't count as edits and skip the preview lookup.
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_aggregate_tokens
+    AFTER UPDATE OF token_count ON messages WHEN OLD.chat_id IS NEW.chat_id BEGIN
+        UPDATE chats SET
+            token_count = token_count - COALESCE(OLD.token_count, 0) + COALESCE(NEW.token_count, 0)
+        WHERE id = NEW.chat_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_aggregate_edit
+    AFTER UPDATE OF role, content, position ON messages WHEN OLD.chat_id IS NEW.chat_id BEGIN
+        {_TOUCH_CHAT_SQL.format(chat_id="NEW.chat_id")}
+        UPDATE chats SET preview = {_PREVIEW_SQL.format(chat_id="NEW.chat_id")}
+        WHERE id = NEW.chat_id AND (OLD.role = 'user' OR NEW.role = 'user');
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chats_touch_update AFTER UPDATE OF name, language ON chats BEGIN
+        {_TOUCH_CHAT_SQL.format(chat_id="NEW.id")}
+    END
+    """,
+]
+
+for _operation, _row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+    _when = f"WHEN {NOT_BULK_IMPORT}" if _operation == "INSERT" else ""
+    CHAT_AGGREGATE_TRIGGERS += [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS tool_calls_touch_{_operation.lower()} AFTER {_operation} ON tool_calls {_when} BEGIN
+            {_TOUCH_CHAT_SQL.format(chat_id=f"(SELECT chat_id FROM messages WHERE id = {_row}.message_id)")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS tools_touch_{_operation.lower()} AFTER {_operation} ON tools {_when} BEGIN
+            {_TOUCH_CHAT_SQL.format(chat_id=f"{_row}.chat_id")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS chat_tag_touch_{_operation.lower()} AFTER {_operation} ON chat_tag {_when} BEGIN
+            {_TOUCH_CHAT_SQL.format(chat_id=f"{_row}.chat_id")}
+        END
+        """,
+    ]
+
+CHAT_AGGREGATE_TRIGGERS.insert(0, "INSERT OR IGNORE INTO bulk_import_state (id, active) VALUES (1, 0)")
+
+for _trigger in CHAT_AGGREGATE_TRIGGERS:
+    event.listen(ChatBase.metadata, "after_create", DDL(_trigger).execute_if(dialect="sqlite"))
+
+
+# Single-row counter bumped by every change to any chat (including adding
+# and deleting chats), so that the chat list can be revalidated with one
+# lookup. A chat's `version` is the counter value of its last change: it is
+# never reused, even when SQLite reuses the id of a deleted chat.
+dataset_version = Table(
+    "dataset_version", ChatBase.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+)
+
+_BUMP_VERSION_SQL = """
+    UPDATE dataset_version SET version = version + 1 WHERE id = 1;
+    UPDATE chats SET version = (SELECT version FROM dataset_version WHERE id = 1) WHERE id = {chat_id};
+"""
+
+# Every write to a chat's messages, tool calls, tools or tags updates its
+# `chats` row (see the aggregate triggers above), so watching `chats` alone
+# catches all of them. The WHEN clause skips the trigger's own update.
+CHAT_VERSION_DDL = [
+    "INSERT OR IGNORE INTO dataset_version (id, version) VALUES (1, 0)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chats_version_insert AFTER INSERT ON chats WHEN {NOT_BULK_IMPORT} BEGIN
+        {_BUMP_VERSION_SQL.format(chat_id="NEW.id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chats_version_update
+    AFTER UPDATE ON chats WHEN NEW.version IS OLD.version BEGIN
+        {_BUMP_VERSION_SQL.format(chat_id="NEW.id")}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chats_version_delete AFTER DELETE ON chats BEGIN
+        UPDATE dataset_version SET version = version + 1 WHERE id = 1;
+    END
+    """,
+]
+
+for _statement in CHAT_VERSION_DDL:
+    event.listen(ChatBase.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+# Dataset statistics, kept current by triggers so that they can be read
+# without scanning chats or messages. `chat_stats` counts chats (and sums
+# their messages and tokens) per token-length and message-count bucket, per
+# language and per tag; every chat has one language, so the language rows
+# add up to the whole dataset. `role_stats` sums messages per role.
+TOKEN_BUCKETS = [0, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768]
+MESSAGE_BUCKETS = [0, 2, 4, 8, 16, 32, 64, 128, 256]
+
+chat_stats = Table(
+    "chat_stats", ChatBase.metadata,
+    Column("dimension", String, primary_key=True),  # "language" or "tag"
+    Column("value", String, primary_key=True),  # Language or tag name
+    Column("token_bucket", Integer, primary_key=True),  # Index into TOKEN_BUCKETS
+    Column("message_bucket", Integer, primary_key=True),  # Index into MESSAGE_BUCKETS
+    Column("chats", Integer, nullable=False, server_default="0"),
+    Column("messages", Integer, nullable=False, server_default="0"),
+    Column("tokens", Integer, nullable=False, server_default="0"),
+)
+
+role_stats = Table(
+    "role_stats", ChatBase.metadata,
+    Column("role", String, primary_key=True),
+    Column("messages", Integer, nullable=False, server_default="0"),
+    Column("tokens", Integer, nullable=False, server_default="0"),
+)
+
+
+def bucket_sql(value: str, bounds) -> str:
+    """SQL expression of the index of the bucket `value` falls in, given ascending lower bounds."""
+    cases = " ".join(f"WHEN {value} >= {bound} THEN {index}" for index, bound in reversed(list(enumerate(bounds))))
+    return f"(CASE {cases} ELSE 0 END)"
+
+
+def _stat_keys(chat: str) -> str:
+    return (
+        f"(SELECT 'language' AS dimension, {chat}.language AS value "
+        f"UNION ALL SELECT 'tag', tag_name FROM chat_tag WHERE chat_id = {chat}.id) AS stat_keys"
+    )
+
+
+def _add_chat_stats(sign: int, chat: str, keys: str) -> str:
+    # Adds (sign 1) or removes (sign -1) the contribution of `chat` for every key.
+    return f"""
+        INSERT INTO chat_stats (dimension, value, token_bucket, message_bucket, chats, messages, tokens)
+        SELECT stat_keys.dimension, stat_keys.value,
+               {bucket_sql(f"{chat}.token_count", TOKEN_BUCKETS)}, {bucket_sql(f"{chat}.message_count", MESSAGE_BUCKETS)},
+               {sign}, {sign} * {chat}.message_count, {sign} * {chat}.token_count
+        FROM {keys} WHERE true
+        ON CONFLICT (dimension, value, token_bucket, message_bucket) DO UPDATE SET
+            chats = chats + excluded.chats,
+            messages = messages + excluded.messages,
+            tokens = tokens + excluded.tokens;
+    """
+
+
+def _add_role_stats(sign: int, message: str) -> str:
+    return f"""
+        INSERT INTO role_stats (role, messages, tokens)
+        VALUES ({message}.role, {sign}, {sign} * COALESCE({message}.token_count, 0))
+        ON CONFLICT (role) DO UPDATE SET
+            messages = messages + excluded.messages,
+            tokens = tokens + excluded.tokens;
+    """
+
+
+_TAG_KEY = "(SELECT 'tag' AS dimension, {row}.tag_name AS value) AS stat_keys JOIN chats ON chats.id = {row}.chat_id"
+
+# Message writes reach the stats through the chats aggregate columns they
+# update. Chats are removed in a BEFORE trigger: with foreign keys on, the
+# cascade deletes the tag links after the chat row is gone but before its
+# AFTER triggers run, so neither of them would still see the other.
+CHAT_STATS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chats_stats_insert AFTER INSERT ON chats WHEN {NOT_BULK_IMPORT} BEGIN
+        {_add_chat_stats(1, "NEW", _stat_keys("NEW"))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chats_stats_update
+    AFTER UPDATE OF message_count, token_count, language ON chats
+    WHEN OLD.message_count IS NOT NEW.message_count OR OLD.token_count IS NOT NEW.token_count
+        OR OLD.language IS NOT NEW.language BEGIN
+        {_add_chat_stats(-1, "OLD", _stat_keys("OLD"))}
+        {_add_chat_stats(1, "NEW", _stat_keys("NEW"))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chats_stats_delete BEFORE DELETE ON chats BEGIN
+        {_add_chat_stats(-1, "OLD", _stat_keys("OLD"))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chat_tag_stats_insert AFTER INSERT ON chat_tag WHEN {NOT_BULK_IMPORT} BEGIN
+        {_add_chat_stats(1, "chats", _TAG_KEY.format(row="NEW"))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS chat_tag_stats_delete AFTER DELETE ON chat_tag BEGIN
+        {_add_chat_stats(-1, "chats", _TAG_KEY.format(row="OLD"))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_stats_insert AFTER INSERT ON messages WHEN {NOT_BULK_IMPORT} BEGIN
+        {_add_role_stats(1, "NEW")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_stats_delete AFTER DELETE ON messages BEGIN
+        {_add_role_stats(-1, "OLD")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_stats_update AFTER UPDATE OF role, token_count ON messages BEGIN
+        {_add_role_stats(-1, "OLD")}
+        {_add_role_stats(1, "NEW")}
+    END
+    """,
+]
+
+for _trigger in CHAT_STATS_TRIGGERS:
+    event.listen(ChatBase.metadata, "after_create", DDL(_trigger).execute_if(dialect="sqlite"))
+
+
+# Full-text index over message contents. It is an external content table:
+# the text lives only in `messages`, and the triggers below keep the index
+# in step with every insert, delete and content edit.
+MESSAGE_SEARCH_TABLE = "messages_fts"
+
+MESSAGE_SEARCH_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {MESSAGE_SEARCH_TABLE} USING fts5(
+        content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_search_insert AFTER INSERT ON messages WHEN {NOT_BULK_IMPORT} BEGIN
+        INSERT INTO {MESSAGE_SEARCH_TABLE} (rowid, content) VALUES (NEW.id, NEW.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_search_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO {MESSAGE_SEARCH_TABLE} ({MESSAGE_SEARCH_TABLE}, rowid, content)
+        VALUES ('delete', OLD.id, OLD.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_search_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO {MESSAGE_SEARCH_TABLE} ({MESSAGE_SEARCH_TABLE}, rowid, content)
+        VALUES ('delete', OLD.id, OLD.content);
+        INSERT INTO {MESSAGE_SEARCH_TABLE} (rowid, content) VALUES (NEW.id, NEW.content);
+    END
+    """,
+]
+
+for _statement in MESSAGE_SEARCH_DDL:
+    event.listen(ChatBase.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+# Near-duplicate index (see `lima_gui.services.dedup`): the MinHash
+# signature of every chat with content, and its LSH band buckets. Chats
+# changed since `dedup_state.indexed_version` are re-signed on the next
+# lookup; entries of deleted chats are dropped right away.
+chat_signatures = Table(
+    "chat_signatures", ChatBase.metadata,
+    Column("chat_id", Integer, primary_key=True),
+    Column("signature", LargeBinary, nullable=False),
+)
+
+chat_lsh_buckets = Table(
+    "chat_lsh_buckets", ChatBase.metadata,
+    Column("band", Integer, primary_key=True),
+    Column("bucket", Integer, primary_key=True),
+    Column("chat_id", Integer, primary_key=True),
+    Index("ix_chat_lsh_buckets_chat_id", "chat_id"),
+)
+
+dedup_state = Table(
+    "dedup_state", ChatBase.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("indexed_version", Integer, nullable=False),
+)
+
+DEDUP_DDL = [
+    "INSERT OR IGNORE INTO dedup_state (id, indexed_version) VALUES (1, 0)",
+    """
+    CREATE TRIGGER IF NOT EXISTS chats_dedup_delete AFTER DELETE ON chats BEGIN
+        DELETE FROM chat_signatures WHERE chat_id = OLD.id;
+        DELETE FROM chat_lsh_buckets WHERE chat_id = OLD.id;
+    END
+    """,
+]
+
+for _statement in DEDUP_DDL:
+    event.listen(ChatBase.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
 from .db import get_chat_engine
 
 
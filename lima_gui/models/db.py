@@ -1,9 +1,11 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
-import os
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
 import appdirs
 from pathlib import Path
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
 from lima_gui.constants import APP_NAME
 
 def get_app_data_dir():
@@ -29,39 +31,161 @@ def init_databases():
     # Get engines
     chat_engine = get_chat_engine()
     
-    # Create all tables if they don't exist
-    from .chat import ChatBase
-    
-    ChatBase.metadata.create_all(chat_engine)
+    # Create the schema, or upgrade a database made by an older version
+    from .migrations import migrate
+    migrate(chat_engine)
     
     # Log initialization
     from loguru import logger
     logger.info(f"Initialized databases at {get_app_data_dir()}")
 
 
+def add_missing_columns(engine):
+    """Add columns declared on the models but absent from existing tables.
+
+    `create_all` only creates missing tables, so databases created by older
+    versions would otherwise never gain new columns. Returns the list of
+    added `table.column` names.
+    """
+    from .chat import ChatBase
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as connection:
+        for table in ChatBase.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                # SQLite only accepts constant defaults when adding a column.
+                default = column.server_default.arg if column.server_default is not None else None
+                if isinstance(default, str):
+                    ddl += f" NOT NULL DEFAULT {default}" if not column.nullable else f" DEFAULT {default}"
+                connection.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def add_missing_indexes(engine):
+    """Create indexes declared on the models but absent from existing tables."""
+    from .chat import ChatBase
+
+    for table in ChatBase.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+class EngineProfile(BaseModel):
+    """How the chat database engine is configured.
+
+    `pragmas` are applied to every new SQLite connection, in order.
+    `pool_size`/`max_overflow` only apply to file databases.
+    """
+    name: str
+    echo: bool = False
+    pragmas: Dict[str, Any] = {}
+    pool_size: Optional[int] = None
+    max_overflow: Optional[int] = None
+
+
+DEV_PROFILE = "dev"
+PRODUCTION_PROFILE = "production"
+
+ENGINE_PROFILES = {
+    # Logs every statement and keeps SQLite defaults (rollback journal),
+    # except for foreign keys, which the ON DELETE CASCADE rules rely on.
+    DEV_PROFILE: EngineProfile(name=DEV_PROFILE, echo=True, pragmas={"foreign_keys": "ON"}),
+    # WAL lets readers proceed while a writer commits. NORMAL sync is safe
+    # with WAL (only the last transactions can be lost on power failure).
+    # The pool matches the default size of the thread pool running sync
+    # endpoints, so requests don't queue for connections.
+    PRODUCTION_PROFILE: EngineProfile(
+        name=PRODUCTION_PROFILE,
+        pragmas={
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "foreign_keys": "ON",
+            "busy_timeout": 5000,
+            "cache_size": -64000,
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+        },
+        pool_size=10,
+        max_overflow=30,
+    ),
+}
+
+
+def get_engine_profile(name: Optional[str] = None) -> EngineProfile:
+    """Profile by name, or from the `LIMA_GUI_DB_PROFILE` env variable (production by default)."""
+    name = name or os.getenv("LIMA_GUI_DB_PROFILE") or PRODUCTION_PROFILE
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown database profile '{name}', expected one of {sorted(ENGINE_PROFILES)}")
+    return ENGINE_PROFILES[name]
+
+
+def _is_file_database(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def create_chat_engine(url: str, profile: Optional[EngineProfile] = None, **kwargs):
+    """Create an engine for `url` configured by `profile`."""
+    profile = profile or get_engine_profile()
+    url = make_url(url)
+
+    if _is_file_database(url) and "poolclass" not in kwargs:
+        if profile.pool_size is not None:
+            kwargs.setdefault("pool_size", profile.pool_size)
+        if profile.max_overflow is not None:
+            kwargs.setdefault("max_overflow", profile.max_overflow)
+
+    engine = create_engine(url, echo=profile.echo, **kwargs)
+
+    if profile.pragmas and url.get_backend_name() == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma, value in profile.pragmas.items():
+                    cursor.execute(f"PRAGMA {pragma} = {value}")
+            finally:
+                cursor.close()
+
+    return engine
+
+
 _chat_engine = None
-_chat_session = None
+_chat_sessionmaker = None
 
 
 def get_chat_engine():
     global _chat_engine
     if _chat_engine is None:
-        _chat_engine = create_engine(get_chat_db_url(), echo=True)
+        _chat_engine = create_chat_engine(get_chat_db_url())
+        from loguru import logger
+        logger.info(f"Chat database engine uses the '{get_engine_profile().name}' profile")
     return _chat_engine
 
 
-def get_chat_session():
-    global _chat_session
-    if _chat_session is None:
-        _chat_session = scoped_session(sessionmaker(bind=get_chat_engine()))
-    return _chat_session
+def get_chat_sessionmaker():
+    global _chat_sessionmaker
+    if _chat_sessionmaker is None:
+        _chat_sessionmaker = sessionmaker(bind=get_chat_engine())
+    return _chat_sessionmaker
 
 
 # Dependency to use a session in endpoints
 def get_chat_db():
-    db = get_chat_session()
-    try:
-        yield db
-    finally:
-        db.remove()
+    """Open a new session for each request.
 
+    Requests may run concurrently in worker threads or interleave on the
+    event loop, so sessions are never shared: closing the session at the end
+    of the request rolls back whatever it left uncommitted.
+    """
+    with get_chat_sessionmaker()() as db:
+        yield db
@@ -0,0 +1,231 @@
+import time
+from typing import Callable, List, Optional
+
+from loguru import logger
+from pydantic import BaseModel
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+
+
+# Kept out of `ChatBase.metadata`: whether this table exists tells a
+# database created before migrations apart from a fresh one.
+migrations_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", migrations_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False, server_default=func.current_timestamp()),
+)
+
+
+class Migration(BaseModel):
+    """One schema upgrade step.
+
+    `upgrade` receives the engine and manages its own transactions, so long
+    data migrations can commit in chunks. Steps must tolerate running on a
+    database that already has part of their changes: databases upgraded in
+    place before versioning existed report version 0.
+    """
+    version: int
+    name: str
+    upgrade: Callable[[Engine], None]
+
+
+def _aggregate_columns(engine: Engine) -> None:
+    # Per-chat aggregates, per-message token counts and the token cache.
+    from lima_gui.services.aggregates import rebuild_chat_aggregates
+    from lima_gui.services.retokenize import retokenize_messages
+    from .chat import ChatBase
+    from .db import add_missing_columns
+
+    added = add_missing_columns(engine)
+    ChatBase.metadata.create_all(engine)
+    if added:
+        retokenize_messages(engine)
+        with engine.begin() as connection:
+            rebuild_chat_aggregates(connection)
+
+
+def _foreign_key_indexes(engine: Engine) -> None:
+    # Indexes on messages (chat_id, position), tool_calls.message_id and
+    # both column orders of chat_tag.
+    from .db import add_missing_indexes
+
+    add_missing_indexes(engine)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+
+
+def _message_search(engine: Engine) -> None:
+    # FTS5 index over message contents, filled from the existing messages.
+    from .chat import MESSAGE_SEARCH_DDL, MESSAGE_SEARCH_TABLE
+
+    with engine.begin() as connection:
+        for statement in MESSAGE_SEARCH_DDL:
+            connection.execute(text(statement))
+        connection.execute(text(f"INSERT INTO {MESSAGE_SEARCH_TABLE} ({MESSAGE_SEARCH_TABLE}) VALUES ('rebuild')"))
+
+
+def _chat_versions(engine: Engine) -> None:
+    # chats.version and the dataset_version counter; the counter row and the
+    # version triggers are created by `create_all`.
+    from .chat import ChatBase
+    from .db import add_missing_columns
+
+    add_missing_columns(engine)
+    ChatBase.metadata.create_all(engine)
+
+
+# Rows kept when a table is rebuilt: rows whose parent is gone could not
+# have been written with foreign keys enforced.
+_CASCADE_TABLES = {
+    "messages": "chat_id IN (SELECT id FROM chats)",
+    "tool_calls": "message_id IN (SELECT id FROM messages)",
+    "tools": "chat_id IN (SELECT id FROM chats)",
+    "chat_tag": "chat_id IN (SELECT id FROM chats) AND tag_name IN (SELECT name FROM tags)",
+}
+
+
+def _delete_cascades(engine: Engine) -> None:
+    # SQLite can't alter a foreign key, so the child tables are rebuilt with
+    # their ON DELETE CASCADE rules (the 12-step procedure of the SQLite
+    # docs). Triggers are dropped first so the renames don't trip over them;
+    # they are recreated by `create_all`, the indexes by `add_missing_indexes`.
+    from .chat import ChatBase, MESSAGE_SEARCH_TABLE
+    from .db import add_missing_indexes
+
+    with engine.connect() as connection:
+        foreign_keys = connection.exec_driver_sql("PRAGMA foreign_keys").scalar()
+        # Only takes effect outside a transaction; dropping a parent table
+        # would otherwise cascade.
+        connection.exec_driver_sql("PRAGMA foreign_keys = OFF")
+        connection.commit()
+        try:
+            with connection.begin():
+                triggers = connection.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+                ).scalars().all()
+                for trigger in triggers:
+                    connection.exec_driver_sql(f"DROP TRIGGER {trigger}")
+
+                for name, keep in _CASCADE_TABLES.items():
+                    table = ChatBase.metadata.tables[name]
+                    ddl = str(CreateTable(table).compile(dialect=engine.dialect))
+                    connection.exec_driver_sql(ddl.replace(f"CREATE TABLE {name} ", f"CREATE TABLE _new_{name} ", 1))
+                    columns = ", ".join(column.name for column in table.columns)
+                    connection.exec_driver_sql(
+                        f"INSERT INTO _new_{name} ({columns}) SELECT {columns} FROM {name} WHERE {keep}"
+                    )
+                    connection.exec_driver_sql(f"DROP TABLE {name}")
+                    connection.exec_driver_sql(f"ALTER TABLE _new_{name} RENAME TO {name}")
+
+                # Messages dropped as orphans leave entries in the index.
+                connection.exec_driver_sql(
+                    f"INSERT INTO {MESSAGE_SEARCH_TABLE} ({MESSAGE_SEARCH_TABLE}) VALUES ('rebuild')"
+                )
+        finally:
+            connection.exec_driver_sql(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+            connection.commit()
+
+    ChatBase.metadata.create_all(engine)
+    add_missing_indexes(engine)
+
+
+def _chat_stats(engine: Engine) -> None:
+    # chat_stats and role_stats with their triggers, filled from the
+    # existing chats and messages.
+    from lima_gui.services.stats import rebuild_chat_stats
+    from .chat import ChatBase
+
+    ChatBase.metadata.create_all(engine)
+    with engine.begin() as connection:
+        rebuild_chat_stats(connection)
+
+
+def _duplicate_index(engine: Engine) -> None:
+    # Near-duplicate index tables and the chats.version index its updates
+    # look up; signatures are computed on the first lookup.
+    from .chat import ChatBase
+    from .db import add_missing_indexes
+
+    ChatBase.metadata.create_all(engine)
+    add_missing_indexes(engine)
+
+
+def _bulk_import_guards(engine: Engine) -> None:
+    # The bulk import flag table; the INSERT triggers it guards are dropped
+    # and recreated with the guard by `create_all`.
+    from .chat import BULK_IMPORT_GUARDED_TRIGGERS, ChatBase
+
+    with engine.begin() as connection:
+        for trigger in BULK_IMPORT_GUARDED_TRIGGERS:
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    ChatBase.metadata.create_all(engine)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(version=1, name="aggregate_columns", upgrade=_aggregate_columns),
+    Migration(version=2, name="foreign_key_indexes", upgrade=_foreign_key_indexes),
+    Migration(version=3, name="message_search", upgrade=_message_search),
+    Migration(version=4, name="chat_versions", upgrade=_chat_versions),
+    Migration(version=5, name="delete_cascades", upgrade=_delete_cascades),
+    Migration(version=6, name="chat_stats", upgrade=_chat_stats),
+    Migration(version=7, name="duplicate_index", upgrade=_duplicate_index),
+    Migration(version=8, name="bulk_import_guards", upgrade=_bulk_import_guards),
+]
+
+
+def get_schema_version(engine: Engine) -> Optional[int]:
+    """Current schema version, or None for a database without chat tables."""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    if "chats" not in tables:
+        return None
+    if schema_migrations.name not in tables:
+        return 0
+    with engine.connect() as connection:
+        return connection.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def migrate(engine: Engine, migrations: Optional[List[Migration]] = None) -> List[str]:
+    """Bring the chat database up to the latest schema version.
+
+    A new database is created from the models and stamped with the latest
+    version. An existing one gets the pending migrations applied in order,
+    each recorded once it has completed, so an interrupted upgrade resumes
+    from the step that failed. Returns the names of the applied migrations.
+    """
+    from .chat import ChatBase
+
+    migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda m: m.version)
+    version = get_schema_version(engine)
+    migrations_metadata.create_all(engine)
+
+    if version is None:
+        ChatBase.metadata.create_all(engine)
+        if migrations:
+            with engine.begin() as connection:
+                connection.execute(
+                    schema_migrations.insert(), [{"version": m.version, "name": m.name} for m in migrations]
+                )
+        logger.info(f"Created chat database schema at version {migrations[-1].version if migrations else 0}")
+        return []
+
+    applied = []
+    for migration in migrations:
+        if migration.version <= version:
+            continue
+        started = time.perf_counter()
+        migration.upgrade(engine)
+        with engine.begin() as connection:
+            connection.execute(schema_migrations.insert(), {"version": migration.version, "name": migration.name})
+        logger.info(
+            f"Applied migration {migration.version} ({migration.name}) in {time.perf_counter() - started:.2f}s"
+        )
+        applied.append(migration.name)
+
+    # New tables and triggers that need no data changes.
+    ChatBase.metadata.create_all(engine)
+    return applied
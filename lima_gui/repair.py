@@ -0,0 +1,43 @@
+import argparse
+
+from loguru import logger
+
+from lima_gui.models.db import get_chat_engine
+from lima_gui.models.migrations import migrate
+from lima_gui.services.aggregates import rebuild_chat_aggregates
+from lima_gui.services.jobs import Job
+from lima_gui.services.retokenize import DEFAULT_CHUNK_SIZE, retokenize_messages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Recompute per-chat aggregates (message count, tokens, preview) in the chat database.'
+    )
+    parser.add_argument('--skip-tokens', action='store_true',
+                        help='Reuse stored per-message token counts instead of recounting them')
+    parser.add_argument('--all-tokens', action='store_true',
+                        help='Recount every message, not only those counted by another tokenizer')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Messages per tokenization batch')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Tokenizer threads (defaults to the number of cores)')
+    args = parser.parse_args()
+
+    engine = get_chat_engine()
+    migrate(engine)
+
+    if not args.skip_tokens:
+        job = Job(0, "retokenize")
+        job.run(lambda job: retokenize_messages(
+            engine, only_stale=not args.all_tokens, chunk_size=args.chunk_size, workers=args.workers, job=job
+        ))
+        logger.info(f"Recounted tokens of {job.processed} messages ({job.throughput():.0f} messages/sec)")
+
+    with engine.begin() as connection:
+        rebuild_chat_aggregates(connection)
+
+    logger.info(f"Rebuilt chat aggregates for {engine.url}")
+
+
+if __name__ == '__main__':
+    main()
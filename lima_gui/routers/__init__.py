@@ -1,3 +1,4 @@
 from .main import main_router
 from .chat import chat_router
-from .settings import settings_router
\ No newline at end of file
+from .settings import settings_router
+from .jobs import jobs_router
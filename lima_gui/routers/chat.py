@@ -1,14 +1,30 @@
-from fastapi import APIRouter, Request, UploadFile, File, HTTPException, Depends, status
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Body, HTTPException, Depends, Header, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+import httpx
+import openai
 from sqlalchemy.orm import Session
 from lima_gui.models import Chat, Message, Tool, ToolCall, Tag, get_chat_db
 from lima_gui.models.chat import RoleEnum
 import json
 from ..services.chat import get_chat as _get_chat
 from ..services.chat import add_message as _add_message
-from ..services.chat import ChatDetailsSchema, MessageSchema, ToolSchema
-from typing import List
+from ..services.chat import move_message as _move_message
+from ..services.chat import ChatDetailsSchema, ChatEditError, MessagePositionError, MessageSchema, ToolSchema
+from ..services.chat import parse_role, set_chat_tags
+from ..services.batch import BatchOperationError, BatchRequest, apply_batch
+from ..services.chat_cache import get_chat_details_cache, invalidate_chats
+from ..services.etag import chat_etag, etag_matches, get_chat_version
+from ..services.chat import load_chat
+from ..services.generation import (
+    CompletionAccumulator, GenerationConfig, GenerationError, build_completion_request, check_generation_config,
+    save_reply, sse_event,
+)
+from ..services.completion_cache import CachedCompletion, CompletionCache, completion_fingerprint
+from .settings import get_config_manager
+from ..services.tokenizer import get_token_counter
+from typing import Any, List, Optional
 
 """
 Functionality:
@@ -16,43 +32,75 @@ Functionality:
 --- chat level ---
 0. Get chat - get_chat
 1. Edit chat name and tags - update_chat
+   (or apply many chat, message and tool changes at once - batch_update_chat)
 2. Add a tool - add_tool
 3. Edit a tool - edit_tool
 4. Delete a tool.
 
 --- message level ---
-1. Add a message.
+1. Add a message (at the end or before another message).
 2. Update a message.
 - Edit content.
 - Edit role.
-3. Delete a message.
-4. For a given message add a tool call.
-5. For a given message edit a tool call.
+3. Move a message.
+4. Delete a message.
+5. For a given message add a tool call.
+6. For a given message edit a tool call.
+7. Generate the next assistant message - generate_message
+
+Handlers are plain `def` functions: FastAPI runs them in its worker thread
+pool, so the blocking SQLAlchemy calls never stall the event loop. The one
+exception is `generate_message`, which streams from the async OpenAI client
+and sends its database work to the thread pool explicitly.
 """
 
 chat_router = APIRouter(prefix="/chat")
 
 
 @chat_router.get("/{id}", response_model=ChatDetailsSchema)
-async def get_chat(id: int, db: Session = Depends(get_chat_db)):
-    chat = _get_chat(id, db)
-
-    if not chat:
+def get_chat(
+    id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_chat_db),
+):
+    # Revalidation and cache hits only read the chat's version, no messages.
+    version = get_chat_version(id, db)
+    if version is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
-    
-    return chat
+
+    tokenizer_id = get_token_counter().id
+    etag = chat_etag(id, version, tokenizer_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    cache = get_chat_details_cache(db.get_bind())
+    body = cache.get(id, etag)
+    if body is None:
+        chat = _get_chat(id, db)
+        if not chat:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+        # The chat row is read before its messages, so the body is at least
+        # as new as `chat.version`: it's safe to serve under that version.
+        etag = chat_etag(id, chat.version, tokenizer_id)
+        body = chat.model_dump_json().encode()
+        cache.put(id, etag, body)
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
 
 
 @chat_router.put("/{id}", response_model=ChatDetailsSchema)
-async def update_chat(id: int, request: Request, db: Session = Depends(get_chat_db)):
-    data = await request.json()
+def update_chat(id: int, data: Any = Body(None), db: Session = Depends(get_chat_db)):
 
     if not isinstance(data, dict):
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Payload must be a JSON object",
         )
-    chat = db.query(Chat).get(id)
+    chat = db.get(Chat, id)
 
     if not chat:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
@@ -66,38 +114,13 @@ async def update_chat(id: int, request: Request, db: Session = Depends(get_chat_
         chat.language = language
 
     if "tags" in data:
-        raw_tags = data.get("tags") or []
-
-        if not isinstance(raw_tags, list):
-            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Tags must be provided as a list")
-
-        existing_tags = {}
-        if raw_tags:
-            db_tags = db.query(Tag).filter(Tag.name.in_(raw_tags)).all()
-            existing_tags = {tag.name: tag for tag in db_tags}
-
-        new_tag_objects = []
-        seen = set()
-        for tag_name in raw_tags:
-            if not isinstance(tag_name, str):
-                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Each tag must be a string")
-
-            tag_name = tag_name.strip()
-            if not tag_name or tag_name in seen:
-                continue
-            seen.add(tag_name)
-
-            tag_obj = existing_tags.get(tag_name)
-            if not tag_obj:
-                tag_obj = Tag(name=tag_name)
-                db.add(tag_obj)
-                existing_tags[tag_name] = tag_obj
-
-            new_tag_objects.append(tag_obj)
-
-        chat.tags = new_tag_objects
+        try:
+            set_chat_tags(db, chat, data.get("tags"))
+        except ChatEditError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
 
     db.commit()
+    invalidate_chats(db, [id])
 
     updated_chat = _get_chat(id, db)
     if updated_chat is None:
@@ -106,17 +129,35 @@ async def update_chat(id: int, request: Request, db: Session = Depends(get_chat_
     return updated_chat
 
 
+@chat_router.patch("/{id}/batch", response_model=ChatDetailsSchema)
+def batch_update_chat(id: int, batch: BatchRequest, db: Session = Depends(get_chat_db)):
+    chat = db.get(Chat, id)
+
+    if not chat:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+
+    try:
+        apply_batch(db, chat, batch.operations)
+    except BatchOperationError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    invalidate_chats(db, [id])
+
+    return _get_chat(id, db)
+
+
 @chat_router.post("/{id}/tools", response_model=ToolSchema)
-async def add_tool(id: int, request: Request, db: Session = Depends(get_chat_db)):
-    data = await request.json()
-    chat = db.query(Chat).get(id)
+def add_tool(id: int, data: Any = Body(None), db: Session = Depends(get_chat_db)):
+    if db.get(Chat, id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
     name = data["name"]
     description = data["description"]
     parameters = data["parameters"]
 
-    tool = Tool(name=name, description=description, parameters=parameters, chat=chat)
-    chat.tools.append(tool)
+    # Set the foreign key directly: appending to `chat.tools` would load the collection.
+    tool = Tool(name=name, description=description, parameters=parameters, chat_id=id)
+    db.add(tool)
     db.commit()
+    invalidate_chats(db, [id])
     db.refresh(tool)
 
     tool_schema = ToolSchema(
@@ -128,18 +169,18 @@ async def add_tool(id: int, request: Request, db: Session = Depends(get_chat_db)
 
 
 @chat_router.put("/{id}/tools/{tool_name}")
-async def edit_tool(id: int, tool_name: str, request: Request, db: Session = Depends(get_chat_db)):
-    data = await request.json()
+def edit_tool(id: int, tool_name: str, data: Any = Body(None), db: Session = Depends(get_chat_db)):
     tool = db.query(Tool).filter(Tool.chat_id == id, Tool.name == tool_name).first()
     tool.name = data["name"]
     tool.description = data["description"]
     tool.parameters = data["parameters"]
     db.commit()
+    invalidate_chats(db, [id])
     return {"status": "success", "message": "Tool updated"}
 
 
 @chat_router.delete("/{id}/tools/{tool_name}")
-async def delete_tool(id: int, tool_name: str, db: Session = Depends(get_chat_db)):
+def delete_tool(id: int, tool_name: str, db: Session = Depends(get_chat_db)):
     tool = db.query(Tool).filter(Tool.chat_id == id, Tool.name == tool_name).first()
 
     if not tool:
@@ -147,6 +188,7 @@ async def delete_tool(id: int, tool_name: str, db: Session = Depends(get_chat_db
 
     db.delete(tool)
     db.commit()
+    invalidate_chats(db, [id])
 
     return {"status": "success", "detail": "Tool deleted"}
 
@@ -155,14 +197,25 @@ async def delete_tool(id: int, tool_name: str, db: Session = Depends(get_chat_db
 
 
 @chat_router.post("/{id}/message", response_model=MessageSchema)
-async def add_message(id: int, db: Session = Depends(get_chat_db)):
-    msg = _add_message(id, db)
+def add_message(
+    id: int,
+    before_id: Optional[int] = Query(None, description="Insert before this message instead of at the end"),
+    db: Session = Depends(get_chat_db),
+):
+    try:
+        msg = _add_message(id, db, before_id=before_id)
+    except MessagePositionError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    if msg is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+    invalidate_chats(db, [id])
+
     return msg
 
 
 @chat_router.put("/{id}/message/{message_id}", response_model=MessageSchema)
-async def update_message(id: int, message_id: int, request: Request, db: Session = Depends(get_chat_db)):
-    data = await request.json()
+def update_message(id: int, message_id: int, data: Any = Body(None), db: Session = Depends(get_chat_db)):
 
     if not isinstance(data, dict):
         raise HTTPException(
@@ -192,31 +245,10 @@ async def update_message(id: int, message_id: int, request: Request, db: Session
         updated = True
 
     if "role" in data:
-        role_value = data["role"]
-        if role_value is None:
-            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Role cannot be null")
-
-        if isinstance(role_value, str):
-            role_value = role_value.strip()
-
-        if not isinstance(role_value, str):
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="Role must be a string",
-            )
-
-        if not role_value:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="Role cannot be empty",
-            )
-
         try:
-            role_enum = RoleEnum(role_value.lower())
-        except ValueError:
-            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid role value")
-
-        message.role = role_enum
+            message.role = parse_role(data["role"])
+        except ChatEditError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
         updated = True
 
     if not updated:
@@ -226,13 +258,35 @@ async def update_message(id: int, message_id: int, request: Request, db: Session
         )
 
     db.commit()
+    invalidate_chats(db, [id])
     db.refresh(message)
 
     return MessageSchema.from_orm(message)
 
 
+@chat_router.put("/{chat_id}/message/{message_id}/move", response_model=MessageSchema)
+def move_message(chat_id: int, message_id: int, data: Any = Body(None), db: Session = Depends(get_chat_db)):
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Payload must be a JSON object")
+
+    before_id = data.get("before_id")
+    if before_id is not None and (not isinstance(before_id, int) or isinstance(before_id, bool)):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="before_id must be a message id or null")
+
+    try:
+        message = _move_message(chat_id, message_id, db, before_id=before_id)
+    except MessagePositionError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    if message is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
+    invalidate_chats(db, [chat_id])
+
+    return MessageSchema.from_orm(message)
+
+
 @chat_router.delete("/{chat_id}/message/{message_id}")
-async def delete_message(chat_id: int, message_id: int, db: Session = Depends(get_chat_db)):
+def delete_message(chat_id: int, message_id: int, db: Session = Depends(get_chat_db)):
     message = db.query(Message).filter(
         Message.id == message_id,
         Message.chat_id == chat_id,
@@ -241,44 +295,143 @@ async def delete_message(chat_id: int, message_id: int, db: Session = Depends(ge
     if not message:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
 
+    # Positions only need to stay ordered, so the rest of the chat is left as is.
     db.delete(message)
     db.commit()
+    invalidate_chats(db, [chat_id])
 
-    # Reorder remaining messages
-    remaining_messages = (
-        db.query(Message)
-        .filter(Message.chat_id == chat_id)
-        .order_by(Message.position)
-        .all()
-    )
-
-    for index, msg in enumerate(remaining_messages):
-        msg.position = index + 1  # Reassign position starting from 1
-
-    db.commit()
-
-    return {"status": "success", "detail": "Message deleted and reordered"}
+    return {"status": "success", "detail": "Message deleted"}
 
 
 @chat_router.post("/{chat_id}/message/{message_id}/tool_call")
-async def add_tool_call(chat_id: int, message_id: int, request: Request, db: Session = Depends(get_chat_db)):
-    data = await request.json()
-    message = db.query(Message).filter(Message.id == message_id, Message.chat_id == chat_id).first()
+def add_tool_call(chat_id: int, message_id: int, data: Any = Body(None), db: Session = Depends(get_chat_db)):
+    message_exists = db.query(Message.id).filter(Message.id == message_id, Message.chat_id == chat_id).first()
+    if message_exists is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
     name = data["name"]
     arguments = data["arguments"]
-    tool_call = ToolCall(name=name, arguments=arguments, message=message)
-    message.tool_calls.append(tool_call)
+    tool_call = ToolCall(name=name, arguments=arguments, message_id=message_id)
+    db.add(tool_call)
     db.commit()
+    invalidate_chats(db, [chat_id])
     db.refresh(tool_call)
 
     return {"status": "success", "message": "Tool call added"}
 
 
 @chat_router.put("/{chat_id}/message/{message_id}/tool_call/{tool_call_id}")
-async def edit_tool_call(chat_id: int, message_id: int, tool_call_id: int, request: Request, db: Session = Depends(get_chat_db)):
-    data = await request.json()
+def edit_tool_call(chat_id: int, message_id: int, tool_call_id: int, data: Any = Body(None), db: Session = Depends(get_chat_db)):
     tool_call = db.query(ToolCall).filter(ToolCall.id == tool_call_id, ToolCall.message_id == message_id).first()
     tool_call.name = data["name"]
     tool_call.arguments = data["arguments"]
     db.commit()
-    return {"status": "success", "message": "Tool call updated"}
\ No newline at end of file
+    invalidate_chats(db, [chat_id])
+    return {"status": "success", "message": "Tool call updated"}
+
+def _save_generated_reply(engine, chat_id: int, completion: CachedCompletion) -> Optional[MessageSchema]:
+    # The request session is closed by the time the stream ends.
+    with Session(bind=engine) as db:
+        message = save_reply(db, chat_id, completion.content, completion.tool_calls)
+        if message is not None:
+            invalidate_chats(db, [chat_id])
+        return message
+
+
+async def _send_reply(chat_id: int, completion: CachedCompletion, engine):
+    message = await run_in_threadpool(_save_generated_reply, engine, chat_id, completion)
+    if message is None:
+        yield sse_event("error", {"detail": "Chat not found"})
+        return
+    yield sse_event("done", {"message": message.model_dump(), "finish_reason": completion.finish_reason})
+
+
+async def _stream_reply(chat_id: int, stream, engine, cache: Optional[CompletionCache], cache_key: str, model: str):
+    accumulator = CompletionAccumulator()
+    try:
+        async for chunk in stream:
+            content = accumulator.add(chunk)
+            if content:
+                yield sse_event("delta", {"content": content})
+    except (openai.APIError, httpx.HTTPError) as e:
+        # Nothing is saved from an interrupted completion.
+        yield sse_event("error", {"detail": f"Completion failed: {e}"})
+        return
+    finally:
+        await stream.close()
+
+    completion = CachedCompletion(
+        content=accumulator.content, tool_calls=accumulator.tool_calls, finish_reason=accumulator.finish_reason
+    )
+    if cache is not None and completion.finish_reason is not None:
+        await run_in_threadpool(cache.put, cache_key, model, completion)
+    async for event in _send_reply(chat_id, completion, engine):
+        yield event
+
+
+async def _replay_cached_reply(chat_id: int, completion: CachedCompletion, engine):
+    if completion.content:
+        yield sse_event("delta", {"content": completion.content})
+    async for event in _send_reply(chat_id, completion, engine):
+        yield event
+
+
+@chat_router.post("/{id}/generate")
+async def generate_message(
+    id: int,
+    request: Request,
+    cache: bool = Query(True, description="Reuse a cached completion of the same request; if false, "
+                                          "the new completion replaces the cached one"),
+    db: Session = Depends(get_chat_db),
+    config_manager=Depends(get_config_manager),
+):
+    """Stream the next assistant message from the configured model as server-sent events.
+
+    `delta` events carry the content as the model produces it; once the
+    completion ends the message is saved and a final `done` event carries
+    it, or an `error` event if the completion failed midway. Errors before
+    the first token are returned as plain HTTP errors. A completion cached
+    for the same request is sent as a single `delta` without calling the
+    API; the `X-Completion-Cache` header tells which happened.
+    """
+    config = GenerationConfig.model_validate(config_manager.get_openai_config())
+    try:
+        check_generation_config(config)
+    except GenerationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    chat = await run_in_threadpool(load_chat, id, db)
+    if not chat:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+    completion_request = build_completion_request(chat, config, stream=True)
+    # Proxies must pass events through as they come.
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    completion_cache: Optional[CompletionCache] = request.app.state.completion_cache
+    cache_key = completion_fingerprint(config, completion_request)
+    if completion_cache is not None:
+        headers["X-Completion-Cache"] = "miss" if cache else "bypass"
+        cached = await run_in_threadpool(completion_cache.get, cache_key) if cache else None
+        if cached is not None:
+            return StreamingResponse(
+                _replay_cached_reply(id, cached, db.get_bind()),
+                media_type="text/event-stream",
+                headers={**headers, "X-Completion-Cache": "hit"},
+            )
+
+    client = request.app.state.openai_clients.get(config)
+    try:
+        stream = await client.chat.completions.create(**completion_request)
+    except openai.APIStatusError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Completion API returned {e.status_code}: {e.message}"
+        )
+    except openai.APITimeoutError:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Completion API timed out")
+    except openai.APIConnectionError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Completion API unreachable: {e}")
+
+    return StreamingResponse(
+        _stream_reply(id, stream, db.get_bind(), completion_cache, cache_key, config.model),
+        media_type="text/event-stream",
+        headers=headers,
+    )
@@ -0,0 +1,114 @@
+from datetime import datetime
+from pathlib import Path, PurePath
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import Field
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from lima_gui.models import get_chat_db
+from lima_gui.models.db import get_app_data_dir
+from lima_gui.services.bulk_generation import GenerationJobOptions, start_generation_job
+from lima_gui.services.generation import GenerationConfig, GenerationError
+from lima_gui.services.jobs import JobSchema, get_job, list_jobs
+from lima_gui.services.retokenize import DEFAULT_CHUNK_SIZE, start_retokenize_job
+from lima_gui.services.sharded_export import ExportError, ShardedExportOptions, start_sharded_export_job
+from .main import ChatSelection, selected_chat_ids
+from .settings import get_config_manager
+
+
+jobs_router = APIRouter(prefix="/jobs")
+
+
+@jobs_router.get("", response_model=List[JobSchema])
+def fetch_jobs(kind: Optional[str] = Query(None, description="Only jobs of this kind")):
+    return [job.to_schema() for job in list_jobs(kind)]
+
+
+@jobs_router.get("/{job_id}", response_model=JobSchema)
+def fetch_job(job_id: int):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job.to_schema()
+
+
+@jobs_router.delete("/{job_id}", response_model=JobSchema)
+def cancel_job(job_id: int):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    job.cancel()
+    return job.to_schema()
+
+
+@jobs_router.post("/retokenize", response_model=JobSchema)
+def retokenize(
+    all: bool = Query(False, description="Recount every message, not only stale ones"),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=100000),
+    workers: Optional[int] = Query(None, ge=1, le=256),
+    db: Session = Depends(get_chat_db),
+):
+    """Recount message tokens for the whole dataset in the background."""
+    job = start_retokenize_job(db.get_bind(), only_stale=not all, chunk_size=chunk_size, workers=workers)
+    return job.to_schema()
+
+
+class GenerateJobRequest(ChatSelection, GenerationJobOptions):
+    """Chats to generate replies for, by `ids` or `filter`, and how to pace the requests."""
+
+
+@jobs_router.post("/generate", response_model=JobSchema)
+def generate(
+    body: GenerateJobRequest,
+    request: Request,
+    db: Session = Depends(get_chat_db),
+    config_manager=Depends(get_config_manager),
+):
+    """Generate the next assistant message of many chats in the background.
+
+    By default only chats waiting for an answer (last message from the user)
+    are sent. Follow the job with `GET /jobs/{id}`, cancel it with `DELETE`.
+    """
+    config = GenerationConfig.model_validate(config_manager.get_openai_config())
+    chat_ids = selected_chat_ids(db, body)
+    options = GenerationJobOptions.model_validate(body.model_dump(exclude={"ids", "filter"}))
+    try:
+        job = start_generation_job(db.get_bind(), chat_ids, config, options, request.app.state.completion_cache)
+    except GenerationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return job.to_schema()
+
+
+class ExportJobRequest(ShardedExportOptions):
+    name: Optional[str] = Field(
+        None, description="Relative name of the export directory under the app data `exports` directory; timestamped by default"
+    )
+
+
+def resolve_export_dir(name: Optional[str]) -> Path:
+    """Directory for an export called `name`, confined to the app data `exports` directory."""
+    root = (get_app_data_dir() / "exports").resolve()
+    if name is None:
+        return root / datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = PurePath(name)
+    if not name.strip() or path.is_absolute() or path.anchor or ".." in path.parts:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid export name: {name!r}")
+    directory = (root / path).resolve()
+    if directory == root or not directory.is_relative_to(root):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid export name: {name!r}")
+    return directory
+
+
+@jobs_router.post("/export", response_model=JobSchema)
+def export_shards(body: ExportJobRequest, db: Session = Depends(get_chat_db)):
+    """Export chats to compressed JSONL shards and a manifest, in the background.
+
+    Serialization and compression run in a process pool. The job result is
+    the manifest: per-shard chat counts, byte sizes and SHA-256 checksums.
+    """
+    output_dir = resolve_export_dir(body.name)
+    options = ShardedExportOptions.model_validate(body.model_dump(exclude={"name"}))
+    try:
+        job = start_sharded_export_job(db.get_bind(), str(output_dir), options)
+    except ExportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return job.to_schema()
@@ -1,15 +1,25 @@
 # main_chat_router.py
-from fastapi import APIRouter, Request, UploadFile, File, HTTPException, Depends, status, Query
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import APIRouter, Header, Request, Response, UploadFile, File, HTTPException, Depends, status, Query
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from lima_gui.models import Chat, Message, Tool, Tag, ToolCall, get_chat_db
-from lima_gui.services.chat import calculate_tokens, ToolSchema
-from lima_gui.services.file_service import FileService
-import json
-import tempfile
-import os
-import copy
+from lima_gui.services.chat import ChatFilter, ChatSummarySchema, chat_filter_conditions, find_chat_ids, list_chats, load_chat
+from typing import List, Literal, Optional
+from lima_gui.services.arrow_export import (
+    PARQUET_COMPRESSIONS, PARQUET_ROW_GROUP_SIZE, ArrowUnavailableError, require_pyarrow
+)
+from lima_gui.services.file_service import FileService, EXPORT_CHUNK_SIZE
+from lima_gui.services.importer import ChatImporter, ImportResult, DEFAULT_BATCH_SIZE
+from lima_gui.services.clone import clone_chats
+from lima_gui.services.delete import delete_chats
+from lima_gui.services.chat_cache import ChatCacheStats, get_chat_details_cache, invalidate_chats
+from lima_gui.services.completion_cache import CompletionCache, CompletionCacheStats
+from lima_gui.services.etag import etag_matches, get_dataset_etag
+from lima_gui.services.dedup import DEFAULT_THRESHOLD, MIN_THRESHOLD, DuplicateClustersSchema, find_duplicate_clusters
+from lima_gui.services.stats import DatasetStatsSchema, get_dataset_stats
+from lima_gui.services.search import SEARCH_PAGE_SIZE, SearchQueryError, SearchResultsSchema, search_messages
+from pydantic import BaseModel
 
 # Create a new router that handles both main page and chat functionalities
 main_router = APIRouter()
@@ -23,123 +33,156 @@ async def main_page(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+def _import_response(result: ImportResult) -> dict:
+    return {
+        "status": "success",
+        "message": f"Successfully imported {result.chats_added} chats",
+        **result.model_dump(),
+    }
+
+
 @main_router.post("/chats/upload")
-async def upload_chat(file: UploadFile = File(...), db: Session = Depends(get_chat_db)):
+def upload_chat(
+    file: UploadFile = File(...),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=50000, description="Chats per insert batch"),
+    check_duplicates: bool = Query(False, description="Report imported chats that near-duplicate older ones"),
+    duplicate_threshold: float = Query(DEFAULT_THRESHOLD, ge=MIN_THRESHOLD, le=1.0),
+    db: Session = Depends(get_chat_db),
+):
     if file.content_type != "application/jsonl":
         raise HTTPException(
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, 
             detail="Only JSONL files are supported"
         )
 
-    content = await file.read()
-    chats_data = [json.loads(line) for line in content.decode().splitlines()]
-
-    for chat_data in chats_data:
-        chat_name = chat_data.get("name") or "Imported Chat"
-        language = chat_data.get("language") or "en"
-        chat = Chat(name=chat_name, language=language)
-        db.add(chat)
-
-        raw_tags = chat_data.get("tags") or []
-        if raw_tags:
-            db_tags = db.query(Tag).filter(Tag.name.in_(raw_tags)).all()
-            tag_lookup = {tag.name: tag for tag in db_tags}
-            seen = set()
-            for tag_name in raw_tags:
-                if not isinstance(tag_name, str):
-                    continue
-                normalized = tag_name.strip()
-                if not normalized or normalized in seen:
-                    continue
-                seen.add(normalized)
-                tag_obj = tag_lookup.get(normalized)
-                if not tag_obj:
-                    tag_obj = Tag(name=normalized)
-                    db.add(tag_obj)
-                    tag_lookup[normalized] = tag_obj
-                chat.tags.append(tag_lookup[normalized])
-
-        for tool_data in chat_data.get("tools", []):
-            if not isinstance(tool_data, dict):
-                continue
-            db.add(
-                Tool(
-                    name=tool_data.get("name"),
-                    description=tool_data.get("description"),
-                    parameters=copy.deepcopy(tool_data.get("parameters")),
-                    chat=chat,
-                )
-            )
-
-        for index, message_data in enumerate(chat_data.get("messages", []), start=1):
-            if not isinstance(message_data, dict):
-                continue
-            role = message_data.get("role", "system")
-            content = message_data.get("content", "")
-            position = message_data.get("position") or index
-            new_message = Message(
-                role=role,
-                content=content,
-                position=position,
-                chat=chat,
-            )
-            db.add(new_message)
-
-            for tool_call in message_data.get("tool_calls", []):
-                if not isinstance(tool_call, dict):
-                    continue
-                db.add(
-                    ToolCall(
-                        tool_call_id=tool_call.get("tool_call_id"),
-                        name=tool_call.get("name"),
-                        arguments=tool_call.get("arguments"),
-                        message=new_message,
-                    )
-                )
-    db.commit()
-    return {
-        "status": "success", 
-        "message": "File uploaded and processed successfully."
-    }
+    # The upload is spooled to disk by Starlette; read it line by line.
+    importer = ChatImporter(
+        db, batch_size=batch_size, check_duplicates=check_duplicates, duplicate_threshold=duplicate_threshold
+    )
+    return _import_response(importer.import_lines(file.file))
+
+
+def _stream_jsonl(db: Session, chunk_size: int, messages_only: bool = False, chat_filter: Optional[ChatFilter] = None):
+    # The request session is closed as soon as the handler returns, so the
+    # stream reads through its own session on the same engine.
+    with Session(bind=db.get_bind()) as export_db:
+        yield from FileService(export_db).iter_jsonl(chunk_size, messages_only=messages_only, chat_filter=chat_filter)
+
+
+def _stream_columnar(db: Session, export_format: str, chunk_size: int, chat_filter: ChatFilter, compression: str):
+    with Session(bind=db.get_bind()) as export_db:
+        file_service = FileService(export_db)
+        if export_format == "parquet":
+            yield from file_service.iter_parquet(chunk_size, chat_filter, compression=compression)
+        else:
+            yield from file_service.iter_arrow(chunk_size, chat_filter)
 
 
 @main_router.get("/chats/save")
-def save_chats(db: Session = Depends(get_chat_db)):
-    chats = db.query(Chat).all()
-    response_data = []
-    for chat in chats:
-        chat_data = {
-            "messages": [{"role": message.role, "content": message.content} for message in chat.messages]
-        }
-        response_data.append(chat_data)
-    return "\n".join(json.dumps(line) for line in response_data)
-
-
-@main_router.get("/chats")
-def fetch_chats(db: Session = Depends(get_chat_db)):
-    chats = db.query(Chat).all()
-    chat_list = []
-    for chat in chats:
-        tokens = sum(calculate_tokens(message.content) for message in chat.messages)
-        chat_list.append({
-            "id": chat.id,
-            "name": chat.name,
-            "message_count": len(chat.messages),
-            "language": chat.language,
-            "tags": [tag.name for tag in chat.tags],
-            "tools": [ToolSchema.from_orm(tool).model_dump() for tool in chat.tools],
-            "tokens": tokens,
-        })
-    return chat_list
+def save_chats(
+    chunk_size: int = Query(EXPORT_CHUNK_SIZE, ge=1, le=10000, description="Chats fetched per query"),
+    db: Session = Depends(get_chat_db),
+):
+    """Stream all chats in the OpenAI fine-tuning format (messages only)."""
+    return StreamingResponse(_stream_jsonl(db, chunk_size, messages_only=True), media_type="application/jsonl")
+
+
+@main_router.get("/chats", response_model=List[ChatSummarySchema])
+def fetch_chats(
+    response: Response,
+    after_id: Optional[int] = Query(None, description="Return chats with id greater than this cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of chats to return"),
+    tag: Optional[str] = Query(None, description="Only chats with this tag"),
+    language: Optional[str] = Query(None, description="Only chats in this language"),
+    name: Optional[str] = Query(None, description="Case-insensitive substring of the chat name"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_chat_db),
+):
+    # Read before listing: if a write lands in between, the ETag is older
+    # than the data and the next poll refetches, never the other way round.
+    etag = get_dataset_etag(db)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+    chats = list_chats(db, after_id=after_id, limit=limit, tag=tag, language=language, name=name)
+    if limit is not None and len(chats) == limit:
+        # Cursor for the next page; absent once the listing is exhausted.
+        response.headers["X-Next-After-Id"] = str(chats[-1].id)
+    return chats
+
+
+@main_router.get("/search", response_model=SearchResultsSchema)
+def search(
+    q: str = Query(..., min_length=1, description="Words to find in message contents; end a word with * for a prefix"),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=200, description="Maximum number of hits to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    chat_id: Optional[int] = Query(None, description="Only messages of this chat"),
+    role: Optional[str] = Query(None, description="Only messages with this role"),
+    db: Session = Depends(get_chat_db),
+):
+    try:
+        return search_messages(db, q, limit=limit, cursor=cursor, chat_id=chat_id, role=role)
+    except SearchQueryError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@main_router.get("/metrics/chat-cache", response_model=ChatCacheStats)
+def chat_cache_metrics(db: Session = Depends(get_chat_db)):
+    """Hit, miss and eviction counters of the chat details cache, to size it."""
+    return get_chat_details_cache(db.get_bind()).stats()
+
+
+def _completion_cache(request: Request) -> CompletionCache:
+    cache = request.app.state.completion_cache
+    if cache is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="The completion cache is disabled")
+    return cache
+
+
+@main_router.get("/metrics/completion-cache", response_model=CompletionCacheStats)
+def completion_cache_metrics(request: Request):
+    """Hit rate, size and eviction counters of the completion cache."""
+    return _completion_cache(request).stats()
+
+
+@main_router.delete("/completion-cache")
+def clear_completion_cache(request: Request):
+    """Forget every cached completion."""
+    _completion_cache(request).clear()
+    return {"status": "success"}
+
+
+@main_router.get("/stats", response_model=DatasetStatsSchema)
+def dataset_stats(db: Session = Depends(get_chat_db)):
+    """Chat, message and token totals, length distributions and role balance,
+    overall and per language and tag."""
+    return get_dataset_stats(db)
+
+
+@main_router.get("/duplicates", response_model=DuplicateClustersSchema)
+def duplicate_clusters(
+    threshold: float = Query(DEFAULT_THRESHOLD, ge=MIN_THRESHOLD, le=1.0, description="Minimum estimated Jaccard similarity"),
+    db: Session = Depends(get_chat_db),
+):
+    """Clusters of near-duplicate chats, largest first.
+
+    Chats changed since the last lookup are re-signed first, so the first
+    call on a large dataset takes longer.
+    """
+    clusters = find_duplicate_clusters(db, threshold)
+    db.commit()
+    return clusters
 
 
 @main_router.delete("/chats/{chat_id}")
 def delete_chat(chat_id: int, db: Session = Depends(get_chat_db)):
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
-    if not chat:
+    result = delete_chats(db, [chat_id])
+    if not result.chats_deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
-    db.delete(chat)
     db.commit()
+    invalidate_chats(db, [chat_id])
     return {"status": "success", "message": f"Chat {chat_id} deleted"}
 
 
@@ -152,106 +195,122 @@ def add_chat(db: Session = Depends(get_chat_db)):
     return {"id": new_chat.id, "name": new_chat.name}
 
 
-@main_router.post("/chats/{chat_id}/copy")
-def copy_chat(chat_id: int, db: Session = Depends(get_chat_db)):
-    original_chat = db.query(Chat).filter(Chat.id == chat_id).first()
-    if not original_chat:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
-        
-    copied_chat = Chat(
-        name=f"{original_chat.name} - Copy",
-        language=original_chat.language or "en",
-    )
+class ChatSelection(BaseModel):
+    """Chats to act on: either explicit `ids` or a `filter`."""
+    ids: Optional[List[int]] = None
+    filter: Optional[ChatFilter] = None
 
-    db.add(copied_chat)
 
-    copied_chat.tags = list(original_chat.tags)
+def selected_chat_ids(db: Session, selection: ChatSelection) -> List[int]:
+    if (selection.ids is None) == (selection.filter is None):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Provide either ids or filter")
+    if selection.ids is not None:
+        return selection.ids
+    if selection.filter.is_empty():
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Filter must have at least one criterion")
+    try:
+        return find_chat_ids(db, selection.filter)
+    except SearchQueryError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    for tool in original_chat.tools:
-        db.add(
-            Tool(
-                name=tool.name,
-                description=tool.description,
-                parameters=copy.deepcopy(tool.parameters),
-                chat=copied_chat,
-            )
-        )
 
-    ordered_messages = sorted(original_chat.messages, key=lambda msg: msg.position)
-    for message in ordered_messages:
-        role_value = message.role.value if hasattr(message.role, "value") else message.role
-        new_message = Message(
-            role=role_value,
-            content=message.content,
-            position=message.position,
-            chat=copied_chat,
-        )
-        db.add(new_message)
-
-        for tool_call in message.tool_calls:
-            db.add(
-                ToolCall(
-                    tool_call_id=tool_call.tool_call_id,
-                    name=tool_call.name,
-                    arguments=tool_call.arguments,
-                    message=new_message,
-                )
-            )
+@main_router.post("/chats/copy")
+def copy_chats(selection: ChatSelection, db: Session = Depends(get_chat_db)):
+    """Copy many chats at once, given by `ids` or by a `filter` on tag, language, name and message text."""
+    copies = clone_chats(db, selected_chat_ids(db, selection))
+    db.commit()
+    return {
+        "status": "success",
+        "copied": len(copies),
+        "chats": [{"source_id": source_id, "id": copy_id} for source_id, copy_id in copies.items()],
+    }
+
 
+@main_router.post("/chats/delete")
+def delete_many_chats(selection: ChatSelection, db: Session = Depends(get_chat_db)):
+    """Delete many chats at once, given by `ids` or by a `filter`; unused tags are removed too."""
+    chat_ids = selected_chat_ids(db, selection)
+    result = delete_chats(db, chat_ids)
     db.commit()
-    db.refresh(copied_chat)
+    invalidate_chats(db, chat_ids)
+    return {"status": "success", "message": f"Deleted {result.chats_deleted} chats", **result.model_dump()}
+
+
+@main_router.post("/chats/{chat_id}/copy")
+def copy_chat(chat_id: int, db: Session = Depends(get_chat_db)):
+    copies = clone_chats(db, [chat_id])
+    if not copies:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+    db.commit()
+
+    copied_chat = db.get(Chat, copies[chat_id])
     return {"id": copied_chat.id, "name": copied_chat.name}
 
 
 @main_router.post("/import")
-async def import_file(
+def import_file(
     file: UploadFile = File(...),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=50000, description="Chats per insert batch"),
+    check_duplicates: bool = Query(False, description="Report imported chats that near-duplicate older ones"),
+    duplicate_threshold: float = Query(DEFAULT_THRESHOLD, ge=MIN_THRESHOLD, le=1.0),
     db: Session = Depends(get_chat_db)
 ):
     """Import chats from a JSONL file."""
-    # Create a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jsonl") as temp_file:
-        temp_file.write(await file.read())
-        temp_path = temp_file.name
-    
-    try:
-        # Import the file
-        file_service = FileService(db)
-        chats_added = file_service.import_jsonl(temp_path)
-        
-        return {
-            "status": "success",
-            "chats_added": chats_added,
-            "message": f"Successfully imported {chats_added} chats"
-        }
-    finally:
-        # Clean up temp file
-        os.unlink(temp_path)
+    importer = ChatImporter(
+        db, batch_size=batch_size, check_duplicates=check_duplicates, duplicate_threshold=duplicate_threshold
+    )
+    return _import_response(importer.import_lines(file.file))
+
+
+# Media type, default file name and default chats per query of each export format
+EXPORT_FORMATS = {
+    "jsonl": ("application/jsonl", "lima-chats.jsonl", EXPORT_CHUNK_SIZE),
+    "parquet": ("application/vnd.apache.parquet", "lima-chats.parquet", PARQUET_ROW_GROUP_SIZE),
+    "arrow": ("application/vnd.apache.arrow.stream", "lima-chats.arrows", PARQUET_ROW_GROUP_SIZE),
+}
 
 
 @main_router.get("/export")
-async def export_file(
-    filename: str = Query("lima-chats.jsonl", description="Export filename"),
+def export_file(
+    filename: Optional[str] = Query(None, description="Export filename, lima-chats.<format extension> by default"),
+    format: Literal["jsonl", "parquet", "arrow"] = Query("jsonl", description="JSONL, Parquet or an Arrow IPC stream"),
+    chunk_size: Optional[int] = Query(
+        None, ge=1, le=10000, description="Chats fetched per query; the row group or record batch size of columnar exports"
+    ),
+    compression: Literal[PARQUET_COMPRESSIONS] = Query("zstd", description="Parquet compression codec"),
+    tag: Optional[str] = Query(None, description="Only chats with this tag"),
+    language: Optional[str] = Query(None, description="Only chats in this language"),
+    name: Optional[str] = Query(None, description="Case-insensitive substring of the chat name"),
+    search: Optional[str] = Query(None, description="Only chats with these words in a message, as for /search"),
     db: Session = Depends(get_chat_db)
 ):
-    """Export all chats to a JSONL file."""
-    # Create a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jsonl") as temp_file:
-        temp_path = temp_file.name
-    
+    """Export chats as a streamed file: all of them, or those matching the filters.
+
+    Parquet and Arrow exports have a row per chat, with flat columns
+    (language, tags, token counts) readers can prune and filter on and
+    nested message, tool call and tool columns. They need pyarrow.
+    """
+    media_type, default_filename, default_chunk_size = EXPORT_FORMATS[format]
+    chunk_size = chunk_size or default_chunk_size
+    chat_filter = ChatFilter(tag=tag, language=language, name=name, search=search)
     try:
-        # Export to the file
-        file_service = FileService(db)
-        chats_exported = file_service.export_jsonl(temp_path)
-        
-        # Return the file
-        return FileResponse(
-            path=temp_path,
-            filename=filename,
-            media_type="application/jsonl",
-            background=lambda: os.unlink(temp_path)  # Delete after sending
-        )
-    except Exception:
-        # Clean up on error
-        os.unlink(temp_path)
-        raise
\ No newline at end of file
+        # Reject a bad search before the response starts.
+        chat_filter_conditions(**chat_filter.model_dump())
+    except SearchQueryError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if format == "jsonl":
+        body = _stream_jsonl(db, chunk_size, chat_filter=chat_filter)
+    else:
+        try:
+            require_pyarrow()
+        except ArrowUnavailableError as e:
+            raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+        body = _stream_columnar(db, format, chunk_size, chat_filter, compression)
+
+    safe_filename = (filename or default_filename).replace('"', "")
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{safe_filename}"'},
+    )
@@ -1,7 +1,11 @@
 # In routers/settings.py
-from fastapi import APIRouter, Depends, Request
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from lima_gui.models.db import get_chat_engine
+from lima_gui.services.retokenize import start_retokenize_job
+from lima_gui.services.tokenizer import is_known_tokenizer, set_tokenizer
 
 
 settings_router = APIRouter(prefix="/settings")
@@ -13,6 +17,13 @@ class OpenAIConfig(BaseModel):
     api_key: Optional[str] = None
     # other fields...
 
+
+class AppConfig(BaseModel):
+    tokenizer: Optional[str] = None
+    theme: Optional[str] = None
+    languages: Optional[List[str]] = None
+    default_language: Optional[str] = None
+
 def get_config_manager(request: Request):
     return request.app.state.config_manager
 
@@ -29,4 +40,40 @@ def update_openai_settings(
     # Update only the fields that were provided
     updated_config = {**current_config, **config.dict(exclude_unset=True)}
     config_manager.save_openai_config(updated_config)
-    return {"status": "success"}
\ No newline at end of file
+    return {"status": "success"}
+
+@settings_router.get("/app")
+def get_app_settings(config_manager = Depends(get_config_manager)):
+    return config_manager.get_app_config()
+
+@settings_router.post("/app")
+def update_app_settings(
+    config: AppConfig,
+    config_manager = Depends(get_config_manager)
+):
+    current_config = config_manager.get_app_config()
+    changes = config.dict(exclude_unset=True)
+    tokenizer_changed = "tokenizer" in changes and changes["tokenizer"] != current_config.get("tokenizer")
+    if "tokenizer" in changes:
+        tokenizer = changes["tokenizer"]
+        if not tokenizer or not tokenizer.strip():
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Tokenizer must not be empty")
+        if tokenizer_changed and not is_known_tokenizer(tokenizer):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Unknown tokenizer: {tokenizer}"
+            )
+
+    updated_config = {**current_config, **changes}
+    config_manager.save_app_config(updated_config)
+    if not tokenizer_changed:
+        return {"status": "success"}
+    if os.getenv("LIMA_GUI_TOKENIZER"):
+        # The environment override wins over the config, as it does at startup.
+        return {
+            "status": "success",
+            "warning": f"LIMA_GUI_TOKENIZER is set: tokenizer '{os.getenv('LIMA_GUI_TOKENIZER')}' stays in use",
+        }
+    # Stored token counts are keyed by tokenizer: recount the dataset.
+    set_tokenizer(updated_config["tokenizer"])
+    start_retokenize_job(get_chat_engine())
+    return {"status": "success"}
@@ -0,0 +1,36 @@
+from typing import Iterable, Optional
+from sqlalchemy import select, update, func
+from sqlalchemy.engine import Connection
+from lima_gui.models import Chat, Message
+from lima_gui.models.chat import PREVIEW_LENGTH, RoleEnum
+
+
+def rebuild_chat_aggregates(connection: Connection, chat_ids: Optional[Iterable[int]] = None) -> None:
+    """Recompute the denormalized aggregate columns of `chats` from scratch.
+
+    Triggers keep the aggregates current during normal operation; this is the
+    repair path for databases created before the columns existed or edited
+    outside of the application. Per-message token counts are taken as
+    stored; recount them first with `retokenize_messages` if needed.
+    """
+    messages = Message.__table__
+    chat_messages = messages.c.chat_id == Chat.id
+    stmt = update(Chat.__table__).values(
+        message_count=select(func.count(messages.c.id)).where(chat_messages).scalar_subquery(),
+        token_count=(
+            select(func.coalesce(func.sum(messages.c.token_count), 0))
+            .where(chat_messages)
+            .scalar_subquery()
+        ),
+        preview=(
+            select(func.substr(messages.c.content, 1, PREVIEW_LENGTH))
+            .where(chat_messages, messages.c.role == RoleEnum.user.name)
+            .order_by(messages.c.position, messages.c.id)
+            .limit(1)
+            .scalar_subquery()
+        ),
+        last_modified=func.coalesce(Chat.last_modified, func.current_timestamp()),
+    )
+    if chat_ids is not None:
+        stmt = stmt.where(Chat.id.in_(list(chat_ids)))
+    connection.execute(stmt)
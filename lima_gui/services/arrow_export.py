@@ -0,0 +1,152 @@
+import json
+from typing import Iterable, Iterator, List, Optional
+
+from lima_gui.models import Chat
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: pip install lima_gui[parquet]
+    pa = pq = None
+
+
+PARQUET_ROW_GROUP_SIZE = 1000  # Chats per row group, fetched from the database together
+PARQUET_COMPRESSIONS = ("zstd", "snappy", "gzip", "none")
+
+
+class ArrowUnavailableError(RuntimeError):
+    """Raised when a columnar export is requested but pyarrow isn't installed."""
+
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise ArrowUnavailableError("Parquet and Arrow exports need pyarrow: pip install 'lima_gui[parquet]'")
+
+
+def chat_schema() -> "pa.Schema":
+    """One row per chat: flat columns to filter on, messages and tools nested.
+
+    Strings stay plain: Parquet dictionary-encodes repetitive columns by
+    itself, and nested dictionary columns can't be read back across row groups.
+    """
+    require_pyarrow()
+    tool_call = pa.struct([
+        ("id", pa.int64()),  # The external tool call id, as in the JSONL export
+        ("name", pa.string()),
+        ("arguments", pa.string()),
+    ])
+    message = pa.struct([
+        ("role", pa.string()),
+        ("content", pa.string()),
+        ("token_count", pa.int32()),
+        ("tool_calls", pa.list_(tool_call)),
+    ])
+    tool = pa.struct([
+        ("name", pa.string()),
+        ("description", pa.string()),
+        ("parameters", pa.string()),  # JSON schema, serialized
+    ])
+    return pa.schema([
+        ("id", pa.int64()),
+        ("name", pa.string()),
+        ("language", pa.string()),
+        ("tags", pa.list_(pa.string())),
+        ("message_count", pa.int32()),
+        ("token_count", pa.int64()),
+        ("last_modified", pa.timestamp("us")),
+        ("messages", pa.list_(message)),
+        ("tools", pa.list_(tool)),
+    ])
+
+
+def chat_row(chat: Chat) -> dict:
+    """Convert a loaded chat to a row of `chat_schema()`."""
+    return {
+        "id": chat.id,
+        "name": chat.name,
+        "language": chat.language,
+        "tags": [tag.name for tag in chat.tags],
+        "message_count": chat.message_count,
+        "token_count": chat.token_count,
+        "last_modified": chat.last_modified,
+        "messages": [
+            {
+                "role": message.role.value,
+                "content": message.content,
+                "token_count": message.token_count,
+                "tool_calls": [
+                    {"id": call.tool_call_id, "name": call.name, "arguments": call.arguments}
+                    for call in message.tool_calls
+                ],
+            }
+            for message in sorted(chat.messages, key=lambda m: m.position)
+        ],
+        "tools": [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "parameters": json.dumps(tool.parameters) if tool.parameters is not None else None,
+            }
+            for tool in chat.tools
+        ],
+    }
+
+
+def _record_batches(chunks: Iterable[List[Chat]], schema: "pa.Schema") -> Iterator["pa.RecordBatch"]:
+    for chunk in chunks:
+        yield pa.RecordBatch.from_pylist([chat_row(chat) for chat in chunk], schema=schema)
+
+
+class _ChunkSink:
+    """A write-only file collecting what the writer produced since the last `take`."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def iter_parquet(chunks: Iterable[List[Chat]], compression: str = "zstd") -> Iterator[bytes]:
+    """Yield a Parquet file with one row group per chunk of chats, as each is written.
+
+    Only a row group is held in memory at a time; the footer comes last.
+    """
+    require_pyarrow()
+    schema = chat_schema()
+    sink = _ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression=compression) as writer:
+        for batch in _record_batches(chunks, schema):
+            writer.write_batch(batch, row_group_size=batch.num_rows)
+            yield sink.take()
+    yield sink.take()
+
+
+def iter_arrow_stream(chunks: Iterable[List[Chat]]) -> Iterator[bytes]:
+    """Yield an Arrow IPC stream with one record batch per chunk of chats."""
+    require_pyarrow()
+    schema = chat_schema()
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for batch in _record_batches(chunks, schema):
+            writer.write_batch(batch)
+            yield sink.take()
+    yield sink.take()
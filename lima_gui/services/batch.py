@@ -0,0 +1,229 @@
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
+
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from lima_gui.models import Chat, Message, Tool, ToolCall
+from lima_gui.services.chat import (
+    ChatEditError,
+    insert_message,
+    parse_role,
+    place_message,
+    set_chat_tags,
+)
+
+
+# Messages added earlier in the same batch are referred to by the `ref`
+# they were given, since their ids don't exist yet when the batch is built.
+MessageRef = Union[int, str]
+
+
+class UpdateChatOp(BaseModel):
+    op: Literal["update_chat"]
+    name: Optional[str] = None
+    language: Optional[str] = None
+
+
+class SetTagsOp(BaseModel):
+    op: Literal["set_tags"]
+    tags: List[str]
+
+
+class AddMessageOp(BaseModel):
+    op: Literal["add_message"]
+    ref: Optional[str] = None
+    before_id: Optional[MessageRef] = None
+    role: Optional[str] = None
+    content: str = ""
+
+
+class UpdateMessageOp(BaseModel):
+    op: Literal["update_message"]
+    message_id: MessageRef
+    content: Optional[str] = None
+    role: Optional[str] = None
+
+
+class MoveMessageOp(BaseModel):
+    op: Literal["move_message"]
+    message_id: MessageRef
+    before_id: Optional[MessageRef] = None
+
+
+class DeleteMessageOp(BaseModel):
+    op: Literal["delete_message"]
+    message_id: MessageRef
+
+
+class AddToolCallOp(BaseModel):
+    op: Literal["add_tool_call"]
+    message_id: MessageRef
+    name: str
+    arguments: Optional[str] = None
+
+
+class EditToolCallOp(BaseModel):
+    op: Literal["edit_tool_call"]
+    tool_call_id: int
+    name: str
+    arguments: Optional[str] = None
+
+
+class AddToolOp(BaseModel):
+    op: Literal["add_tool"]
+    name: str
+    description: Optional[str] = None
+    parameters: Optional[Dict[str, Any]] = None
+
+
+class EditToolOp(BaseModel):
+    op: Literal["edit_tool"]
+    tool_name: str
+    name: str
+    description: Optional[str] = None
+    parameters: Optional[Dict[str, Any]] = None
+
+
+class DeleteToolOp(BaseModel):
+    op: Literal["delete_tool"]
+    tool_name: str
+
+
+BatchOperation = Annotated[
+    Union[
+        UpdateChatOp, SetTagsOp,
+        AddMessageOp, UpdateMessageOp, MoveMessageOp, DeleteMessageOp,
+        AddToolCallOp, EditToolCallOp,
+        AddToolOp, EditToolOp, DeleteToolOp,
+    ],
+    Field(discriminator="op"),
+]
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+
+class BatchOperationError(ChatEditError):
+    """An operation of a batch failed; nothing of the batch was applied."""
+
+    def __init__(self, index: int, op: str, error: str, status_code: int = 422):
+        super().__init__(f"Operation {index} ({op}): {error}")
+        self.index = index
+        self.status_code = status_code
+
+
+class _BatchApplier:
+    def __init__(self, db: Session, chat: Chat):
+        self.db = db
+        self.chat = chat
+        self.refs: Dict[str, int] = {}
+
+    def message_id(self, ref: Optional[MessageRef]) -> Optional[int]:
+        if ref is None or isinstance(ref, int):
+            return ref
+        if ref not in self.refs:
+            raise ChatEditError(f"Unknown message ref '{ref}'")
+        return self.refs[ref]
+
+    def message(self, ref: MessageRef) -> Message:
+        message_id = self.message_id(ref)
+        message = self.db.scalars(
+            select(Message).where(Message.id == message_id, Message.chat_id == self.chat.id)
+        ).first()
+        if message is None:
+            raise LookupError(f"Message {message_id} not found")
+        return message
+
+    def tool(self, name: str) -> Tool:
+        tool = self.db.get(Tool, (self.chat.id, name))
+        if tool is None:
+            raise LookupError(f"Tool '{name}' not found")
+        return tool
+
+    def apply(self, op) -> None:
+        getattr(self, f"_{op.op}")(op)
+        # Flush per operation so database errors point at the operation.
+        self.db.flush()
+
+    def _update_chat(self, op: UpdateChatOp) -> None:
+        if op.name is not None:
+            self.chat.name = op.name
+        if op.language is not None:
+            self.chat.language = op.language
+
+    def _set_tags(self, op: SetTagsOp) -> None:
+        set_chat_tags(self.db, self.chat, op.tags)
+
+    def _add_message(self, op: AddMessageOp) -> None:
+        role = parse_role(op.role) if op.role is not None else None
+        message = insert_message(self.chat.id, self.db, self.message_id(op.before_id), role=role, content=op.content)
+        if op.ref is not None:
+            if op.ref in self.refs:
+                raise ChatEditError(f"Duplicate message ref '{op.ref}'")
+            self.refs[op.ref] = message.id
+
+    def _update_message(self, op: UpdateMessageOp) -> None:
+        message = self.message(op.message_id)
+        if op.content is not None:
+            message.content = op.content
+        if op.role is not None:
+            message.role = parse_role(op.role)
+
+    def _move_message(self, op: MoveMessageOp) -> None:
+        place_message(self.message(op.message_id), self.db, self.message_id(op.before_id))
+
+    def _delete_message(self, op: DeleteMessageOp) -> None:
+        self.db.delete(self.message(op.message_id))
+
+    def _add_tool_call(self, op: AddToolCallOp) -> None:
+        message = self.message(op.message_id)
+        self.db.add(ToolCall(name=op.name, arguments=op.arguments, message_id=message.id))
+
+    def _edit_tool_call(self, op: EditToolCallOp) -> None:
+        tool_call = self.db.scalars(
+            select(ToolCall)
+            .join(Message, Message.id == ToolCall.message_id)
+            .where(ToolCall.id == op.tool_call_id, Message.chat_id == self.chat.id)
+        ).first()
+        if tool_call is None:
+            raise LookupError(f"Tool call {op.tool_call_id} not found")
+        tool_call.name = op.name
+        tool_call.arguments = op.arguments
+
+    def _add_tool(self, op: AddToolOp) -> None:
+        self.db.add(Tool(name=op.name, description=op.description, parameters=op.parameters, chat_id=self.chat.id))
+
+    def _edit_tool(self, op: EditToolOp) -> None:
+        tool = self.tool(op.tool_name)
+        tool.name = op.name
+        tool.description = op.description
+        tool.parameters = op.parameters
+
+    def _delete_tool(self, op: DeleteToolOp) -> None:
+        self.db.delete(self.tool(op.tool_name))
+
+
+def apply_batch(db: Session, chat: Chat, operations: List[BatchOperation]) -> None:
+    """Apply `operations` to `chat` in order, in one transaction with one commit.
+
+    If any operation fails, the transaction is rolled back and a
+    `BatchOperationError` names the failing operation.
+    """
+    applier = _BatchApplier(db, chat)
+    for index, op in enumerate(operations):
+        try:
+            applier.apply(op)
+        except LookupError as e:
+            db.rollback()
+            raise BatchOperationError(index, op.op, str(e), status_code=404)
+        except IntegrityError as e:
+            db.rollback()
+            raise BatchOperationError(index, op.op, f"Conflicts with existing data ({e.orig})", status_code=409)
+        except ValueError as e:
+            # ChatEditError and model validation errors (e.g. tool parameters)
+            db.rollback()
+            raise BatchOperationError(index, op.op, str(e))
+    db.commit()
@@ -0,0 +1,325 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+from loguru import logger
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from lima_gui.models import Chat, Message
+from lima_gui.models.chat import RoleEnum
+from lima_gui.services.chat import chat_details_options
+from lima_gui.services.chat_cache import invalidate_chats
+from lima_gui.services.completion_cache import CachedCompletion, CompletionCache, completion_fingerprint
+from lima_gui.services.generation import (
+    GenerationConfig, OpenAIClientPool, build_completion_request, check_generation_config, save_replies
+)
+from lima_gui.services.jobs import Job, start_job
+
+
+GENERATE_JOB = "generate"
+DEFAULT_CONCURRENCY = 8
+MAX_CONCURRENCY = 256
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_WRITE_BATCH_SIZE = 50
+LOAD_CHUNK_SIZE = 200
+RETRY_BACKOFF = 1.0  # Seconds before the first retry, doubled on each one
+MAX_RETRY_BACKOFF = 60.0
+WRITE_INTERVAL = 2.0  # Seconds a finished reply may wait for its batch to fill
+MAX_REPORTED_ERRORS = 20
+_IDLE = object()  # What the writer gets when no reply came within WRITE_INTERVAL
+
+
+class GenerationJobOptions(BaseModel):
+    last_role: Optional[RoleEnum] = Field(
+        RoleEnum.user, description="Only chats whose last message has this role; null for every chat"
+    )
+    concurrency: int = Field(DEFAULT_CONCURRENCY, ge=1, le=MAX_CONCURRENCY)
+    requests_per_minute: Optional[float] = Field(None, gt=0)
+    tokens_per_minute: Optional[float] = Field(None, gt=0)
+    max_retries: int = Field(DEFAULT_MAX_RETRIES, ge=0, le=20)
+    write_batch_size: int = Field(DEFAULT_WRITE_BATCH_SIZE, ge=1, le=1000)
+    use_cache: bool = Field(True, description="Reuse cached completions; if false, new ones replace them")
+
+
+class TokenBucket:
+    """An asyncio rate limiter refilling `rate` tokens per second up to `capacity`.
+
+    A request larger than what's left borrows against future refills, so
+    a single large request waits no longer than its share of the rate and
+    requests larger than the capacity still get through.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # The lock keeps waiters in arrival order.
+        async with self._lock:
+            self._refill()
+            needed = min(amount, self.capacity)
+            if self._tokens < needed:
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= amount
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying after `error`, or None if it isn't retryable."""
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code != 429 and error.status_code < 500:
+            return None
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), MAX_RETRY_BACKOFF)
+            except ValueError:
+                pass
+    elif not isinstance(error, (openai.APIConnectionError, httpx.HTTPError)):
+        return None
+    # Full jitter keeps workers that failed together from retrying together.
+    return random.uniform(0.5, 1.0) * min(RETRY_BACKOFF * 2 ** attempt, MAX_RETRY_BACKOFF)
+
+
+def select_chats_to_generate(engine: Engine, chat_ids: List[int], last_role: Optional[RoleEnum]) -> List[int]:
+    """The chats of `chat_ids` that exist and, with `last_role`, end with a message of that role."""
+    last_message_role = (
+        select(Message.role)
+        .where(Message.chat_id == Chat.id)
+        .order_by(Message.position.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    selected = []
+    with Session(bind=engine) as db:
+        for start in range(0, len(chat_ids), LOAD_CHUNK_SIZE):
+            stmt = select(Chat.id).where(Chat.id.in_(chat_ids[start:start + LOAD_CHUNK_SIZE]))
+            if last_role is not None:
+                stmt = stmt.where(last_message_role == last_role)
+            selected.extend(db.scalars(stmt.order_by(Chat.id)))
+    return selected
+
+
+def _build_requests(
+    engine: Engine, chat_ids: List[int], config: GenerationConfig
+) -> List[Tuple[int, Dict[str, Any], int]]:
+    # (chat id, completion request, estimated tokens) for a chunk of chats.
+    with Session(bind=engine) as db:
+        chats = db.scalars(select(Chat).where(Chat.id.in_(chat_ids)).options(*chat_details_options())).all()
+        return [
+            (chat.id, build_completion_request(chat, config), chat.token_count + (config.max_completion_tokens or 0))
+            for chat in sorted(chats, key=lambda chat: chat.id)
+        ]
+
+
+def _write_replies(engine: Engine, replies: List[Tuple[int, str, List[Dict[str, str]]]]) -> int:
+    with Session(bind=engine) as db:
+        saved = save_replies(db, replies)
+        invalidate_chats(db, saved)
+        return len(saved)
+
+
+class _Counters:
+    def __init__(self):
+        self.generated = 0
+        self.cached = 0
+        self.saved = 0
+        self.failed = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def fail(self, chat_id: int, error: Exception) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"chat_id": chat_id, "error": str(error)})
+
+
+async def generate_replies(
+    engine: Engine,
+    chat_ids: List[int],
+    config: GenerationConfig,
+    options: GenerationJobOptions,
+    job: Job,
+    cache: Optional[CompletionCache] = None,
+) -> Dict[str, Any]:
+    """Generate and save the next assistant message of many chats.
+
+    A loader feeds completion requests, built a chunk of chats at a time,
+    to `options.concurrency` workers sharing one connection pool. Requests
+    go through token buckets for the request and token rates, and are
+    retried with exponential backoff on 429s, 5xx and connection errors.
+    A single writer saves replies in transactions of `write_batch_size`.
+    With a `cache`, cached completions are reused and new ones stored.
+    Cancelling the job abandons the completions in flight; finished ones
+    are still saved.
+    """
+    selected = await asyncio.to_thread(select_chats_to_generate, engine, chat_ids, options.last_role)
+    job.set_total(len(selected))
+
+    counters = _Counters()
+    requests: asyncio.Queue = asyncio.Queue(maxsize=2 * options.concurrency)
+    replies: asyncio.Queue = asyncio.Queue()
+    request_bucket = TokenBucket(options.requests_per_minute / 60) if options.requests_per_minute else None
+    token_bucket = TokenBucket(options.tokens_per_minute / 60) if options.tokens_per_minute else None
+    clients = OpenAIClientPool(max_connections=options.concurrency)
+    client = clients.get(config)
+
+    async def load() -> None:
+        try:
+            for start in range(0, len(selected), LOAD_CHUNK_SIZE):
+                chunk = selected[start:start + LOAD_CHUNK_SIZE]
+                items = await asyncio.to_thread(_build_requests, engine, chunk, config)
+                # Chats deleted since the selection count as done.
+                job.advance(len(chunk) - len(items))
+                for item in items:
+                    await requests.put(item)
+        except Exception:
+            # Workers would otherwise wait for requests that never come.
+            for worker in workers:
+                worker.cancel()
+            raise
+        for _ in workers:
+            await requests.put(None)
+
+    async def complete(chat_id: int, request: Dict[str, Any], tokens: int) -> None:
+        cache_key = completion_fingerprint(config, request)
+        if cache is not None and options.use_cache:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                counters.cached += 1
+                await replies.put((chat_id, cached.content, cached.tool_calls))
+                return
+        for attempt in range(options.max_retries + 1):
+            if request_bucket is not None:
+                await request_bucket.acquire()
+            if token_bucket is not None:
+                await token_bucket.acquire(tokens)
+            try:
+                response = await client.chat.completions.create(**request)
+            except (openai.APIError, httpx.HTTPError) as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt == options.max_retries:
+                    counters.fail(chat_id, e)
+                    return
+                counters.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            if not response.choices:
+                counters.fail(chat_id, ValueError("The completion has no choices"))
+                return
+            choice = response.choices[0]
+            tool_calls = [
+                {"name": call.function.name, "arguments": call.function.arguments}
+                for call in choice.message.tool_calls or []
+            ]
+            if response.usage is not None:
+                counters.prompt_tokens += response.usage.prompt_tokens
+                counters.completion_tokens += response.usage.completion_tokens
+            counters.generated += 1
+            content = choice.message.content or ""
+            if cache is not None:
+                completion = CachedCompletion(content=content, tool_calls=tool_calls, finish_reason=choice.finish_reason)
+                await asyncio.to_thread(cache.put, cache_key, config.model, completion)
+            await replies.put((chat_id, content, tool_calls))
+            return
+
+    async def work() -> None:
+        while (item := await requests.get()) is not None:
+            try:
+                await complete(*item)
+            except Exception as e:
+                logger.exception(f"Generating a reply for chat {item[0]} failed")
+                counters.fail(item[0], e)
+            job.advance()
+
+    async def write() -> None:
+        pending: List[Tuple[int, str, List[Dict[str, str]]]] = []
+        while True:
+            try:
+                reply = await asyncio.wait_for(replies.get(), timeout=WRITE_INTERVAL)
+            except asyncio.TimeoutError:
+                reply = _IDLE
+            if reply is not None and reply is not _IDLE:
+                pending.append(reply)
+                if len(pending) < options.write_batch_size:
+                    continue
+            if pending:
+                counters.saved += await asyncio.to_thread(_write_replies, engine, pending)
+                pending = []
+            if reply is None:
+                return
+
+    async def watch_cancel(tasks: List[asyncio.Task]) -> None:
+        while not job.cancelled:
+            await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+
+    writer = asyncio.create_task(write())
+    workers = [asyncio.create_task(work()) for _ in range(options.concurrency)]
+    tasks = [asyncio.create_task(load())] + workers
+    watcher = asyncio.create_task(watch_cancel(tasks))
+    try:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        watcher.cancel()
+        await replies.put(None)
+        await writer
+        await clients.aclose()
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+    return {
+        "selected": len(selected),
+        "generated": counters.generated,
+        "cached": counters.cached,
+        "saved": counters.saved,
+        "failed": counters.failed,
+        "retries": counters.retries,
+        "prompt_tokens": counters.prompt_tokens,
+        "completion_tokens": counters.completion_tokens,
+        "errors": counters.errors,
+    }
+
+
+def start_generation_job(
+    engine: Engine,
+    chat_ids: List[int],
+    config: GenerationConfig,
+    options: GenerationJobOptions,
+    cache: Optional[CompletionCache] = None,
+) -> Job:
+    """Generate the next assistant message of `chat_ids` in the background.
+
+    Raises `GenerationError` if the configuration doesn't allow completions.
+    """
+    check_generation_config(config)
+
+    def run(job: Job) -> dict:
+        result = asyncio.run(generate_replies(engine, chat_ids, config, options, job, cache))
+        logger.info(
+            f"Generated {result['generated']} replies ({result['cached']} more from the cache), "
+            f"{result['failed']} failed "
+            f"({job.throughput():.1f} chats/sec)"
+        )
+        return result
+
+    params = {"chats": len(chat_ids), "model": config.model, **options.model_dump(mode="json")}
+    return start_job(GENERATE_JOB, run, params=params)
@@ -1,7 +1,13 @@
-from sqlalchemy.orm import Session
-from lima_gui.models import Chat, Message, Tool
+import json
+from datetime import datetime
+from sqlalchemy import event, exists, func, select, text, update
+from sqlalchemy.orm import Session, selectinload
+from lima_gui.models import Chat, Message, Tag, Tool
+from lima_gui.models.chat import MESSAGE_SEARCH_TABLE, POSITION_GAP, RoleEnum, chat_tag_association
+from lima_gui.services.search import build_match_query
+from lima_gui.services.tokenizer import assign_token_counts, current_token_counts, get_token_counter
 from pydantic import BaseModel
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 
 class ToolSchema(BaseModel):
@@ -52,56 +58,366 @@ class ChatDetailsSchema(BaseModel):
     tools: List[ToolSchema]
     tokens: int
     messages: List[MessageSchema]
+    version: int
+
+
+class ChatSummarySchema(BaseModel):
+    id: int
+    name: str
+    message_count: int
+    language: str
+    tags: List[str]
+    tools: List[ToolSchema]
+    tokens: int
+    preview: Optional[str] = None
+    last_modified: Optional[datetime] = None
 
 
 def calculate_tokens(content: str) -> int:
-    # Placeholder function to calculate tokens
-    if not content:
-        return 0
-    return len(content.split())
+    # Uncached count with the configured tokenizer
+    return get_token_counter().count(content)
+
+
+@event.listens_for(Session, "before_flush")
+def _count_message_tokens(session, flush_context, instances):
+    # Per-message counts are stored so that the chat aggregates can be
+    # maintained by triggers without re-reading message bodies.
+    messages = [obj for obj in (*session.new, *session.dirty) if isinstance(obj, Message)]
+    if messages:
+        with session.no_autoflush:
+            assign_token_counts(session, messages)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ChatFilter(BaseModel):
+    tag: Optional[str] = None
+    language: Optional[str] = None
+    name: Optional[str] = None
+    search: Optional[str] = None  # Words in any message, as for /search
+
+    def is_empty(self) -> bool:
+        return not (self.tag or self.language or self.name or self.search)
+
+
+def chat_filter_conditions(
+    tag: Optional[str] = None,
+    language: Optional[str] = None,
+    name: Optional[str] = None,
+    search: Optional[str] = None,
+) -> list:
+    """WHERE conditions on `Chat` selecting chats by tag, language, name substring and message text."""
+    conditions = []
+    if language:
+        conditions.append(Chat.language == language)
+    if name:
+        conditions.append(Chat.name.ilike(f"%{_escape_like(name)}%", escape="\\"))
+    if tag:
+        conditions.append(
+            exists().where(
+                chat_tag_association.c.chat_id == Chat.id,
+                chat_tag_association.c.tag_name == tag,
+            )
+        )
+    if search:
+        matching = text(
+            f"SELECT messages.chat_id FROM {MESSAGE_SEARCH_TABLE} "
+            f"JOIN messages ON messages.id = {MESSAGE_SEARCH_TABLE}.rowid "
+            f"WHERE {MESSAGE_SEARCH_TABLE} MATCH :search_match"
+        ).bindparams(search_match=build_match_query(search)).columns(Message.chat_id)
+        conditions.append(Chat.id.in_(matching))
+    return conditions
+
+
+def find_chat_ids(db: Session, chat_filter: ChatFilter) -> List[int]:
+    """Ids of the chats matching `chat_filter`, in id order."""
+    conditions = chat_filter_conditions(**chat_filter.model_dump())
+    return list(db.scalars(select(Chat.id).where(*conditions).order_by(Chat.id)))
+
+
+def list_chats(
+    db: Session,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    tag: Optional[str] = None,
+    language: Optional[str] = None,
+    name: Optional[str] = None,
+) -> List[ChatSummarySchema]:
+    """List chat summaries ordered by id, using keyset pagination.
+
+    Everything is computed by a single query: message counts and token
+    totals are read from the aggregate columns, tags and tools come from
+    correlated subqueries, so no ORM objects (and no messages) are loaded.
+    """
+    tags = (
+        select(func.json_group_array(chat_tag_association.c.tag_name))
+        .where(chat_tag_association.c.chat_id == Chat.id)
+        .correlate(Chat)
+        .scalar_subquery()
+    )
+    tools = (
+        select(
+            func.json_group_array(
+                func.json_object(
+                    "name", Tool.name,
+                    "description", Tool.description,
+                    "parameters", func.json(Tool.parameters),
+                )
+            )
+        )
+        .where(Tool.chat_id == Chat.id)
+        .correlate(Chat)
+        .scalar_subquery()
+    )
+
+    stmt = select(
+        Chat.id, Chat.name, Chat.language,
+        Chat.message_count, Chat.token_count,
+        Chat.preview, Chat.last_modified,
+        tags.label("tags"),
+        tools.label("tools"),
+    )
+
+    if after_id is not None:
+        stmt = stmt.where(Chat.id > after_id)
+    stmt = stmt.where(*chat_filter_conditions(tag=tag, language=language, name=name))
+
+    stmt = stmt.order_by(Chat.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    return [
+        ChatSummarySchema(
+            id=row.id,
+            name=row.name,
+            message_count=row.message_count,
+            language=row.language,
+            tags=json.loads(row.tags),
+            tools=json.loads(row.tools),
+            tokens=row.token_count,
+            preview=row.preview,
+            last_modified=row.last_modified,
+        )
+        for row in db.execute(stmt)
+    ]
+
+def chat_details_options():
+    """Eager-loading plan for everything `ChatDetailsSchema` needs.
+
+    One query per collection, whatever the chat length: chat, messages,
+    tool calls, tags and tools.
+    """
+    return (
+        selectinload(Chat.messages).selectinload(Message.tool_calls),
+        selectinload(Chat.tags),
+        selectinload(Chat.tools),
+    )
+
+
+def load_chat(chat_id: int, db: Session) -> Optional[Chat]:
+    stmt = select(Chat).where(Chat.id == chat_id).options(*chat_details_options())
+    return db.scalars(stmt).first()
+
 
 def get_chat(chat_id: int, db: Session) -> Optional[ChatDetailsSchema]:
-    chat = db.query(Chat).get(chat_id)
+    chat = load_chat(chat_id, db)
     if not chat:
         return None
 
-    ordered_messages = sorted(chat.messages, key=lambda msg: msg.position)
-    messages = [MessageSchema.from_orm(msg) for msg in ordered_messages]
-    n_tokens = sum(calculate_tokens(message.content) for message in chat.messages)
-    n_msgs = len(chat.messages)
+    tokens = chat.token_count
+    counter = get_token_counter()
+    if any(msg.tokenizer != counter.id for msg in chat.messages):
+        # Counts made by a previously configured tokenizer: recount them in
+        # memory. Reads stay read-only; the retokenize job stores new counts.
+        tokens = sum(current_token_counts(db, chat.messages))
+
+    messages = [MessageSchema.from_orm(msg) for msg in chat.messages]
     tags = [tag.name for tag in chat.tags]
     tools = [ToolSchema.from_orm(tool) for tool in chat.tools]
 
     return ChatDetailsSchema(
         id=chat.id,
         name=chat.name,
-        n_msgs=n_msgs,
+        n_msgs=chat.message_count,
         language=chat.language,
         tags=tags,
         tools=tools,
-        tokens=n_tokens,
-        messages=messages
+        tokens=tokens,
+        messages=messages,
+        version=chat.version,
+    )
+
+class ChatEditError(ValueError):
+    """Raised for a change that cannot be applied to a chat."""
+
+
+class MessagePositionError(ChatEditError):
+    """Raised when a message is placed relative to a message of another chat."""
+
+
+def parse_role(value: Any) -> RoleEnum:
+    """Validate a role given by a client, case-insensitively."""
+    if value is None:
+        raise ChatEditError("Role cannot be null")
+    if not isinstance(value, str):
+        raise ChatEditError("Role must be a string")
+    value = value.strip()
+    if not value:
+        raise ChatEditError("Role cannot be empty")
+    try:
+        return RoleEnum(value.lower())
+    except ValueError:
+        raise ChatEditError("Invalid role value")
+
+
+def set_chat_tags(db: Session, chat: Chat, raw_tags: Any) -> None:
+    """Replace the tags of `chat`, creating missing tags. Blank and repeated names are skipped."""
+    raw_tags = raw_tags or []
+    if not isinstance(raw_tags, list):
+        raise ChatEditError("Tags must be provided as a list")
+    if not all(isinstance(tag_name, str) for tag_name in raw_tags):
+        raise ChatEditError("Each tag must be a string")
+
+    tag_names = list(dict.fromkeys(tag_name.strip() for tag_name in raw_tags if tag_name.strip()))
+    existing_tags = {}
+    if tag_names:
+        existing_tags = {tag.name: tag for tag in db.scalars(select(Tag).where(Tag.name.in_(tag_names)))}
+
+    new_tag_objects = []
+    for tag_name in tag_names:
+        tag_obj = existing_tags.get(tag_name)
+        if not tag_obj:
+            tag_obj = Tag(name=tag_name)
+            db.add(tag_obj)
+        new_tag_objects.append(tag_obj)
+
+    chat.tags = new_tag_objects
+
+
+def rebalance_positions(chat_id: int, db: Session) -> None:
+    """Respace the positions of a chat's messages POSITION_GAP apart, keeping their order.
+
+    Only needed once repeated insertions at the same spot have used up the
+    gap between two neighbours.
+    """
+    ranked = (
+        select(
+            Message.id.label("id"),
+            func.row_number().over(order_by=(Message.position, Message.id)).label("rank"),
+        )
+        .where(Message.chat_id == chat_id)
+        .subquery()
     )
+    db.execute(
+        update(Message.__table__)
+        .where(Message.__table__.c.id == ranked.c.id)
+        .values(position=ranked.c.rank * POSITION_GAP)
+    )
+    db.expire_all()
+
+
+def _slot_before(
+    chat_id: int, db: Session, before_id: Optional[int], exclude_id: Optional[int] = None
+) -> Tuple[int, Optional[RoleEnum]]:
+    """Free position right before message `before_id` (after the last message if None).
+
+    Also returns the role of the message that will precede it. Reads at
+    most the target and its predecessor through the (chat_id, position) index.
+    """
+    # Pending changes (e.g. earlier operations of a batch) must be visible.
+    db.flush()
+    others = [Message.chat_id == chat_id]
+    if exclude_id is not None:
+        others.append(Message.id != exclude_id)
+
+    if before_id is None:
+        last = db.execute(
+            select(Message.position, Message.role).where(*others).order_by(Message.position.desc()).limit(1)
+        ).first()
+        if last is None:
+            return POSITION_GAP, None
+        return last.position + POSITION_GAP, last.role
 
-def add_message(chat_id: int, db: Session) -> MessageSchema:
-    chat = db.query(Chat).get(chat_id)
-    role = "system"
-    last_position = max((msg.position for msg in chat.messages), default=0)
+    for _ in range(2):
+        upper = db.scalar(select(Message.position).where(Message.id == before_id, Message.chat_id == chat_id))
+        if upper is None:
+            raise MessagePositionError(f"Message {before_id} is not in chat {chat_id}")
+        lower = db.execute(
+            select(Message.position, Message.role)
+            .where(*others, Message.position < upper)
+            .order_by(Message.position.desc())
+            .limit(1)
+        ).first()
+        if lower is None:
+            return upper - POSITION_GAP, None
+        if upper - lower.position > 1:
+            return (lower.position + upper) // 2, lower.role
+        rebalance_positions(chat_id, db)
+    raise MessagePositionError(f"No free position before message {before_id}")
 
-    last_message = chat.messages[-1] if chat.messages else None
 
-    if last_message is not None:
-        role = "user" if last_message.role == "assistant" else "assistant"
+def insert_message(
+    chat_id: int,
+    db: Session,
+    before_id: Optional[int] = None,
+    role: Optional[RoleEnum] = None,
+    content: str = "",
+) -> Message:
+    """Add a message at the end of the chat, or right before message `before_id`, without committing.
+
+    Without `role`, the new message alternates with the one it follows.
+    """
+    position, previous_role = _slot_before(chat_id, db, before_id)
+    if role is None:
+        role = RoleEnum.system
+        if previous_role is not None:
+            role = RoleEnum.user if previous_role == RoleEnum.assistant else RoleEnum.assistant
 
     msg = Message(
         role=role, 
-        content="", 
-        chat=chat, 
-        position=last_position + 1,
+        content=content, 
+        chat_id=chat_id, 
+        position=position,
         tool_calls=[]
     )
     db.add(msg)
+    db.flush()
+    return msg
+
+
+def add_message(chat_id: int, db: Session, before_id: Optional[int] = None) -> Optional[MessageSchema]:
+    """Add an empty message at the end of the chat, or right before message `before_id`."""
+    if db.get(Chat, chat_id) is None:
+        return None
+
+    msg = insert_message(chat_id, db, before_id)
+    # Read the fields before the commit expires the object and forces a reload
+    message_id, role = msg.id, msg.role
     db.commit()
-    db.refresh(msg)
 
-    return MessageSchema.from_orm(msg)
\ No newline at end of file
+    return MessageSchema(id=message_id, role=role.value, content="", tool_calls=[])
+
+
+def place_message(message: Message, db: Session, before_id: Optional[int] = None) -> None:
+    """Move `message` right before message `before_id` (to the end if None), without committing."""
+    if before_id == message.id:
+        return
+    position, _ = _slot_before(message.chat_id, db, before_id, exclude_id=message.id)
+    message.position = position
+
+
+def move_message(chat_id: int, message_id: int, db: Session, before_id: Optional[int] = None) -> Optional[Message]:
+    """Move a message right before message `before_id`, or to the end of the chat if None.
+
+    Only the moved message's position is written, unless the gap at the
+    destination is used up and the chat is rebalanced.
+    """
+    message = db.scalars(select(Message).where(Message.id == message_id, Message.chat_id == chat_id)).first()
+    if message is None:
+        return None
+
+    place_message(message, db, before_id)
+    db.commit()
+    return message
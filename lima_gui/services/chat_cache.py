@@ -0,0 +1,121 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy.engine import Engine
+
+
+DEFAULT_CHAT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ChatCacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
+
+
+class ChatDetailsCache:
+    """LRU of serialized chat detail responses, bounded by their total size.
+
+    Entries are keyed by chat id and hold the body for one ETag, which
+    names the chat version (and tokenizer) it was built for. A lookup only
+    hits for the chat's current ETag, and versions are never reused, so a
+    stale body is never served even if an invalidation is missed;
+    invalidating only frees the memory early. Thread-safe: the sync
+    endpoints call it from worker threads.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CHAT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, Tuple[str, bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, chat_id: int, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(chat_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, chat_id: int, etag: str, body: bytes) -> None:
+        with self._lock:
+            self._remove(chat_id)
+            if len(body) > self.max_bytes:
+                return
+            self._entries[chat_id] = (etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, chat_ids: Iterable[int]) -> None:
+        with self._lock:
+            for chat_id in chat_ids:
+                if self._remove(chat_id):
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> ChatCacheStats:
+        with self._lock:
+            return ChatCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                invalidations=self.invalidations,
+                entries=len(self._entries),
+                size_bytes=self._size,
+                max_bytes=self.max_bytes,
+            )
+
+    def _remove(self, chat_id: int) -> bool:
+        entry = self._entries.pop(chat_id, None)
+        if entry is None:
+            return False
+        self._size -= len(entry[1])
+        return True
+
+
+def get_configured_cache_size() -> int:
+    """Cache size in bytes from the `LIMA_GUI_CHAT_CACHE_BYTES` env variable (0 disables it)."""
+    if os.getenv("LIMA_GUI_CHAT_CACHE_BYTES"):
+        return int(os.getenv("LIMA_GUI_CHAT_CACHE_BYTES"))
+    return DEFAULT_CHAT_CACHE_BYTES
+
+
+# One cache per engine: chat ids and versions are only unique within a database.
+_caches: "weakref.WeakKeyDictionary[Engine, ChatDetailsCache]" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def get_chat_details_cache(engine: Engine) -> ChatDetailsCache:
+    with _caches_lock:
+        cache = _caches.get(engine)
+        if cache is None:
+            cache = _caches[engine] = ChatDetailsCache(get_configured_cache_size())
+        return cache
+
+
+def invalidate_chats(db, chat_ids: Iterable[int]) -> None:
+    """Drop the cached details of chats changed or deleted through `db`."""
+    get_chat_details_cache(db.get_bind()).invalidate(chat_ids)
@@ -0,0 +1,105 @@
+import json
+from typing import Dict, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+COPY_SUFFIX = " - Copy"
+
+
+# Source chats (and their messages) are numbered in id order, and the copies
+# get consecutive new ids in the same order, so `row_number()` maps every
+# source row to its copy without a round trip per row.
+_SOURCE_CHATS = "SELECT value AS id FROM json_each(:ids)"
+
+_CHAT_MAP = f"""
+    chat_map AS (
+        SELECT id AS old_id, :chat_base + row_number() OVER (ORDER BY id) AS new_id
+        FROM ({_SOURCE_CHATS})
+    )
+"""
+
+_MESSAGE_MAP = f"""
+    message_map AS (
+        SELECT id AS old_id, :message_base + row_number() OVER (ORDER BY id) AS new_id
+        FROM messages WHERE chat_id IN ({_SOURCE_CHATS})
+    )
+"""
+
+_CLONE_CHATS = f"""
+    INSERT INTO chats (id, name, language)
+    SELECT (SELECT coalesce(max(id), 0) FROM chats) + row_number() OVER (ORDER BY id), name || :suffix, language
+    FROM chats WHERE id IN ({_SOURCE_CHATS})
+    ORDER BY id
+"""
+
+_CLONE_TAGS = f"""
+    WITH {_CHAT_MAP}
+    INSERT INTO chat_tag (chat_id, tag_name)
+    SELECT chat_map.new_id, chat_tag.tag_name
+    FROM chat_tag JOIN chat_map ON chat_tag.chat_id = chat_map.old_id
+    ORDER BY chat_tag.rowid
+"""
+
+_CLONE_TOOLS = f"""
+    WITH {_CHAT_MAP}
+    INSERT INTO tools (chat_id, name, description, parameters)
+    SELECT chat_map.new_id, tools.name, tools.description, tools.parameters
+    FROM tools JOIN chat_map ON tools.chat_id = chat_map.old_id
+    ORDER BY tools.rowid
+"""
+
+# Token counts are copied along with the tokenizer and content hash they
+# were computed for, so the copies never need a recount.
+_CLONE_MESSAGES = f"""
+    WITH {_CHAT_MAP}, {_MESSAGE_MAP}
+    INSERT INTO messages (id, chat_id, role, content, position, token_count, tokenizer, content_hash)
+    SELECT message_map.new_id, chat_map.new_id,
+           messages.role, messages.content, messages.position,
+           messages.token_count, messages.tokenizer, messages.content_hash
+    FROM messages
+    JOIN message_map ON messages.id = message_map.old_id
+    JOIN chat_map ON messages.chat_id = chat_map.old_id
+    ORDER BY messages.id
+"""
+
+_CLONE_TOOL_CALLS = f"""
+    WITH {_MESSAGE_MAP}
+    INSERT INTO tool_calls (tool_call_id, name, arguments, message_id)
+    SELECT tool_calls.tool_call_id, tool_calls.name, tool_calls.arguments, message_map.new_id
+    FROM tool_calls JOIN message_map ON tool_calls.message_id = message_map.old_id
+    ORDER BY tool_calls.id
+"""
+
+
+def clone_chats(db: Session, chat_ids: Iterable[int], suffix: str = COPY_SUFFIX) -> Dict[int, int]:
+    """Copy chats with their messages, tool calls, tools and tags inside the database.
+
+    Each table is copied by one INSERT … SELECT, whatever the number of
+    chats and messages; the aggregate, search and version triggers fill in
+    the rest. Unknown ids are skipped. Returns the id of each copy by source
+    id. The copies are flushed but not committed.
+    """
+    db.flush()
+    chat_ids = list(db.scalars(
+        text(f"SELECT id FROM chats WHERE id IN ({_SOURCE_CHATS}) ORDER BY id"),
+        {"ids": json.dumps(list(chat_ids))},
+    ))
+    if not chat_ids:
+        return {}
+
+    ids = json.dumps(chat_ids)
+    # The first insert takes the database write lock, so the id ranges read
+    # after it can't be claimed by another writer before the copies are in.
+    db.execute(text(_CLONE_CHATS), {"ids": ids, "suffix": suffix})
+    chat_base = db.scalar(text("SELECT max(id) FROM chats")) - len(chat_ids)
+    message_base = db.scalar(text("SELECT coalesce(max(id), 0) FROM messages"))
+
+    params = {"ids": ids, "chat_base": chat_base, "message_base": message_base}
+    db.execute(text(_CLONE_TAGS), params)
+    db.execute(text(_CLONE_TOOLS), params)
+    db.execute(text(_CLONE_MESSAGES), params)
+    db.execute(text(_CLONE_TOOL_CALLS), params)
+
+    return {chat_id: chat_base + index for index, chat_id in enumerate(chat_ids, start=1)}
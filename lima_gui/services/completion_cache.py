@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import Column, Float, Index, Integer, MetaData, String, Table, Text, delete, func, select, text, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.models.db import EngineProfile, create_chat_engine, get_app_data_dir
+from lima_gui.services.generation import GenerationConfig
+
+
+DEFAULT_COMPLETION_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_COMPLETION_CACHE_MAX_AGE = 30 * 24 * 3600  # Seconds
+# Eviction frees down to this share of the size limit, so it doesn't run on every store.
+EVICTION_LOW_WATERMARK = 0.9
+
+CACHE_PROFILE = EngineProfile(
+    name="completion-cache",
+    pragmas={"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000},
+)
+
+cache_metadata = MetaData()
+
+completion_cache_table = Table(
+    "completion_cache",
+    cache_metadata,
+    Column("key", String, primary_key=True),  # completion_fingerprint()
+    Column("model", String, nullable=False),
+    Column("completion", Text, nullable=False),  # CachedCompletion as JSON
+    Column("size", Integer, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("last_used_at", Float, nullable=False),
+    Column("hits", Integer, nullable=False, server_default="0"),
+    Index("ix_completion_cache_last_used_at", "last_used_at"),
+    Index("ix_completion_cache_created_at", "created_at"),
+)
+
+
+class CachedCompletion(BaseModel):
+    content: str
+    tool_calls: List[Dict[str, str]] = []
+    finish_reason: Optional[str] = None
+
+
+class CompletionCacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_rate: Optional[float] = None
+    stores: int
+    evictions: int
+    expirations: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
+    max_age_seconds: float
+
+
+def completion_fingerprint(config: GenerationConfig, request: Dict[str, Any]) -> str:
+    """Cache key of a completion request to the API at `config.api_base`.
+
+    The request holds the model, messages, tools, sampling parameters and
+    `extra_body`; whether it is streamed doesn't change the completion.
+    """
+    payload = {key: value for key, value in request.items() if key != "stream"}
+    canonical = json.dumps([config.api_base, payload], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Completions persisted in their own SQLite database, by request fingerprint.
+
+    Entries older than `max_age` seconds are never served and are deleted
+    as new ones are stored. When the entries outgrow `max_bytes`, the least
+    recently used are evicted. Thread-safe; counters cover this process.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_bytes: int = DEFAULT_COMPLETION_CACHE_BYTES,
+        max_age: float = DEFAULT_COMPLETION_CACHE_MAX_AGE,
+    ):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        kwargs = {}
+        if make_url(url).database in (None, "", ":memory:"):
+            kwargs = {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+        self.engine: Engine = create_chat_engine(url, CACHE_PROFILE, **kwargs)
+        cache_metadata.create_all(self.engine)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        with self.engine.connect() as connection:
+            self._size = connection.scalar(select(func.coalesce(func.sum(completion_cache_table.c.size), 0)))
+
+    def get(self, key: str) -> Optional[CachedCompletion]:
+        table = completion_cache_table
+        now = time.time()
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                select(table.c.completion).where(table.c.key == key, table.c.created_at >= now - self.max_age)
+            ).first()
+            if row is not None:
+                connection.execute(
+                    update(table).where(table.c.key == key).values(last_used_at=now, hits=table.c.hits + 1)
+                )
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return CachedCompletion.model_validate_json(row.completion)
+
+    def put(self, key: str, model: str, completion: CachedCompletion) -> None:
+        """Store `completion` under `key`, replacing any previous one."""
+        table = completion_cache_table
+        payload = completion.model_dump_json()
+        size = len(key) + len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self.engine.begin() as connection:
+            previous = connection.scalar(select(table.c.size).where(table.c.key == key)) or 0
+            connection.execute(
+                insert(table)
+                .values(key=key, model=model, completion=payload, size=size, created_at=now, last_used_at=now)
+                .on_conflict_do_update(
+                    index_elements=[table.c.key],
+                    set_={"completion": payload, "size": size, "created_at": now, "last_used_at": now, "hits": 0},
+                )
+            )
+            self._size += size - previous
+            self.stores += 1
+
+            expired = connection.execute(delete(table).where(table.c.created_at < now - self.max_age)).rowcount
+            if expired:
+                self.expirations += expired
+                self._size = connection.scalar(select(func.coalesce(func.sum(table.c.size), 0)))
+            if self._size > self.max_bytes:
+                self._evict(connection)
+
+    def _evict(self, connection) -> None:
+        # Least recently used first, until the running total frees enough.
+        excess = self._size - int(self.max_bytes * EVICTION_LOW_WATERMARK)
+        self.evictions += connection.execute(text(
+            "DELETE FROM completion_cache WHERE key IN ("
+            " SELECT key FROM ("
+            "  SELECT key, size, SUM(size) OVER (ORDER BY last_used_at, key) AS freed FROM completion_cache"
+            " ) WHERE freed - size < :excess"
+            ")"
+        ), {"excess": excess}).rowcount
+        self._size = connection.scalar(select(func.coalesce(func.sum(completion_cache_table.c.size), 0)))
+
+    def clear(self) -> None:
+        with self._lock, self.engine.begin() as connection:
+            connection.execute(delete(completion_cache_table))
+            self._size = 0
+
+    def stats(self) -> CompletionCacheStats:
+        with self.engine.connect() as connection:
+            entries = connection.scalar(select(func.count()).select_from(completion_cache_table))
+        with self._lock:
+            lookups = self.hits + self.misses
+            return CompletionCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hits / lookups if lookups else None,
+                stores=self.stores,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                entries=entries,
+                size_bytes=self._size,
+                max_bytes=self.max_bytes,
+                max_age_seconds=self.max_age,
+            )
+
+    def close(self) -> None:
+        self.engine.dispose()
+
+
+def get_completion_cache_url() -> str:
+    """Database URL of the completion cache, from `COMPLETION_CACHE_DB_URL` or in the app data directory."""
+    if os.getenv("COMPLETION_CACHE_DB_URL"):
+        return os.getenv("COMPLETION_CACHE_DB_URL")
+    return f"sqlite:///{get_app_data_dir() / 'completion_cache.db'}"
+
+
+def open_completion_cache() -> Optional[CompletionCache]:
+    """The completion cache configured by the environment, or None if disabled.
+
+    `LIMA_GUI_COMPLETION_CACHE_BYTES` sets the size limit (0 disables the
+    cache) and `LIMA_GUI_COMPLETION_CACHE_MAX_AGE` the entry lifetime in seconds.
+    """
+    max_bytes = int(os.getenv("LIMA_GUI_COMPLETION_CACHE_BYTES") or DEFAULT_COMPLETION_CACHE_BYTES)
+    if max_bytes <= 0:
+        return None
+    max_age = float(os.getenv("LIMA_GUI_COMPLETION_CACHE_MAX_AGE") or DEFAULT_COMPLETION_CACHE_MAX_AGE)
+    return CompletionCache(get_completion_cache_url(), max_bytes=max_bytes, max_age=max_age)
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import re
+import zlib
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+SHINGLE_SIZE = 3  # Words per shingle
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+# Pairs this similar share a band bucket with a probability of ~97%; pairs
+# below about (1 / LSH_BANDS) ** (1 / LSH_ROWS) ~ 0.7 rarely do.
+DEFAULT_THRESHOLD = 0.8
+MIN_THRESHOLD = 0.5
+
+SIGNATURE_BATCH_SIZE = 500  # Chats signed per round trip
+_MAX_CHUNK_SHINGLES = 1 << 14  # Bounds the (shingles x permutations) buffer to 16 MiB
+
+_WORD_RE = re.compile(r"\w+")
+_MASK_32 = np.uint64(0xFFFFFFFF)
+_SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _hash_parameters(label: str, count: int) -> np.ndarray:
+    # Derived from blake2b rather than a random generator, so persisted
+    # signatures stay comparable across NumPy versions.
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(f"{label}{i}".encode(), digest_size=8).digest(), "little") for i in range(count)],
+        dtype=np.uint64,
+    )
+
+
+# Permutation i maps a 32-bit shingle hash x to (A[i] * x + B[i]) >> 32
+# (multiply-shift hashing, modulo 2**64).
+_PERMUTATION_A = _hash_parameters("a", NUM_PERMUTATIONS) | np.uint64(1)
+_PERMUTATION_B = _hash_parameters("b", NUM_PERMUTATIONS)
+
+
+class DuplicateClusterSchema(BaseModel):
+    chat_ids: List[int]
+    # Lowest estimated Jaccard similarity among the pairs linking the cluster.
+    similarity: float
+
+
+class DuplicateClustersSchema(BaseModel):
+    threshold: float
+    chats_indexed: int
+    clusters: List[DuplicateClusterSchema]
+
+
+class NearDuplicate(BaseModel):
+    chat_id: int
+    duplicate_of: int
+    similarity: float
+
+
+def shingle_hashes(content: str) -> np.ndarray:
+    """Distinct 32-bit hashes of the word `SHINGLE_SIZE`-grams of `content`, case-folded."""
+    words = _WORD_RE.findall(content.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    word_hashes = np.fromiter((zlib.crc32(word.encode()) for word in words), dtype=np.uint64, count=len(words))
+    # Texts shorter than a shingle make up one shingle.
+    n_shingles = max(len(words) - SHINGLE_SIZE + 1, 1)
+    hashes = word_hashes[:n_shingles].copy()
+    for offset in range(1, min(SHINGLE_SIZE, len(words))):
+        hashes = hashes * _SHINGLE_MULTIPLIER + word_hashes[offset:offset + n_shingles]
+    return np.unique((hashes >> np.uint64(32)) ^ (hashes & _MASK_32))
+
+
+def _permute(shingles: np.ndarray, out: np.ndarray) -> np.ndarray:
+    # In place: temporaries of this size would cost more than the arithmetic.
+    np.multiply(shingles[:, None], _PERMUTATION_A, out=out)
+    out += _PERMUTATION_B
+    out >>= np.uint64(32)
+    return out
+
+
+def minhash_signatures(shingle_sets: Sequence[np.ndarray]) -> np.ndarray:
+    """MinHash signatures (one uint32 row per set) of non-empty `shingle_sets`.
+
+    Sets are concatenated into chunks of about `_MAX_CHUNK_SHINGLES`, each
+    permuted by a single broadcast product into a reused buffer and reduced
+    per set with `np.minimum.reduceat`; larger sets are reduced slice by slice.
+    """
+    signatures = np.empty((len(shingle_sets), NUM_PERMUTATIONS), dtype=np.uint64)
+    buffer = np.empty((_MAX_CHUNK_SHINGLES, NUM_PERMUTATIONS), dtype=np.uint64)
+    start = 0
+    while start < len(shingle_sets):
+        end, size = start, 0
+        while end < len(shingle_sets) and (end == start or size + len(shingle_sets[end]) <= _MAX_CHUNK_SHINGLES):
+            size += len(shingle_sets[end])
+            end += 1
+
+        if size > _MAX_CHUNK_SHINGLES:
+            shingles = shingle_sets[start]
+            signatures[start] = np.minimum.reduce([
+                _permute(part, buffer[:len(part)]).min(axis=0)
+                for part in np.array_split(shingles, -(-len(shingles) // _MAX_CHUNK_SHINGLES))
+            ])
+        else:
+            chunk = shingle_sets[start:end]
+            permuted = _permute(np.concatenate(chunk), buffer[:size])
+            offsets = np.cumsum([0] + [len(shingles) for shingles in chunk[:-1]])
+            signatures[start:end] = np.minimum.reduceat(permuted, offsets, axis=0)
+        start = end
+    return signatures.astype(np.uint32)
+
+
+def lsh_buckets(signatures: np.ndarray) -> np.ndarray:
+    """One signed 64-bit bucket key per band for each signature row."""
+    bands = signatures.astype(np.uint64).reshape(len(signatures), LSH_BANDS, LSH_ROWS)
+    keys = np.zeros((len(signatures), LSH_BANDS), dtype=np.uint64)
+    for row in range(LSH_ROWS):
+        keys = keys * _SHINGLE_MULTIPLIER + bands[:, :, row]
+    return keys.view(np.int64)
+
+
+def _signature(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.uint32)
+
+
+def _sign_chats(db: Session, chat_ids: List[int]) -> None:
+    ids = json.dumps(chat_ids)
+    contents: Dict[int, List[str]] = {chat_id: [] for chat_id in chat_ids}
+    for chat_id, content in db.execute(
+        text(
+            "SELECT chat_id, content FROM messages WHERE chat_id IN (SELECT value FROM json_each(:ids)) "
+            "ORDER BY chat_id, position, id"
+        ),
+        {"ids": ids},
+    ):
+        contents[chat_id].append(content or "")
+
+    db.execute(text("DELETE FROM chat_signatures WHERE chat_id IN (SELECT value FROM json_each(:ids))"), {"ids": ids})
+    db.execute(text("DELETE FROM chat_lsh_buckets WHERE chat_id IN (SELECT value FROM json_each(:ids))"), {"ids": ids})
+
+    # Chats without any words have nothing to compare and stay out of the index.
+    shingled = [(chat_id, shingle_hashes("\n".join(parts))) for chat_id, parts in contents.items()]
+    shingled = [(chat_id, shingles) for chat_id, shingles in shingled if len(shingles)]
+    if not shingled:
+        return
+    signatures = minhash_signatures([shingles for _, shingles in shingled])
+    buckets = lsh_buckets(signatures)
+
+    connection = db.connection()
+    connection.exec_driver_sql(
+        "INSERT INTO chat_signatures (chat_id, signature) VALUES (?, ?)",
+        [(chat_id, signature.tobytes()) for (chat_id, _), signature in zip(shingled, signatures)],
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO chat_lsh_buckets (band, bucket, chat_id) VALUES (?, ?, ?)",
+        [
+            (band, int(bucket), chat_id)
+            for (chat_id, _), chat_buckets in zip(shingled, buckets)
+            for band, bucket in enumerate(chat_buckets)
+        ],
+    )
+
+
+def update_duplicate_index(db: Session) -> int:
+    """Re-sign the chats changed since the last update. Returns how many were.
+
+    Chat versions come from one dataset-wide counter, so the chats to
+    re-sign are those with a version above the one recorded at the last
+    update. Flushed but not committed.
+    """
+    db.flush()
+    indexed_version = db.scalar(text("SELECT indexed_version FROM dedup_state WHERE id = 1"))
+    current_version = db.scalar(text("SELECT version FROM dataset_version WHERE id = 1"))
+    if indexed_version == current_version:
+        return 0
+
+    chat_ids = db.scalars(
+        text("SELECT id FROM chats WHERE version > :version ORDER BY id"), {"version": indexed_version}
+    ).all()
+    for i in range(0, len(chat_ids), SIGNATURE_BATCH_SIZE):
+        _sign_chats(db, chat_ids[i:i + SIGNATURE_BATCH_SIZE])
+    db.execute(text("UPDATE dedup_state SET indexed_version = :version WHERE id = 1"), {"version": current_version})
+    return len(chat_ids)
+
+
+def _similarities(db: Session, pairs: List[Tuple[int, int]]) -> np.ndarray:
+    chat_ids = sorted({chat_id for pair in pairs for chat_id in pair})
+    rows = db.execute(
+        text("SELECT chat_id, signature FROM chat_signatures WHERE chat_id IN (SELECT value FROM json_each(:ids))"),
+        {"ids": json.dumps(chat_ids)},
+    ).all()
+    index = {chat_id: i for i, (chat_id, _) in enumerate(rows)}
+    signatures = np.stack([_signature(blob) for _, blob in rows])
+    left = signatures[[index[a] for a, _ in pairs]]
+    right = signatures[[index[b] for _, b in pairs]]
+    return (left == right).mean(axis=1)
+
+
+_CANDIDATE_PAIRS = """
+    SELECT DISTINCT a.chat_id, b.chat_id
+    FROM chat_lsh_buckets a
+    JOIN chat_lsh_buckets b ON b.band = a.band AND b.bucket = a.bucket AND b.chat_id {order} a.chat_id
+"""
+
+
+def find_duplicate_clusters(db: Session, threshold: float = DEFAULT_THRESHOLD) -> DuplicateClustersSchema:
+    """Groups of chats linked by estimated Jaccard similarity of at least `threshold`.
+
+    Candidate pairs are the chats sharing an LSH band bucket; their
+    similarity is estimated from the signatures and the pairs above the
+    threshold are joined into clusters, largest first.
+    """
+    update_duplicate_index(db)
+    chats_indexed = db.scalar(text("SELECT count(*) FROM chat_signatures"))
+    pairs = [tuple(pair) for pair in db.execute(text(_CANDIDATE_PAIRS.format(order=">")))]
+    if not pairs:
+        return DuplicateClustersSchema(threshold=threshold, chats_indexed=chats_indexed, clusters=[])
+
+    similarities = _similarities(db, pairs)
+    parent: Dict[int, int] = {}
+
+    def find(chat_id: int) -> int:
+        root = chat_id
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[chat_id] != root:
+            parent[chat_id], chat_id = root, parent[chat_id]
+        return root
+
+    linked = [(pair, float(similarity)) for pair, similarity in zip(pairs, similarities) if similarity >= threshold]
+    for (a, b), _ in linked:
+        parent[find(a)] = find(b)
+
+    members: Dict[int, List[int]] = {}
+    for chat_id in parent:
+        members.setdefault(find(chat_id), []).append(chat_id)
+    lowest: Dict[int, float] = {}
+    for (a, _), similarity in linked:
+        root = find(a)
+        lowest[root] = min(lowest.get(root, 1.0), similarity)
+
+    clusters = [
+        DuplicateClusterSchema(chat_ids=sorted(chat_ids), similarity=lowest[root])
+        for root, chat_ids in members.items()
+    ]
+    clusters.sort(key=lambda cluster: (-len(cluster.chat_ids), cluster.chat_ids[0]))
+    return DuplicateClustersSchema(threshold=threshold, chats_indexed=chats_indexed, clusters=clusters)
+
+
+def find_near_duplicates(
+    db: Session, chat_ids: Iterable[int], threshold: float = DEFAULT_THRESHOLD
+) -> List[NearDuplicate]:
+    """For each of `chat_ids` with a near-duplicate among older chats, its most similar one."""
+    update_duplicate_index(db)
+    pairs = [
+        tuple(pair)
+        for pair in db.execute(
+            text(_CANDIDATE_PAIRS.format(order="<") + " WHERE a.chat_id IN (SELECT value FROM json_each(:ids))"),
+            {"ids": json.dumps(list(chat_ids))},
+        )
+    ]
+    if not pairs:
+        return []
+
+    best: Dict[int, NearDuplicate] = {}
+    for (chat_id, other_id), similarity in zip(pairs, _similarities(db, pairs)):
+        if similarity >= threshold and (chat_id not in best or similarity > best[chat_id].similarity):
+            best[chat_id] = NearDuplicate(chat_id=chat_id, duplicate_of=other_id, similarity=float(similarity))
+    return [best[chat_id] for chat_id in sorted(best)]
@@ -0,0 +1,56 @@
+import json
+from typing import Iterable
+
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+class DeleteResult(BaseModel):
+    chats_deleted: int
+    tags_deleted: int
+
+
+_DELETED_CHATS = "SELECT value FROM json_each(:ids)"
+
+# Children first, for connections without foreign keys enforced (the
+# ON DELETE CASCADE rules only apply when they are).
+_DELETE_CHILDREN = [
+    f"DELETE FROM tool_calls WHERE message_id IN (SELECT id FROM messages WHERE chat_id IN ({_DELETED_CHATS}))",
+    f"DELETE FROM messages WHERE chat_id IN ({_DELETED_CHATS})",
+    f"DELETE FROM tools WHERE chat_id IN ({_DELETED_CHATS})",
+    f"DELETE FROM chat_tag WHERE chat_id IN ({_DELETED_CHATS})",
+]
+
+
+def delete_chats(db: Session, chat_ids: Iterable[int]) -> DeleteResult:
+    """Delete chats with everything they own using a handful of set-based statements.
+
+    Messages, tool calls, tools and tag links go with their chat through the
+    ON DELETE CASCADE rules, and tags no longer used by any chat are removed.
+    Nothing is loaded into the session. Flushed but not committed.
+    """
+    db.flush()
+    ids = json.dumps(list(chat_ids))
+    tag_names = db.scalars(
+        text(f"SELECT DISTINCT tag_name FROM chat_tag WHERE chat_id IN ({_DELETED_CHATS})"), {"ids": ids}
+    ).all()
+
+    if not db.execute(text("PRAGMA foreign_keys")).scalar():
+        for statement in _DELETE_CHILDREN:
+            db.execute(text(statement), {"ids": ids})
+    chats_deleted = db.execute(text(f"DELETE FROM chats WHERE id IN ({_DELETED_CHATS})"), {"ids": ids}).rowcount
+
+    tags_deleted = 0
+    if tag_names:
+        tags_deleted = db.execute(
+            text(
+                "DELETE FROM tags WHERE name IN (SELECT value FROM json_each(:names)) "
+                "AND NOT EXISTS (SELECT 1 FROM chat_tag WHERE chat_tag.tag_name = tags.name)"
+            ),
+            {"names": json.dumps(tag_names)},
+        ).rowcount
+
+    # Objects of deleted chats still in the session must not be written back.
+    db.expire_all()
+    return DeleteResult(chats_deleted=chats_deleted, tags_deleted=tags_deleted)
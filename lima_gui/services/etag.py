@@ -0,0 +1,46 @@
+import hashlib
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from lima_gui.models import Chat
+from lima_gui.models.chat import dataset_version
+from lima_gui.services.tokenizer import get_token_counter
+
+
+def _tokenizer_tag(tokenizer_id: str) -> str:
+    return hashlib.blake2b(tokenizer_id.encode("utf-8"), digest_size=4).hexdigest()
+
+
+def chat_etag(chat_id: int, version: int, tokenizer_id: str) -> str:
+    # Token counts in the details depend on the configured tokenizer, which
+    # can change without a write to the chat.
+    return f'"chat-{chat_id}-v{version}-{_tokenizer_tag(tokenizer_id)}"'
+
+
+def dataset_etag(version: int, tokenizer_id: str) -> str:
+    # Token totals in the list are recounted when the tokenizer changes.
+    return f'"chats-v{version}-{_tokenizer_tag(tokenizer_id)}"'
+
+
+def get_chat_version(chat_id: int, db: Session) -> Optional[int]:
+    """Current version of a chat, or None if the chat doesn't exist."""
+    return db.scalar(select(Chat.version).where(Chat.id == chat_id))
+
+
+def get_dataset_etag(db: Session) -> str:
+    """ETag of the chat list: changes whenever any chat is added, edited or deleted."""
+    version = db.scalar(select(dataset_version.c.version).where(dataset_version.c.id == 1))
+    return dataset_etag(version or 0, get_token_counter().id)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an `If-None-Match` header value matches `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
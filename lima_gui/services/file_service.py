@@ -1,109 +1,197 @@
 # In services/file_service.py
-from typing import Optional
-from sqlalchemy.orm import Session
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, selectinload
 from lima_gui.models import Chat, Message, Tool, ToolCall, Tag
+from lima_gui.services.arrow_export import PARQUET_ROW_GROUP_SIZE, iter_arrow_stream, iter_parquet
+from lima_gui.services.chat import ChatFilter, chat_filter_conditions
+from lima_gui.services.importer import ChatImporter, ImportResult, DEFAULT_BATCH_SIZE
 import json
 
 
+EXPORT_CHUNK_SIZE = 500
+
+
 class FileService:
     def __init__(self, db: Session):
         self.db = db
     
-    def import_jsonl(self, file_path: str) -> int:
+    def import_jsonl(self, file_path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> ImportResult:
         """Import chats from a JSONL file and add to database."""
-        chats_added = 0
-        
-        with open(file_path, 'r') as f:
-            for line in f:
-                chat_data = json.loads(line)
-                # Convert from file format to database models
-                chat = Chat(name=chat_data.get("name", "Imported Chat"), language=chat_data.get("lang", "en"))
-                
-                # Add tags
-                for tag_name in chat_data.get("tags", []):
-                    tag = self.db.query(Tag).filter(Tag.name == tag_name).first()
-                    if not tag:
-                        tag = Tag(name=tag_name)
-                        self.db.add(tag)
-                    chat.tags.append(tag)
-                
-                # Add messages
-                for i, msg_data in enumerate(chat_data.get("messages", [])):
-                    message = Message(
-                        role=msg_data["role"],
-                        content=msg_data.get("content", ""),
-                        position=i
-                    )
-                    
-                    # Handle function calls if present
-                    if "function_call" in msg_data:
-                        tool_call = ToolCall(
-                            name=msg_data["function_call"]["name"],
-                            arguments=json.dumps(msg_data["function_call"].get("arguments", {}))
-                        )
-                        message.tool_calls.append(tool_call)
-                    
-                    chat.messages.append(message)
-                
-                # Add tools
-                for tool_data in chat_data.get("tools", []):
-                    tool = Tool(
-                        name=tool_data["function"]["name"],
-                        description=tool_data["function"].get("description", ""),
-                        parameters=tool_data["function"].get("parameters", {})
-                    )
-                    chat.tools.append(tool)
-                
-                self.db.add(chat)
-                chats_added += 1
-                
-        self.db.commit()
-        return chats_added
+        with open(file_path, 'rb') as f:
+            return ChatImporter(self.db, batch_size=batch_size).import_lines(f)
     
+    def count_chats(self, chat_filter: Optional[ChatFilter] = None) -> int:
+        conditions = chat_filter_conditions(**chat_filter.model_dump()) if chat_filter else []
+        return self.db.scalar(select(func.count()).select_from(Chat).where(*conditions))
+
+    def iter_chat_chunks(
+        self, chunk_size: int = EXPORT_CHUNK_SIZE, chat_filter: Optional[ChatFilter] = None
+    ) -> Iterator[List[Chat]]:
+        """Yield the chats matching `chat_filter` (all by default) in id order, fully loaded, a chunk at a time.
+
+        Chats are fetched with `yield_per` and their child collections with
+        `selectinload`, i.e. a constant number of queries per chunk. Each
+        chunk is expunged once consumed, so memory stays flat regardless of
+        the dataset size.
+        """
+        conditions = chat_filter_conditions(**chat_filter.model_dump()) if chat_filter else []
+        stmt = (
+            select(Chat)
+            .where(*conditions)
+            .options(
+                selectinload(Chat.messages).selectinload(Message.tool_calls),
+                selectinload(Chat.tags),
+                selectinload(Chat.tools),
+            )
+            .order_by(Chat.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for partition in self.db.scalars(stmt).partitions():
+            yield partition
+            for chat in partition:
+                self.db.expunge(chat)
+
+    def iter_chats(self, chunk_size: int = EXPORT_CHUNK_SIZE, chat_filter: Optional[ChatFilter] = None) -> Iterator[Chat]:
+        """Yield the chats matching `chat_filter` one by one, see `iter_chat_chunks`."""
+        for chunk in self.iter_chat_chunks(chunk_size, chat_filter):
+            yield from chunk
+
+    def iter_jsonl(
+        self,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        messages_only: bool = False,
+        chat_filter: Optional[ChatFilter] = None,
+    ) -> Iterator[str]:
+        """Yield the export one JSONL line at a time."""
+        serialize = serialize_chat_messages if messages_only else serialize_chat
+        for chat in self.iter_chats(chunk_size, chat_filter):
+            yield json.dumps(serialize(chat)) + "\n"
+
+    def iter_parquet(
+        self,
+        row_group_size: int = PARQUET_ROW_GROUP_SIZE,
+        chat_filter: Optional[ChatFilter] = None,
+        compression: str = "zstd",
+    ) -> Iterator[bytes]:
+        """Yield the export as a Parquet file, a row group of `row_group_size` chats at a time."""
+        return iter_parquet(self.iter_chat_chunks(row_group_size, chat_filter), compression=compression)
+
+    def iter_arrow(
+        self, chunk_size: int = PARQUET_ROW_GROUP_SIZE, chat_filter: Optional[ChatFilter] = None
+    ) -> Iterator[bytes]:
+        """Yield the export as an Arrow IPC stream, a record batch of `chunk_size` chats at a time."""
+        return iter_arrow_stream(self.iter_chat_chunks(chunk_size, chat_filter))
+
     def export_jsonl(self, file_path: str) -> int:
         """Export all chats from database to a JSONL file."""
-        chats = self.db.query(Chat).all()
-        
+        chats_exported = 0
         with open(file_path, 'w') as f:
-            for chat in chats:
-                # Convert to file format
-                chat_data = {
-                    "name": chat.name,
-                    "lang": chat.language,
-                    "tags": [tag.name for tag in chat.tags],
-                    "messages": [],
-                    "tools": []
+            for line in self.iter_jsonl():
+                f.write(line)
+                chats_exported += 1
+        return chats_exported
+
+    def export_parquet(
+        self, file_path: str, chat_filter: Optional[ChatFilter] = None, row_group_size: int = PARQUET_ROW_GROUP_SIZE
+    ) -> None:
+        """Export the chats matching `chat_filter` (all by default) to a Parquet file."""
+        with open(file_path, 'wb') as f:
+            for data in self.iter_parquet(row_group_size, chat_filter):
+                f.write(data)
+
+
+def _parse_arguments(arguments: Optional[str]):
+    if not arguments:
+        return {}
+    try:
+        return json.loads(arguments)
+    except json.JSONDecodeError:
+        return arguments
+
+
+def chat_record(
+    name: str,
+    language: str,
+    tags: Iterable[str],
+    messages: Iterable[Tuple[str, Optional[str], Sequence[tuple]]],
+    tools: Iterable[Tuple[str, Optional[str], Any]],
+) -> dict:
+    """Build a chat in the JSONL file format from plain values.
+
+    `messages` are `(role, content, tool_calls)` in position order, with tool
+    calls as `(tool_call_id, name, arguments)`; `tools` are
+    `(name, description, parameters)`.
+    """
+    chat_data = {
+        "name": name,
+        "lang": language,
+        "tags": list(tags),
+        "messages": [],
+        "tools": []
+    }
+
+    # Add messages
+    for role, content, tool_calls in messages:
+        msg_data = {
+            "role": role,
+            "content": content
+        }
+
+        # A single call uses the legacy `function_call` field, several calls
+        # the OpenAI `tool_calls` list.
+        if len(tool_calls) == 1:
+            _, tool_name, arguments = tool_calls[0]
+            msg_data["function_call"] = {
+                "name": tool_name,
+                "arguments": _parse_arguments(arguments)
+            }
+        elif tool_calls:
+            msg_data["tool_calls"] = [
+                {
+                    "id": tool_call_id,
+                    "type": "function",
+                    "function": {"name": tool_name, "arguments": arguments},
                 }
-                
-                # Add messages
-                for message in sorted(chat.messages, key=lambda m: m.position):
-                    msg_data = {
-                        "role": message.role.value,
-                        "content": message.content
-                    }
-                    
-                    # Add function call if present
-                    if message.tool_calls:
-                        tool_call = message.tool_calls[0]  # Assuming one tool call per message
-                        msg_data["function_call"] = {
-                            "name": tool_call.name,
-                            "arguments": json.loads(tool_call.arguments) if tool_call.arguments else {}
-                        }
-                    
-                    chat_data["messages"].append(msg_data)
-                
-                # Add tools
-                for tool in chat.tools:
-                    tool_data = {
-                        "type": "function",
-                        "function": {
-                            "name": tool.name,
-                            "description": tool.description,
-                            "parameters": tool.parameters
-                        }
-                    }
-                    chat_data["tools"].append(tool_data)
-                
-                f.write(json.dumps(chat_data) + "\n")
-            
-        return len(chats)
\ No newline at end of file
+                for tool_call_id, tool_name, arguments in tool_calls
+            ]
+
+        chat_data["messages"].append(msg_data)
+
+    # Add tools
+    for tool_name, description, parameters in tools:
+        tool_data = {
+            "type": "function",
+            "function": {
+                "name": tool_name,
+                "description": description,
+                "parameters": parameters
+            }
+        }
+        chat_data["tools"].append(tool_data)
+
+    return chat_data
+
+
+def serialize_chat(chat: Chat) -> dict:
+    """Convert a loaded chat to the JSONL file format."""
+    return chat_record(
+        chat.name,
+        chat.language,
+        [tag.name for tag in chat.tags],
+        [
+            (message.role.value, message.content, [(tc.tool_call_id, tc.name, tc.arguments) for tc in message.tool_calls])
+            for message in sorted(chat.messages, key=lambda m: m.position)
+        ],
+        [(tool.name, tool.description, tool.parameters) for tool in chat.tools],
+    )
+
+
+def serialize_chat_messages(chat: Chat) -> dict:
+    """Convert a loaded chat to the OpenAI fine-tuning format (messages only)."""
+    return {
+        "messages": [
+            {"role": message.role.value, "content": message.content}
+            for message in sorted(chat.messages, key=lambda m: m.position)
+        ]
+    }
@@ -0,0 +1,214 @@
+import json
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from lima_gui.models import Chat, ToolCall
+from lima_gui.models.chat import RoleEnum
+from lima_gui.services.chat import MessageSchema, insert_message
+
+
+GENERATION_TIMEOUT = 600.0  # Seconds; completions of long chats are slow
+CONNECT_TIMEOUT = 10.0
+MAX_CONNECTIONS = 64
+# Local OpenAI-compatible servers usually accept any key, but the client needs one.
+PLACEHOLDER_API_KEY = "EMPTY"
+
+
+class GenerationConfig(BaseModel):
+    """The fields of `openai_config.json` used for completions."""
+    enabled: bool = False
+    model: str
+    temperature: Optional[float] = None
+    api_type: str = "chat"
+    max_completion_tokens: Optional[int] = None
+    api_base: Optional[str] = None
+    api_key: Optional[str] = None
+    extra_body: Optional[Dict[str, Any]] = None
+
+
+class GenerationError(ValueError):
+    """Raised when the configuration doesn't allow generating completions."""
+
+
+def check_generation_config(config: GenerationConfig) -> None:
+    if not config.enabled:
+        raise GenerationError("Completions are disabled in the OpenAI settings")
+    if config.api_type != "chat":
+        raise GenerationError(f"Unsupported API type '{config.api_type}', only 'chat' is")
+    if config.api_base is None and not config.api_key:
+        raise GenerationError("An API key is required for the OpenAI API")
+
+
+class OpenAIClientPool:
+    """Shared `AsyncOpenAI` clients, one per API base and key.
+
+    Each client keeps a pool of HTTP connections that is reused by every
+    request, instead of a TLS handshake per completion. Clients are created
+    on first use within the application's event loop and closed with it.
+    """
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, timeout: float = GENERATION_TIMEOUT):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._clients: Dict[Tuple[Optional[str], Optional[str]], AsyncOpenAI] = {}
+
+    def get(self, config: GenerationConfig) -> AsyncOpenAI:
+        key = (config.api_base, config.api_key)
+        client = self._clients.get(key)
+        if client is None:
+            # An explicit HTTP client sets the pool limits (and sidesteps the
+            # default one of older `openai` releases, broken with httpx 0.28).
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(self.timeout, connect=CONNECT_TIMEOUT),
+            )
+            client = AsyncOpenAI(
+                api_key=config.api_key or PLACEHOLDER_API_KEY,
+                base_url=config.api_base,
+                http_client=http_client,
+                max_retries=0,
+            )
+            self._clients[key] = client
+        return client
+
+    async def aclose(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.close()
+
+
+def _tool_call_id(tool_call: ToolCall) -> str:
+    return f"call_{tool_call.tool_call_id if tool_call.tool_call_id is not None else tool_call.id}"
+
+
+def completion_messages(chat: Chat) -> List[Dict[str, Any]]:
+    """The chat's messages, in order, in the chat completions format.
+
+    Tool results aren't linked to the call they answer in the database, so
+    they are matched to the pending calls of the last assistant message in
+    order.
+    """
+    messages = []
+    pending_calls: deque = deque()
+    for message in sorted(chat.messages, key=lambda m: m.position):
+        data: Dict[str, Any] = {"role": message.role.value, "content": message.content or ""}
+        if message.role == RoleEnum.assistant and message.tool_calls:
+            data["tool_calls"] = [
+                {
+                    "id": _tool_call_id(tool_call),
+                    "type": "function",
+                    "function": {"name": tool_call.name, "arguments": tool_call.arguments or "{}"},
+                }
+                for tool_call in message.tool_calls
+            ]
+            pending_calls = deque(call["id"] for call in data["tool_calls"])
+        elif message.role == RoleEnum.tool and pending_calls:
+            data["tool_call_id"] = pending_calls.popleft()
+        messages.append(data)
+    return messages
+
+
+def build_completion_request(chat: Chat, config: GenerationConfig, stream: bool = False) -> Dict[str, Any]:
+    """Keyword arguments of `chat.completions.create` for the next assistant message of `chat`."""
+    request: Dict[str, Any] = {"model": config.model, "messages": completion_messages(chat)}
+    if stream:
+        request["stream"] = True
+    if config.temperature is not None:
+        request["temperature"] = config.temperature
+    if config.max_completion_tokens is not None:
+        request["max_completion_tokens"] = config.max_completion_tokens
+    if chat.tools:
+        request["tools"] = [
+            {
+                "type": "function",
+                "function": {
+                    "name": tool.name,
+                    "description": tool.description or "",
+                    "parameters": tool.parameters or {"type": "object", "properties": {}},
+                },
+            }
+            for tool in chat.tools
+        ]
+    if config.extra_body:
+        request["extra_body"] = config.extra_body
+    return request
+
+
+class CompletionAccumulator:
+    """Collects the content and tool calls of a streamed completion."""
+
+    def __init__(self):
+        self._content: List[str] = []
+        self._tool_calls: Dict[int, Dict[str, str]] = {}
+        self.finish_reason: Optional[str] = None
+
+    def add(self, chunk) -> str:
+        """Record a stream chunk and return its new content."""
+        if not chunk.choices:
+            return ""
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        delta = choice.delta
+        for tool_call in delta.tool_calls or []:
+            call = self._tool_calls.setdefault(tool_call.index, {"name": "", "arguments": ""})
+            if tool_call.function is not None:
+                call["name"] += tool_call.function.name or ""
+                call["arguments"] += tool_call.function.arguments or ""
+        if delta.content:
+            self._content.append(delta.content)
+            return delta.content
+        return ""
+
+    @property
+    def content(self) -> str:
+        return "".join(self._content)
+
+    @property
+    def tool_calls(self) -> List[Dict[str, str]]:
+        return [self._tool_calls[index] for index in sorted(self._tool_calls)]
+
+
+def _append_reply(db: Session, chat_id: int, content: str, tool_calls: List[Dict[str, str]]):
+    message = insert_message(chat_id, db, role=RoleEnum.assistant, content=content)
+    message.tool_calls = [ToolCall(name=call["name"], arguments=call["arguments"] or None) for call in tool_calls]
+    return message
+
+
+def save_reply(
+    db: Session, chat_id: int, content: str, tool_calls: List[Dict[str, str]] = ()
+) -> Optional[MessageSchema]:
+    """Append an assistant message with `content` and `tool_calls`; None if the chat is gone."""
+    if db.get(Chat, chat_id) is None:
+        return None
+    message = _append_reply(db, chat_id, content, tool_calls)
+    db.flush()
+    # Read the fields before the commit expires the object and forces a reload
+    reply = MessageSchema.from_orm(message)
+    db.commit()
+    return reply
+
+
+def save_replies(db: Session, replies: List[Tuple[int, str, List[Dict[str, str]]]]) -> List[int]:
+    """Append many `(chat_id, content, tool_calls)` replies in one transaction.
+
+    Returns the ids of the chats that got their reply; deleted chats are skipped.
+    """
+    existing = set(db.scalars(select(Chat.id).where(Chat.id.in_({chat_id for chat_id, _, _ in replies}))))
+    saved = []
+    for chat_id, content, tool_calls in replies:
+        if chat_id in existing:
+            _append_reply(db, chat_id, content, tool_calls)
+            saved.append(chat_id)
+    db.commit()
+    return saved
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
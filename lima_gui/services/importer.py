@@ -0,0 +1,374 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import jsonschema
+from loguru import logger
+from pydantic import BaseModel
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from lima_gui.models.chat import MESSAGE_SEARCH_TABLE, POSITION_GAP, PREVIEW_LENGTH, RoleEnum
+from lima_gui.services.dedup import DEFAULT_THRESHOLD, find_near_duplicates
+from lima_gui.services.stats import add_imported_stats
+from lima_gui.services.tokenizer import count_tokens_cached
+
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+# Older exports and OpenAI datasets use `function` for tool results.
+_ROLE_ALIASES = {"function": RoleEnum.tool.value}
+# Looked up once per imported message: a dict is much cheaper than `RoleEnum(...)`.
+_ROLES = {**{role.value: role for role in RoleEnum}, **{alias: RoleEnum(value) for alias, value in _ROLE_ALIASES.items()}}
+
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportDuplicate(BaseModel):
+    line: int
+    chat_id: int
+    duplicate_of: int
+    similarity: float
+
+
+class ImportResult(BaseModel):
+    chats_added: int = 0
+    lines_read: int = 0
+    error_count: int = 0
+    errors: List[ImportLineError] = []
+    # Only filled in when the import checks for near-duplicates.
+    duplicate_count: int = 0
+    duplicates: List[ImportDuplicate] = []
+
+
+class ChatImportError(ValueError):
+    """Raised for a JSONL line that cannot be turned into a chat."""
+
+
+def _as_list(value: Any, field: str) -> list:
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ChatImportError(f"'{field}' must be a list")
+    return value
+
+
+def _normalize_tool(tool_data: Any) -> Dict[str, Any]:
+    if not isinstance(tool_data, dict):
+        raise ChatImportError("Each tool must be an object")
+    # OpenAI format nests the definition under "function".
+    if isinstance(tool_data.get("function"), dict):
+        tool_data = tool_data["function"]
+
+    name = tool_data.get("name")
+    if not isinstance(name, str) or not name:
+        raise ChatImportError("Tool name must be a non-empty string")
+    parameters = tool_data.get("parameters")
+    if parameters is not None:
+        if not isinstance(parameters, dict):
+            raise ChatImportError(f"Parameters of tool '{name}' must be an object")
+        try:
+            jsonschema.validators.validator_for(parameters).check_schema(parameters)
+        except jsonschema.exceptions.SchemaError as e:
+            raise ChatImportError(f"Invalid JSON schema for tool '{name}': {e.message}")
+    return {"name": name, "description": tool_data.get("description"), "parameters": parameters}
+
+
+def _normalize_tool_call(tool_call: Any) -> Dict[str, Any]:
+    if not isinstance(tool_call, dict):
+        raise ChatImportError("Each tool call must be an object")
+    tool_call_id = tool_call.get("tool_call_id", tool_call.get("id"))
+    if isinstance(tool_call.get("function"), dict):
+        tool_call = tool_call["function"]
+
+    name = tool_call.get("name")
+    if not isinstance(name, str) or not name:
+        raise ChatImportError("Tool call name must be a non-empty string")
+    arguments = tool_call.get("arguments")
+    if arguments is not None and not isinstance(arguments, str):
+        arguments = json.dumps(arguments)
+    return {"tool_call_id": tool_call_id, "name": name, "arguments": arguments}
+
+
+def _normalize_message(message_data: Any, index: int) -> Dict[str, Any]:
+    if not isinstance(message_data, dict):
+        raise ChatImportError("Each message must be an object")
+
+    raw_role = message_data.get("role") or RoleEnum.system.value
+    if not isinstance(raw_role, str):
+        raise ChatImportError("Message role must be a string")
+    role = _ROLES.get(raw_role)
+    if role is None:
+        raw_role = raw_role.strip().lower()
+        role = _ROLES.get(raw_role)
+        if role is None:
+            raise ChatImportError(f"Invalid message role '{raw_role}'")
+
+    content = message_data.get("content")
+    if content is None:
+        content = ""
+    elif not isinstance(content, str):
+        raise ChatImportError("Message content must be a string")
+
+    position = message_data.get("position") or index
+    if not isinstance(position, int):
+        raise ChatImportError("Message position must be an integer")
+
+    tool_calls = [_normalize_tool_call(tc) for tc in _as_list(message_data.get("tool_calls"), "tool_calls")]
+    if isinstance(message_data.get("function_call"), dict):
+        tool_calls.append(_normalize_tool_call(message_data["function_call"]))
+
+    return {"role": role, "content": content, "position": position, "tool_calls": tool_calls}
+
+
+def parse_chat_line(line: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+    """Parse and normalize one JSONL line into a plain chat dict.
+
+    Accepts both the upload format (`language`, flat tools, `tool_calls`) and
+    the OpenAI-style export format (`lang`, `function` tools, `function_call`).
+    Returns None for blank lines and raises `ChatImportError` for invalid ones.
+    """
+    if not line.strip():
+        return None
+    try:
+        chat_data = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ChatImportError(f"Invalid JSON: {e}")
+    if not isinstance(chat_data, dict):
+        raise ChatImportError("Each line must be a JSON object")
+
+    name = chat_data.get("name") or "Imported Chat"
+    language = chat_data.get("language") or chat_data.get("lang") or "en"
+    if not isinstance(name, str) or not isinstance(language, str):
+        raise ChatImportError("Chat name and language must be strings")
+
+    tags = []
+    for tag_name in _as_list(chat_data.get("tags"), "tags"):
+        if not isinstance(tag_name, str):
+            continue
+        tag_name = tag_name.strip()
+        if tag_name and tag_name not in tags:
+            tags.append(tag_name)
+
+    tools = {}
+    for tool_data in _as_list(chat_data.get("tools"), "tools"):
+        tool = _normalize_tool(tool_data)
+        if tool["name"] in tools:
+            raise ChatImportError(f"Duplicate tool name '{tool['name']}'")
+        tools[tool["name"]] = tool
+
+    messages = [
+        _normalize_message(message_data, index)
+        for index, message_data in enumerate(_as_list(chat_data.get("messages"), "messages"), start=1)
+    ]
+    # Positions in the file only give the order; stored ones are gapped.
+    messages.sort(key=lambda message: message["position"])
+    for index, message in enumerate(messages, start=1):
+        message["position"] = index * POSITION_GAP
+
+    return {"name": name, "language": language, "tags": tags, "tools": list(tools.values()), "messages": messages}
+
+
+def _insert_sql(table: str, columns: Sequence[str], or_ignore: bool = False) -> str:
+    placeholders = ", ".join("?" for _ in columns)
+    verb = "INSERT OR IGNORE" if or_ignore else "INSERT"
+    return f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+def _insert_returning_ids(connection, table: str, columns: Sequence[str], rows: List[tuple]) -> List[int]:
+    """Insert `rows` and return their primary keys in order.
+
+    SQLite can't batch an INSERT whose RETURNING order must match the
+    parameters, so only the first row goes through RETURNING. That insert
+    also takes the database write lock, which makes the following ids
+    predictable: the remaining rows get consecutive explicit ids and are
+    inserted with a single plain executemany.
+    """
+    first_id = connection.exec_driver_sql(_insert_sql(table, columns) + " RETURNING id", rows[0]).scalar_one()
+    ids = list(range(first_id, first_id + len(rows)))
+    if len(rows) > 1:
+        connection.exec_driver_sql(
+            _insert_sql(table, ("id", *columns)),
+            [(row_id, *row) for row_id, row in zip(ids[1:], rows[1:])],
+        )
+    return ids
+
+
+class ChatImporter:
+    """Streaming bulk import of JSONL chats.
+
+    Lines are parsed one at a time and inserted in batches with bulk
+    `executemany` statements, one transaction per batch, so memory stays
+    bounded by the batch size. Invalid lines are reported and skipped; if
+    a batch fails in the database, its chats are retried one by one so only
+    the offending lines are lost. The per-row INSERT triggers are suspended
+    while a batch is written; its aggregates, versions, statistics and search
+    index entries are written set-based instead.
+
+    With `check_duplicates`, imported chats are then looked up in the
+    near-duplicate index against every older chat, including earlier lines
+    of the same file. Near-duplicates are reported, not skipped.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        check_duplicates: bool = False,
+        duplicate_threshold: float = DEFAULT_THRESHOLD,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.check_duplicates = check_duplicates
+        self.duplicate_threshold = duplicate_threshold
+        self.result = ImportResult()
+        self._chat_lines: Dict[int, int] = {}
+
+    def import_lines(self, lines: Iterable[Union[str, bytes]]) -> ImportResult:
+        """Import from any iterable of lines, e.g. an open (binary or text) file."""
+        batch: List[tuple] = []
+        for line_number, line in enumerate(lines, start=1):
+            self.result.lines_read = line_number
+            try:
+                chat = parse_chat_line(line)
+            except ChatImportError as e:
+                self._record_error(line_number, str(e))
+                continue
+            if chat is None:
+                continue
+
+            batch.append((line_number, chat))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+
+        if batch:
+            self._flush(batch)
+        if self.check_duplicates and self._chat_lines:
+            self._find_duplicates()
+        return self.result
+
+    def _find_duplicates(self) -> None:
+        duplicates = find_near_duplicates(self.db, self._chat_lines, self.duplicate_threshold)
+        self.db.commit()
+        self.result.duplicate_count = len(duplicates)
+        self.result.duplicates = [
+            ImportDuplicate(line=self._chat_lines[duplicate.chat_id], **duplicate.model_dump())
+            for duplicate in duplicates[:MAX_REPORTED_ERRORS]
+        ]
+
+    def _record_error(self, line_number: int, error: str) -> None:
+        self.result.error_count += 1
+        if len(self.result.errors) < MAX_REPORTED_ERRORS:
+            self.result.errors.append(ImportLineError(line=line_number, error=error))
+
+    def _flush(self, batch: List[tuple]) -> None:
+        try:
+            chat_ids = self._insert_batch([chat for _, chat in batch])
+            self.db.commit()
+            self.result.chats_added += len(batch)
+            if self.check_duplicates:
+                self._chat_lines.update(zip(chat_ids, (line_number for line_number, _ in batch)))
+            return
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            if len(batch) == 1:
+                self._record_error(batch[0][0], f"Database error: {getattr(e, 'orig', None) or e}")
+                return
+            logger.warning(f"Import batch failed ({e.__class__.__name__}), retrying its chats one by one")
+
+        for item in batch:
+            self._flush([item])
+
+    def _insert_batch(self, chats: List[Dict[str, Any]]) -> List[int]:
+        # Rows go straight to the driver's executemany: per-row parameter
+        # processing in SQLAlchemy would dominate the import time otherwise.
+        connection = self.db.connection()
+        # The per-row INSERT triggers skip this transaction's rows. Their work
+        # (aggregates, versions, statistics, search index) is done once for
+        # the whole batch instead.
+        connection.exec_driver_sql("UPDATE bulk_import_state SET active = 1 WHERE id = 1")
+
+        messages = [
+            (chat_index, message)
+            for chat_index, chat in enumerate(chats)
+            for message in chat["messages"]
+        ]
+        tokenizer_id, hashes, counts = count_tokens_cached(connection, [message["content"] for _, message in messages])
+
+        # Aggregates are computed here and inserted with the chats. Messages
+        # are sorted by position, so the preview comes from the first user one.
+        message_counts = [0] * len(chats)
+        token_counts = [0] * len(chats)
+        previews: List[Optional[str]] = [None] * len(chats)
+        for (chat_index, message), n_tokens in zip(messages, counts):
+            message_counts[chat_index] += 1
+            token_counts[chat_index] += n_tokens
+            if previews[chat_index] is None and message["role"] is RoleEnum.user:
+                previews[chat_index] = message["content"][:PREVIEW_LENGTH]
+
+        # One dataset version for the whole batch: chat versions only need to
+        # be new, not distinct.
+        version = connection.exec_driver_sql(
+            "UPDATE dataset_version SET version = version + 1 WHERE id = 1 RETURNING version"
+        ).scalar_one()
+        chat_ids = _insert_returning_ids(
+            connection,
+            "chats",
+            ("name", "language", "message_count", "token_count", "preview", "version"),
+            [
+                (chat["name"], chat["language"], message_counts[i], token_counts[i], previews[i], version)
+                for i, chat in enumerate(chats)
+            ],
+        )
+
+        # Tags are resolved once for the whole batch.
+        tag_names = {tag for chat in chats for tag in chat["tags"]}
+        if tag_names:
+            connection.exec_driver_sql(_insert_sql("tags", ("name",), or_ignore=True), [(name,) for name in tag_names])
+        tag_links = [(chat_id, tag) for chat_id, chat in zip(chat_ids, chats) for tag in chat["tags"]]
+        if tag_links:
+            connection.exec_driver_sql(_insert_sql("chat_tag", ("chat_id", "tag_name")), tag_links)
+
+        tools = [
+            (chat_id, tool["name"], tool["description"], json.dumps(tool["parameters"]))
+            for chat_id, chat in zip(chat_ids, chats)
+            for tool in chat["tools"]
+        ]
+        if tools:
+            connection.exec_driver_sql(_insert_sql("tools", ("chat_id", "name", "description", "parameters")), tools)
+
+        message_ids: List[int] = []
+        if messages:
+            message_ids = _insert_returning_ids(
+                connection,
+                "messages",
+                ("chat_id", "role", "content", "position", "token_count", "tokenizer", "content_hash"),
+                [
+                    (chat_ids[chat_index], message["role"].name, message["content"], message["position"],
+                     n_tokens, tokenizer_id, digest)
+                    for (chat_index, message), digest, n_tokens in zip(messages, hashes, counts)
+                ],
+            )
+            connection.exec_driver_sql(
+                f"INSERT INTO {MESSAGE_SEARCH_TABLE} (rowid, content) "
+                "SELECT id, content FROM messages WHERE id BETWEEN ? AND ?",
+                (message_ids[0], message_ids[-1]),
+            )
+
+        tool_calls = [
+            (message_id, tool_call["tool_call_id"], tool_call["name"], tool_call["arguments"])
+            for message_id, (_, message) in zip(message_ids, messages)
+            for tool_call in message["tool_calls"]
+        ]
+        if tool_calls:
+            connection.exec_driver_sql(
+                _insert_sql("tool_calls", ("message_id", "tool_call_id", "name", "arguments")), tool_calls
+            )
+
+        add_imported_stats(connection, chat_ids, message_ids)
+        connection.exec_driver_sql("UPDATE bulk_import_state SET active = 0 WHERE id = 1")
+        return chat_ids
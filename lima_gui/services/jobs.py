@@ -0,0 +1,168 @@
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+from pydantic import BaseModel
+
+
+class JobSchema(BaseModel):
+    id: int
+    kind: str
+    status: str
+    params: Dict[str, Any] = {}
+    processed: int
+    total: Optional[int] = None
+    progress: Optional[float] = None
+    throughput: float
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Optional[Any] = None
+
+
+class Job:
+    """A long-running background task with progress reporting.
+
+    The task function receives the job and reports progress through
+    `set_total`/`advance`; it should check `cancelled` between units of work.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, id: int, kind: str, params: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.kind = kind
+        self.params = params or {}
+        self.status = Job.PENDING
+        self.processed = 0
+        self.total: Optional[int] = None
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started: Optional[float] = None
+        self._elapsed: Optional[float] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (Job.COMPLETED, Job.FAILED, Job.CANCELLED)
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def set_total(self, total: int) -> None:
+        self.total = total
+
+    def advance(self, n: int = 1) -> None:
+        with self._lock:
+            self.processed += n
+
+    def elapsed(self) -> float:
+        if self._started is None:
+            return 0.0
+        if self._elapsed is not None:
+            return self._elapsed
+        return time.perf_counter() - self._started
+
+    def throughput(self) -> float:
+        """Processed items per second."""
+        elapsed = self.elapsed()
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def _start(self) -> None:
+        self.status = Job.RUNNING
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+
+    def _finish(self, status: str, error: Optional[str] = None) -> None:
+        self._elapsed = time.perf_counter() - self._started
+        self.finished_at = datetime.now(timezone.utc)
+        self.error = error
+        self.status = status
+
+    def run(self, target: Callable[["Job"], Any]) -> None:
+        self._start()
+        try:
+            self.result = target(self)
+        except Exception as e:
+            logger.exception(f"Job {self.id} ({self.kind}) failed")
+            self._finish(Job.FAILED, str(e))
+        else:
+            self._finish(Job.CANCELLED if self.cancelled else Job.COMPLETED)
+
+    def to_schema(self) -> JobSchema:
+        progress = None
+        if self.total:
+            progress = min(self.processed / self.total, 1.0)
+        elif self.total == 0 and self.finished:
+            progress = 1.0
+        return JobSchema(
+            id=self.id,
+            kind=self.kind,
+            status=self.status,
+            params=self.params,
+            processed=self.processed,
+            total=self.total,
+            progress=progress,
+            throughput=self.throughput(),
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            error=self.error,
+            result=self.result,
+        )
+
+
+_jobs: Dict[int, Job] = {}
+_job_ids = itertools.count(1)
+_jobs_lock = threading.Lock()
+
+
+def start_job(
+    kind: str,
+    target: Callable[[Job], Any],
+    params: Optional[Dict[str, Any]] = None,
+    exclusive: bool = False,
+) -> Job:
+    """Run `target(job)` in a daemon thread and register the job.
+
+    With `exclusive`, an unfinished job of the same kind and params is
+    returned instead of starting a second one.
+    """
+    with _jobs_lock:
+        if exclusive:
+            active = find_active_job(kind)
+            if active is not None and active.params == (params or {}):
+                return active
+        job = Job(next(_job_ids), kind, params)
+        _jobs[job.id] = job
+    threading.Thread(target=job.run, args=(target,), name=f"job-{job.id}-{kind}", daemon=True).start()
+    return job
+
+
+def get_job(job_id: int) -> Optional[Job]:
+    return _jobs.get(job_id)
+
+
+def list_jobs(kind: Optional[str] = None) -> List[Job]:
+    return [job for job in list(_jobs.values()) if kind is None or job.kind == kind]
+
+
+def find_active_job(kind: str) -> Optional[Job]:
+    """Return the unfinished job of the given kind, if any."""
+    for job in list_jobs(kind):
+        if not job.finished:
+            return job
+    return None
@@ -0,0 +1,175 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import bindparam, func, select, true, update
+from sqlalchemy.engine import Engine
+
+from lima_gui.models import Message
+from lima_gui.services.jobs import Job, find_active_job, start_job
+from lima_gui.services.tokenizer import (
+    TokenCounter, content_hash, get_token_counter, lookup_cached_counts, store_cached_counts
+)
+
+
+RETOKENIZE_JOB = "retokenize"
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def _tokenize_chunk(counter: TokenCounter, missing: Dict[str, str]) -> Dict[str, int]:
+    # Runs in a worker thread: the Rust tokenizer (and tiktoken) release the
+    # GIL while encoding, so chunks are tokenized in parallel.
+    return dict(zip(missing, counter.count_batch(list(missing.values()))))
+
+
+def retokenize_messages(
+    engine: Engine,
+    counter: Optional[TokenCounter] = None,
+    only_stale: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    job: Optional[Job] = None,
+) -> int:
+    """Recount `Message.token_count` for the whole dataset.
+
+    Messages are streamed out of the database in id-ordered chunks, chunks
+    missing from the token cache are tokenized across a thread pool with
+    `encode_batch`, and results are written back with batched UPDATEs, one
+    transaction per chunk. At most `2 * workers` chunks are in flight, so
+    memory stays bounded. With `only_stale`, messages already counted by the
+    current tokenizer are skipped. Returns the number of recounted messages.
+    """
+    counter = counter or get_token_counter()
+    workers = workers or os.cpu_count() or 1
+    messages = Message.__table__
+    stale = messages.c.tokenizer.is_distinct_from(counter.id) if only_stale else true()
+    # Counts are written only where the content is still the one that was
+    # counted: a message edited since it was read keeps the count its edit set.
+    update_stmt = (
+        update(messages)
+        .where(messages.c.id == bindparam("message_id"), messages.c.content.is_(bindparam("counted_content")))
+        .values(
+            token_count=bindparam("token_count"),
+            tokenizer=bindparam("tokenizer"),
+            content_hash=bindparam("content_hash"),
+        )
+    )
+
+    recounted = 0
+    with engine.connect() as connection:
+        if job is not None:
+            job.set_total(connection.scalar(select(func.count()).select_from(messages).where(stale)))
+            connection.commit()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retokenize") as pool:
+            pending = deque()
+            last_id = 0
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < 2 * workers and not (job and job.cancelled):
+                    rows = connection.execute(
+                        select(messages.c.id, messages.c.content)
+                        .where(stale, messages.c.id > last_id)
+                        .order_by(messages.c.id)
+                        .limit(chunk_size)
+                    ).all()
+                    if not rows:
+                        exhausted = True
+                        break
+                    last_id = rows[-1].id
+
+                    ids_hashes: List[Tuple[int, Optional[str], str]] = []
+                    missing: Dict[str, str] = {}
+                    for row in rows:
+                        digest = content_hash(row.content)
+                        ids_hashes.append((row.id, row.content, digest))
+                        missing.setdefault(digest, row.content)
+                    cached = lookup_cached_counts(connection, counter.id, missing)
+                    for digest in cached:
+                        del missing[digest]
+                    pending.append((ids_hashes, cached, pool.submit(_tokenize_chunk, counter, missing)))
+
+                if not pending:
+                    break
+                if job is not None and job.cancelled:
+                    for _, _, future in pending:
+                        future.cancel()
+                    break
+
+                ids_hashes, cached, future = pending.popleft()
+                new_counts = future.result()
+                counts = {**cached, **new_counts}
+                connection.execute(
+                    update_stmt,
+                    [
+                        {
+                            "message_id": message_id,
+                            "counted_content": content,
+                            "token_count": counts[digest],
+                            "tokenizer": counter.id,
+                            "content_hash": digest,
+                        }
+                        for message_id, content, digest in ids_hashes
+                    ],
+                )
+                store_cached_counts(connection, counter.id, new_counts)
+                connection.commit()
+
+                recounted += len(ids_hashes)
+                if job is not None:
+                    job.advance(len(ids_hashes))
+
+        connection.commit()
+
+    return recounted
+
+
+def has_stale_token_counts(engine: Engine, counter: Optional[TokenCounter] = None) -> bool:
+    """Whether any message was counted by a tokenizer other than the current one."""
+    counter = counter or get_token_counter()
+    messages = Message.__table__
+    with engine.connect() as connection:
+        stale = select(messages.c.id).where(messages.c.tokenizer.is_distinct_from(counter.id)).limit(1)
+        return connection.scalar(stale) is not None
+
+
+def retokenize_if_stale(engine: Engine) -> Optional[Job]:
+    """Start the recount job if stored counts were made by another tokenizer.
+
+    The tokenizer that loads can differ between runs without going through
+    the settings endpoint: the config file was edited, or a model missing
+    from the Hugging Face cache (counted with the whitespace fallback) has
+    since been downloaded.
+    """
+    if not has_stale_token_counts(engine):
+        return None
+    logger.info(f"Stored token counts don't match tokenizer '{get_token_counter().id}', recounting")
+    return start_retokenize_job(engine)
+
+
+def start_retokenize_job(
+    engine: Engine,
+    only_stale: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+) -> Job:
+    """Start (or return the already running) dataset recount job.
+
+    A running recount for a previously configured tokenizer is cancelled.
+    """
+    counter = get_token_counter()
+    active = find_active_job(RETOKENIZE_JOB)
+    if active is not None and active.params.get("tokenizer") != counter.id:
+        active.cancel()
+
+    def run(job: Job) -> dict:
+        recounted = retokenize_messages(
+            engine, counter, only_stale=only_stale, chunk_size=chunk_size, workers=workers, job=job
+        )
+        logger.info(f"Recounted tokens of {recounted} messages ({job.throughput():.0f} messages/sec)")
+        return {"recounted": recounted}
+
+    params = {"tokenizer": counter.id, "only_stale": only_stale}
+    return start_job(RETOKENIZE_JOB, run, params=params, exclusive=True)
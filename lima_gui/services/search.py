@@ -0,0 +1,150 @@
+import html
+import secrets
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from lima_gui.models.chat import MESSAGE_SEARCH_TABLE, RoleEnum
+
+
+SEARCH_PAGE_SIZE = 20
+SNIPPET_TOKENS = 16
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+
+class SearchHitSchema(BaseModel):
+    chat_id: int
+    chat_name: str
+    message_id: int
+    role: str
+    position: int
+    snippet: str
+    rank: float
+
+
+class SearchResultsSchema(BaseModel):
+    hits: List[SearchHitSchema]
+    next_cursor: Optional[str] = None
+
+
+class SearchQueryError(ValueError):
+    """Raised for a search query or cursor that cannot be used."""
+
+
+def build_match_query(query: str) -> str:
+    """Turn user input into an FTS5 MATCH expression.
+
+    Every whitespace-separated term is quoted, so punctuation and FTS5
+    operators in the input are searched for literally; all terms must
+    match. A trailing `*` keeps its meaning as a prefix search.
+    """
+    terms = []
+    for term in query.split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    if not terms:
+        raise SearchQueryError("Search query has no terms")
+    return " ".join(terms)
+
+
+def encode_cursor(rank: float, message_id: int) -> str:
+    return f"{rank!r}:{message_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, message_id = cursor.rsplit(":", 1)
+        return float(rank), int(message_id)
+    except ValueError:
+        raise SearchQueryError(f"Invalid cursor '{cursor}'")
+
+
+def render_snippet(snippet: str, start: str, end: str) -> str:
+    """HTML-escape a raw FTS snippet and turn its `start`/`end` markers into highlights."""
+    escaped = html.escape(snippet, quote=False)
+    return escaped.replace(start, HIGHLIGHT_START).replace(end, HIGHLIGHT_END)
+
+
+def search_messages(
+    db: Session,
+    query: str,
+    limit: int = SEARCH_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    chat_id: Optional[int] = None,
+    role: Optional[str] = None,
+) -> SearchResultsSchema:
+    """Rank messages matching `query` with BM25, best first.
+
+    Pages are keyed by `(rank, message id)`: pass the returned `next_cursor`
+    to get the following page. Snippets show up to `SNIPPET_TOKENS` tokens
+    around the matches, which are wrapped in `<mark>` tags. The rest of the
+    snippet is HTML-escaped, so message content can't pass for markup.
+    """
+    # SQLite inserts the markers into raw content: random ones can't be
+    # forged by a message and survive escaping unchanged.
+    nonce = secrets.token_hex(8)
+    start, end = f"\ue000{nonce}\ue001", f"\ue002{nonce}\ue003"
+    conditions = [f"{MESSAGE_SEARCH_TABLE} MATCH :match"]
+    params = {
+        "match": build_match_query(query),
+        "limit": limit,
+        "start": start,
+        "end": end,
+        "tokens": SNIPPET_TOKENS,
+    }
+    if cursor is not None:
+        params["after_rank"], params["after_id"] = decode_cursor(cursor)
+        conditions.append(
+            f"({MESSAGE_SEARCH_TABLE}.rank > :after_rank "
+            f"OR ({MESSAGE_SEARCH_TABLE}.rank = :after_rank AND messages.id > :after_id))"
+        )
+    if chat_id is not None:
+        conditions.append("messages.chat_id = :chat_id")
+        params["chat_id"] = chat_id
+    if role is not None:
+        try:
+            params["role"] = RoleEnum(role.lower()).name
+        except ValueError:
+            raise SearchQueryError(f"Invalid role '{role}'")
+        conditions.append("messages.role = :role")
+
+    stmt = text(f"""
+        SELECT
+            messages.id AS message_id, messages.chat_id, chats.name AS chat_name,
+            messages.role, messages.position,
+            snippet({MESSAGE_SEARCH_TABLE}, 0, :start, :end, '…', :tokens) AS snippet,
+            {MESSAGE_SEARCH_TABLE}.rank AS rank
+        FROM {MESSAGE_SEARCH_TABLE}
+        JOIN messages ON messages.id = {MESSAGE_SEARCH_TABLE}.rowid
+        JOIN chats ON chats.id = messages.chat_id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {MESSAGE_SEARCH_TABLE}.rank, messages.id
+        LIMIT :limit
+    """)
+    try:
+        rows = db.execute(stmt, params).all()
+    except OperationalError as e:
+        raise SearchQueryError(f"Invalid search query: {e.orig}")
+
+    hits = [
+        SearchHitSchema(
+            chat_id=row.chat_id,
+            chat_name=row.chat_name,
+            message_id=row.message_id,
+            role=RoleEnum[row.role].value,
+            position=row.position,
+            snippet=render_snippet(row.snippet, start, end),
+            rank=row.rank,
+        )
+        for row in rows
+    ]
+    next_cursor = None
+    if len(hits) == limit:
+        next_cursor = encode_cursor(hits[-1].rank, hits[-1].message_id)
+    return SearchResultsSchema(hits=hits, next_cursor=next_cursor)
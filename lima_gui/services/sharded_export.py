@@ -0,0 +1,312 @@
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Literal, NamedTuple, Optional, Tuple
+
+from loguru import logger
+from pydantic import BaseModel, Field, model_validator
+from sqlalchemy import String, Text, select, type_coerce
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from lima_gui.models import Chat, Message, Tool, ToolCall
+from lima_gui.models.chat import RoleEnum, chat_tag_association
+from lima_gui.services.chat import ChatFilter, chat_filter_conditions
+from lima_gui.services.file_service import EXPORT_CHUNK_SIZE, FileService, chat_record
+from lima_gui.services.jobs import Job, start_job
+
+try:
+    import zstandard
+except ImportError:  # Optional: pip install lima_gui[zstd]
+    zstandard = None
+
+
+SHARDED_EXPORT_JOB = "export"
+MANIFEST_NAME = "manifest.json"
+SHARD_EXTENSIONS = {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz"}
+DEFAULT_LEVELS = {"zstd": 3, "gzip": 6}
+DEFAULT_SHARD_BYTES = 512 * 1024 * 1024
+
+
+class ExportError(ValueError):
+    """Raised when a sharded export can't be written as requested."""
+
+
+class ShardedExportOptions(BaseModel):
+    compression: Literal["zstd", "gzip"] = "zstd"
+    level: Optional[int] = Field(None, ge=1, le=19, description="Compression level, the codec's default if null")
+    shard_chats: Optional[int] = Field(None, ge=1, description="Chats per shard")
+    shard_bytes: Optional[int] = Field(
+        None, ge=1, description="Compressed bytes after which a shard is closed; 512 MiB if neither limit is set"
+    )
+    workers: Optional[int] = Field(None, ge=1, le=256, description="Compressing processes, one per core by default")
+    chunk_size: int = Field(EXPORT_CHUNK_SIZE, ge=1, le=10000, description="Chats per query and per compressed frame")
+    filter: Optional[ChatFilter] = None
+
+    @model_validator(mode="after")
+    def _check_levels_and_shard_size(self):
+        if self.compression == "gzip" and self.level is not None and self.level > 9:
+            raise ValueError("gzip compression levels go from 1 to 9")
+        if self.shard_chats is None and self.shard_bytes is None:
+            self.shard_bytes = DEFAULT_SHARD_BYTES
+        return self
+
+
+class ShardSchema(BaseModel):
+    file: str
+    chats: int
+    bytes: int
+    uncompressed_bytes: int
+    sha256: str
+
+
+class ExportManifestSchema(BaseModel):
+    format: str = "jsonl"
+    compression: str
+    created_at: datetime
+    filter: Optional[ChatFilter] = None
+    chats: int
+    bytes: int
+    uncompressed_bytes: int
+    shards: List[ShardSchema]
+
+
+def check_output_dir(output_dir: str, options: ShardedExportOptions) -> None:
+    """Raise `ExportError` if an export with `options` can't be written to `output_dir`."""
+    if options.compression == "zstd" and zstandard is None:
+        raise ExportError("zstd compression needs the zstandard package: pip install 'lima_gui[zstd]'")
+    directory = Path(output_dir)
+    if directory.exists() and not directory.is_dir():
+        raise ExportError(f"{directory} is not a directory")
+    if (directory / MANIFEST_NAME).exists():
+        raise ExportError(f"{directory} already holds an export")
+
+
+class _ChunkRows(NamedTuple):
+    """Raw rows of a chunk of chats, as read from the database."""
+    chats: List[tuple]  # (id, name, language)
+    tags: List[tuple]  # (chat_id, tag_name)
+    messages: List[tuple]  # (chat_id, id, role name, content), in position order
+    tool_calls: List[tuple]  # (message_id, tool_call_id, name, arguments)
+    tools: List[tuple]  # (chat_id, name, description, parameters as JSON text)
+
+
+def _serialize_rows(rows: _ChunkRows) -> Iterator[dict]:
+    tags = defaultdict(list)
+    for chat_id, tag_name in rows.tags:
+        tags[chat_id].append(tag_name)
+    tool_calls = defaultdict(list)
+    for message_id, tool_call_id, name, arguments in rows.tool_calls:
+        tool_calls[message_id].append((tool_call_id, name, arguments))
+    messages = defaultdict(list)
+    for chat_id, message_id, role, content in rows.messages:
+        messages[chat_id].append((RoleEnum[role].value, content, tool_calls[message_id]))
+    tools = defaultdict(list)
+    for chat_id, name, description, parameters in rows.tools:
+        tools[chat_id].append((name, description, json.loads(parameters) if parameters is not None else None))
+
+    for chat_id, name, language in rows.chats:
+        yield chat_record(name, language, tags[chat_id], messages[chat_id], tools[chat_id])
+
+
+def _compress_frame(rows: _ChunkRows, compression: str, level: int) -> Tuple[bytes, int]:
+    # Runs in a worker process: chats are serialized here from raw rows, so
+    # only plain tuples cross the process boundary. Each chunk is a complete
+    # gzip member or zstd frame: concatenated, they decompress as one stream.
+    data = "".join(json.dumps(chat) + "\n" for chat in _serialize_rows(rows)).encode("utf-8")
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data), len(data)
+    return gzip.compress(data, compresslevel=level, mtime=0), len(data)
+
+
+class _ShardWriter:
+    """Appends compressed frames to numbered shard files, hashing as it goes."""
+
+    def __init__(self, output_dir: Path, compression: str):
+        self.output_dir = output_dir
+        self.extension = SHARD_EXTENSIONS[compression]
+        self.shards: List[ShardSchema] = []
+        self._file: Optional[BinaryIO] = None
+
+    @property
+    def current(self) -> Optional[ShardSchema]:
+        return self.shards[-1] if self._file is not None else None
+
+    def write(self, frame: bytes, chats: int, uncompressed_bytes: int) -> None:
+        if self._file is None:
+            name = f"lima-chats-{len(self.shards):05d}{self.extension}"
+            self._file = open(self.output_dir / name, "wb")
+            self._sha256 = hashlib.sha256()
+            self.shards.append(ShardSchema(file=name, chats=0, bytes=0, uncompressed_bytes=0, sha256=""))
+        self._file.write(frame)
+        self._sha256.update(frame)
+        shard = self.shards[-1]
+        shard.chats += chats
+        shard.bytes += len(frame)
+        shard.uncompressed_bytes += uncompressed_bytes
+
+    def close_shard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self.shards[-1].sha256 = self._sha256.hexdigest()
+
+
+def _read_chunk(connection: Connection, options: ShardedExportOptions, after_id: int, limit: int) -> _ChunkRows:
+    chats, messages, tool_calls, tools = Chat.__table__, Message.__table__, ToolCall.__table__, Tool.__table__
+    conditions = chat_filter_conditions(**options.filter.model_dump()) if options.filter else []
+    chat_rows = connection.execute(
+        select(chats.c.id, chats.c.name, chats.c.language)
+        .where(chats.c.id > after_id, *conditions)
+        .order_by(chats.c.id)
+        .limit(limit)
+    ).tuples().all()
+    ids = [row[0] for row in chat_rows]
+    if not ids:
+        return _ChunkRows(chat_rows, [], [], [], [])
+
+    in_chunk = chat_tag_association.c.chat_id.in_(ids)
+    tag_rows = connection.execute(
+        select(chat_tag_association.c.chat_id, chat_tag_association.c.tag_name)
+        .where(in_chunk)
+        .order_by(chat_tag_association.c.chat_id, chat_tag_association.c.tag_name)
+    ).tuples().all()
+    message_rows = connection.execute(
+        select(messages.c.chat_id, messages.c.id, type_coerce(messages.c.role, String), messages.c.content)
+        .where(messages.c.chat_id.in_(ids))
+        .order_by(messages.c.chat_id, messages.c.position, messages.c.id)
+    ).tuples().all()
+    tool_call_rows = connection.execute(
+        select(tool_calls.c.message_id, tool_calls.c.tool_call_id, tool_calls.c.name, tool_calls.c.arguments)
+        .join(messages, messages.c.id == tool_calls.c.message_id)
+        .where(messages.c.chat_id.in_(ids))
+        .order_by(tool_calls.c.message_id, tool_calls.c.id)
+    ).tuples().all()
+    tool_rows = connection.execute(
+        select(tools.c.chat_id, tools.c.name, tools.c.description, type_coerce(tools.c.parameters, Text))
+        .where(tools.c.chat_id.in_(ids))
+        .order_by(tools.c.chat_id, tools.c.name)
+    ).tuples().all()
+    return _ChunkRows(chat_rows, tag_rows, message_rows, tool_call_rows, tool_rows)
+
+
+def _chunks(connection: Connection, options: ShardedExportOptions) -> Iterator[_ChunkRows]:
+    # Chunks of raw rows in id order, cut so that no chunk straddles a
+    # `shard_chats` boundary.
+    in_shard = 0
+    after_id = 0
+    while True:
+        take = options.chunk_size
+        if options.shard_chats is not None:
+            take = min(take, options.shard_chats - in_shard)
+        rows = _read_chunk(connection, options, after_id, take)
+        if not rows.chats:
+            return
+        yield rows
+        after_id = rows.chats[-1][0]
+        in_shard = (in_shard + len(rows.chats)) % options.shard_chats if options.shard_chats else 0
+
+
+def export_shards(
+    engine: Engine, output_dir: str, options: ShardedExportOptions, job: Optional[Job] = None
+) -> Optional[ExportManifestSchema]:
+    """Export chats as compressed JSONL shards plus a manifest into `output_dir`.
+
+    The database is read a chunk of raw rows at a time in this process,
+    while a process pool serializes and compresses chunks in parallel; at most `2 * workers`
+    chunks are in flight, so memory stays bounded. Frames are written in
+    order and a shard is closed when it reaches `shard_chats` chats or
+    `shard_bytes` compressed bytes. The manifest lists each shard's chat
+    count, sizes and SHA-256, and is written last: a directory without one
+    holds an incomplete (failed or cancelled) export. Returns the manifest,
+    or None if the job was cancelled.
+    """
+    check_output_dir(output_dir, options)
+    directory = Path(output_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    level = options.level or DEFAULT_LEVELS[options.compression]
+    workers = options.workers or os.cpu_count() or 1
+    writer = _ShardWriter(directory, options.compression)
+    cancelled = False
+
+    # Exports run in a thread of the server, and forking a threaded process
+    # isn't safe: workers start from a fresh interpreter instead.
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+    with Session(bind=engine) as db, pool:
+        if job is not None:
+            job.set_total(FileService(db).count_chats(options.filter))
+
+        pending = deque()
+        chunks = _chunks(db.connection(), options)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < 2 * workers:
+                    rows = next(chunks, None)
+                    if rows is None:
+                        exhausted = True
+                        break
+                    pending.append((len(rows.chats), pool.submit(_compress_frame, rows, options.compression, level)))
+                if not pending:
+                    break
+                if job is not None and job.cancelled:
+                    for _, future in pending:
+                        future.cancel()
+                    cancelled = True
+                    break
+
+                n_chats, future = pending.popleft()
+                frame, uncompressed_bytes = future.result()
+                writer.write(frame, n_chats, uncompressed_bytes)
+                shard = writer.current
+                if (options.shard_chats is not None and shard.chats >= options.shard_chats) or (
+                    options.shard_bytes is not None and shard.bytes >= options.shard_bytes
+                ):
+                    writer.close_shard()
+                if job is not None:
+                    job.advance(n_chats)
+        finally:
+            writer.close_shard()
+
+    if cancelled:
+        return None
+    manifest = ExportManifestSchema(
+        compression=options.compression,
+        created_at=datetime.now(timezone.utc),
+        filter=options.filter,
+        chats=sum(shard.chats for shard in writer.shards),
+        bytes=sum(shard.bytes for shard in writer.shards),
+        uncompressed_bytes=sum(shard.uncompressed_bytes for shard in writer.shards),
+        shards=writer.shards,
+    )
+    (directory / MANIFEST_NAME).write_text(manifest.model_dump_json(indent=2))
+    return manifest
+
+
+def start_sharded_export_job(engine: Engine, output_dir: str, options: ShardedExportOptions) -> Job:
+    """Write a sharded export in the background; the job result is the manifest.
+
+    Raises `ExportError` right away if the export can't be written.
+    """
+    check_output_dir(output_dir, options)
+
+    def run(job: Job) -> Optional[dict]:
+        manifest = export_shards(engine, output_dir, options, job=job)
+        if manifest is None:
+            return None
+        logger.info(
+            f"Exported {manifest.chats} chats to {len(manifest.shards)} shards in {output_dir} "
+            f"({job.throughput():.0f} chats/sec)"
+        )
+        return manifest.model_dump(mode="json")
+
+    params = {"output_dir": output_dir, **options.model_dump(mode="json", exclude_none=True)}
+    return start_job(SHARDED_EXPORT_JOB, run, params=params)
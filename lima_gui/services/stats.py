@@ -0,0 +1,202 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from lima_gui.models.chat import MESSAGE_BUCKETS, TOKEN_BUCKETS, RoleEnum, bucket_sql
+
+
+PERCENTILES = (50, 90, 99)
+
+
+class HistogramBucketSchema(BaseModel):
+    min: int
+    max: Optional[int]  # Exclusive; None for the last, open-ended bucket
+    chats: int
+
+
+class GroupStatsSchema(BaseModel):
+    chats: int
+    messages: int
+    tokens: int
+    # Estimated from the histograms, interpolating linearly within a bucket.
+    token_percentiles: Dict[str, float]
+    message_percentiles: Dict[str, float]
+    token_histogram: List[HistogramBucketSchema]
+    message_histogram: List[HistogramBucketSchema]
+
+
+class RoleStatsSchema(BaseModel):
+    role: str
+    messages: int
+    tokens: int
+
+
+class DatasetStatsSchema(BaseModel):
+    overall: GroupStatsSchema
+    roles: List[RoleStatsSchema]
+    languages: Dict[str, GroupStatsSchema]
+    tags: Dict[str, GroupStatsSchema]
+
+
+def _group_rows(dimension: str, value: str, key: str, where: str = "true") -> str:
+    return f"""
+        SELECT '{dimension}', {value}, {bucket_sql("token_count", TOKEN_BUCKETS)}, {bucket_sql("message_count", MESSAGE_BUCKETS)},
+               count(*), sum(message_count), sum(token_count)
+        FROM {key}
+        WHERE {where}
+        GROUP BY 2, 3, 4
+    """
+
+
+_REBUILD_CHAT_STATS = f"""
+    INSERT INTO chat_stats (dimension, value, token_bucket, message_bucket, chats, messages, tokens)
+    {_group_rows("language", "language", "chats")}
+    UNION ALL {_group_rows("tag", "tag_name", "chats JOIN chat_tag ON chat_tag.chat_id = chats.id")}
+"""
+
+_REBUILD_ROLE_STATS = """
+    INSERT INTO role_stats (role, messages, tokens)
+    SELECT role, count(*), coalesce(sum(token_count), 0) FROM messages GROUP BY role
+"""
+
+
+_CHAT_RANGE = "chats.id BETWEEN :first_chat_id AND :last_chat_id"
+
+_ADD_CHAT_STATS = f"""
+    INSERT INTO chat_stats (dimension, value, token_bucket, message_bucket, chats, messages, tokens)
+    SELECT * FROM (
+        {_group_rows("language", "language", "chats", _CHAT_RANGE)}
+        UNION ALL {_group_rows("tag", "tag_name", "chats JOIN chat_tag ON chat_tag.chat_id = chats.id", _CHAT_RANGE)}
+    ) WHERE true
+    ON CONFLICT (dimension, value, token_bucket, message_bucket) DO UPDATE SET
+        chats = chats + excluded.chats,
+        messages = messages + excluded.messages,
+        tokens = tokens + excluded.tokens
+"""
+
+_ADD_ROLE_STATS = """
+    INSERT INTO role_stats (role, messages, tokens)
+    SELECT role, count(*), coalesce(sum(token_count), 0) FROM messages
+    WHERE id BETWEEN :first_message_id AND :last_message_id
+    GROUP BY role
+    ON CONFLICT (role) DO UPDATE SET
+        messages = messages + excluded.messages,
+        tokens = tokens + excluded.tokens
+"""
+
+
+def add_imported_stats(
+    connection: Connection, chat_ids: Sequence[int], message_ids: Sequence[int]
+) -> None:
+    """Add the contribution of newly inserted chats and messages to the statistics.
+
+    Used by the bulk importer in place of the per-row triggers: `chat_ids`
+    and `message_ids` are consecutive id ranges, inserted with their final
+    aggregates and tags.
+    """
+    if chat_ids:
+        connection.execute(text(_ADD_CHAT_STATS), {"first_chat_id": chat_ids[0], "last_chat_id": chat_ids[-1]})
+    if message_ids:
+        connection.execute(
+            text(_ADD_ROLE_STATS), {"first_message_id": message_ids[0], "last_message_id": message_ids[-1]}
+        )
+
+
+def rebuild_chat_stats(connection: Connection) -> None:
+    """Recompute `chat_stats` and `role_stats` from scratch.
+
+    Triggers keep the statistics current during normal operation; this is
+    the repair path for databases created before the tables existed or
+    edited with the triggers missing.
+    """
+    connection.execute(text("DELETE FROM chat_stats"))
+    connection.execute(text("DELETE FROM role_stats"))
+    connection.execute(text(_REBUILD_CHAT_STATS))
+    connection.execute(text(_REBUILD_ROLE_STATS))
+
+
+def _histogram(counts: Sequence[int], bounds: Sequence[int]) -> List[HistogramBucketSchema]:
+    return [
+        HistogramBucketSchema(min=bound, max=bounds[i + 1] if i + 1 < len(bounds) else None, chats=counts[i])
+        for i, bound in enumerate(bounds)
+    ]
+
+
+def _percentiles(counts: Sequence[int], bounds: Sequence[int]) -> Dict[str, float]:
+    total = sum(counts)
+    result = {}
+    for percentile in PERCENTILES:
+        rank = total * percentile / 100
+        seen = 0
+        estimate = 0.0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if i + 1 < len(bounds):
+                    estimate = bounds[i] + (bounds[i + 1] - bounds[i]) * (rank - seen) / count
+                else:
+                    # Open-ended last bucket: its lower bound is all that is known.
+                    estimate = float(bounds[i])
+                break
+            seen += count
+        result[f"p{percentile}"] = estimate
+    return result
+
+
+class _Group:
+    def __init__(self):
+        self.chats = self.messages = self.tokens = 0
+        self.token_counts = [0] * len(TOKEN_BUCKETS)
+        self.message_counts = [0] * len(MESSAGE_BUCKETS)
+
+    def add(self, token_bucket: int, message_bucket: int, chats: int, messages: int, tokens: int):
+        self.chats += chats
+        self.messages += messages
+        self.tokens += tokens
+        self.token_counts[token_bucket] += chats
+        self.message_counts[message_bucket] += chats
+
+    def schema(self) -> GroupStatsSchema:
+        return GroupStatsSchema(
+            chats=self.chats,
+            messages=self.messages,
+            tokens=self.tokens,
+            token_percentiles=_percentiles(self.token_counts, TOKEN_BUCKETS),
+            message_percentiles=_percentiles(self.message_counts, MESSAGE_BUCKETS),
+            token_histogram=_histogram(self.token_counts, TOKEN_BUCKETS),
+            message_histogram=_histogram(self.message_counts, MESSAGE_BUCKETS),
+        )
+
+
+def get_dataset_stats(db: Session) -> DatasetStatsSchema:
+    """Dataset statistics read from the trigger-maintained stats tables.
+
+    Reads a few rows per language and tag, whatever the number of chats
+    and messages.
+    """
+    overall = _Group()
+    groups: Dict[str, Dict[str, _Group]] = {"language": defaultdict(_Group), "tag": defaultdict(_Group)}
+    rows = db.execute(text(
+        "SELECT dimension, value, token_bucket, message_bucket, chats, messages, tokens "
+        "FROM chat_stats WHERE chats != 0"
+    ))
+    for dimension, value, token_bucket, message_bucket, chats, messages, tokens in rows:
+        groups[dimension][value].add(token_bucket, message_bucket, chats, messages, tokens)
+        if dimension == "language":
+            overall.add(token_bucket, message_bucket, chats, messages, tokens)
+
+    roles = [
+        RoleStatsSchema(role=RoleEnum[role].value, messages=messages, tokens=tokens)
+        for role, messages, tokens in db.execute(
+            text("SELECT role, messages, tokens FROM role_stats WHERE messages != 0 ORDER BY role")
+        )
+    ]
+    return DatasetStatsSchema(
+        overall=overall.schema(),
+        roles=roles,
+        languages={value: group.schema() for value, group in sorted(groups["language"].items())},
+        tags={value: group.schema() for value, group in sorted(groups["tag"].items())},
+    )
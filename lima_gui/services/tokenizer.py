@@ -0,0 +1,266 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from loguru import logger
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from lima_gui.config import ConfigManager
+from lima_gui.models.chat import Message, TokenCacheEntry
+from lima_gui.models.db import get_app_data_dir
+
+
+WHITESPACE_TOKENIZER = "whitespace"
+TIKTOKEN_PREFIX = "tiktoken:"
+DEFAULT_TOKENIZER = "mistralai/Mistral-7B-v0.1"
+
+# SQLite limits the number of bound parameters per statement.
+_LOOKUP_CHUNK_SIZE = 400
+
+
+class TokenCounter:
+    """Counts tokens of message contents with a loaded tokenizer.
+
+    `id` identifies the tokenizer actually in use. It is part of every cache
+    key, so counts made by a different tokenizer are never reused.
+    """
+
+    def __init__(self, id: str, encode_batch: Callable[[List[str]], List[int]]):
+        self.id = id
+        self._encode_batch = encode_batch
+
+    def count(self, content: Optional[str]) -> int:
+        return self.count_batch([content])[0]
+
+    def count_batch(self, contents: Sequence[Optional[str]]) -> List[int]:
+        counts = [0] * len(contents)
+        indices = [i for i, content in enumerate(contents) if content]
+        if indices:
+            for i, n_tokens in zip(indices, self._encode_batch([contents[i] for i in indices])):
+                counts[i] = n_tokens
+        return counts
+
+
+def _whitespace_counter() -> TokenCounter:
+    return TokenCounter(WHITESPACE_TOKENIZER, lambda texts: [len(text.split()) for text in texts])
+
+
+def _find_tokenizer_file(tokenizer_id: str) -> Optional[Path]:
+    """Locate a `tokenizer.json` for the given id without touching the network."""
+    path = Path(tokenizer_id).expanduser()
+    if path.is_file():
+        return path
+    if (path / "tokenizer.json").is_file():
+        return path / "tokenizer.json"
+
+    local_path = get_app_data_dir() / "tokenizers" / tokenizer_id / "tokenizer.json"
+    if local_path.is_file():
+        return local_path
+
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return None
+    cached = try_to_load_from_cache(tokenizer_id, "tokenizer.json")
+    if isinstance(cached, str):
+        return Path(cached)
+    return None
+
+
+def load_token_counter(tokenizer_id: str) -> TokenCounter:
+    """Load a tokenizer from local files.
+
+    Supported ids are `whitespace`, `tiktoken:<encoding or model>`, a path to a
+    `tokenizer.json` (or a directory containing one), and Hugging Face repo ids
+    whose `tokenizer.json` is in `<app data>/tokenizers/<id>/` or in the local
+    Hugging Face cache. Falls back to whitespace counting if nothing is found.
+    """
+    if tokenizer_id == WHITESPACE_TOKENIZER:
+        return _whitespace_counter()
+
+    if tokenizer_id.startswith(TIKTOKEN_PREFIX):
+        import tiktoken
+
+        name = tokenizer_id[len(TIKTOKEN_PREFIX):]
+        try:
+            try:
+                encoding = tiktoken.get_encoding(name)
+            except ValueError:
+                encoding = tiktoken.encoding_for_model(name)
+        except Exception as e:
+            logger.warning(f"Could not load tiktoken encoding '{name}' ({e}), falling back to whitespace tokens")
+            return _whitespace_counter()
+        return TokenCounter(
+            tokenizer_id,
+            lambda texts: [len(ids) for ids in encoding.encode_ordinary_batch(texts)],
+        )
+
+    tokenizer_file = _find_tokenizer_file(tokenizer_id)
+    if tokenizer_file is None:
+        logger.warning(f"Tokenizer '{tokenizer_id}' not found locally, falling back to whitespace tokens")
+        return _whitespace_counter()
+
+    from tokenizers import Tokenizer
+
+    tokenizer = Tokenizer.from_file(str(tokenizer_file))
+    logger.info(f"Loaded tokenizer '{tokenizer_id}' from {tokenizer_file}")
+    return TokenCounter(
+        tokenizer_id,
+        lambda texts: [len(e.ids) for e in tokenizer.encode_batch(texts, add_special_tokens=False)],
+    )
+
+
+def is_known_tokenizer(tokenizer_id: str) -> bool:
+    """Whether `load_token_counter` can load `tokenizer_id` without falling back to whitespace."""
+    if tokenizer_id == WHITESPACE_TOKENIZER:
+        return True
+    if tokenizer_id.startswith(TIKTOKEN_PREFIX):
+        import tiktoken
+        from tiktoken.model import encoding_name_for_model
+
+        name = tokenizer_id[len(TIKTOKEN_PREFIX):]
+        if name in tiktoken.list_encoding_names():
+            return True
+        try:
+            encoding_name_for_model(name)
+        except KeyError:
+            return False
+        return True
+    return _find_tokenizer_file(tokenizer_id) is not None
+
+
+def get_configured_tokenizer() -> str:
+    """Tokenizer id from the `LIMA_GUI_TOKENIZER` env variable or the app config."""
+    if os.getenv("LIMA_GUI_TOKENIZER"):
+        return os.getenv("LIMA_GUI_TOKENIZER")
+    return ConfigManager().get_app_config().get("tokenizer") or DEFAULT_TOKENIZER
+
+
+_token_counter = None
+
+
+def get_token_counter() -> TokenCounter:
+    """Return the process-wide token counter, loading it on first use."""
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = load_token_counter(get_configured_tokenizer())
+    return _token_counter
+
+
+def set_tokenizer(tokenizer_id: str) -> TokenCounter:
+    """Switch the process-wide tokenizer.
+
+    Stored counts made by the previous tokenizer no longer match the counter
+    id and are recomputed the next time they are needed.
+    """
+    global _token_counter
+    if _token_counter is None or _token_counter.id != tokenizer_id:
+        _token_counter = load_token_counter(tokenizer_id)
+    return _token_counter
+
+
+def content_hash(content: Optional[str]) -> str:
+    return hashlib.blake2b((content or "").encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _connection(db) -> Connection:
+    return db.connection() if isinstance(db, Session) else db
+
+
+# The cache is read and written for every message of a bulk import or a
+# recount: statements go straight to the driver, skipping SQLAlchemy's
+# per-row parameter processing.
+_LOOKUP_SQL = "SELECT content_hash, token_count FROM token_cache WHERE tokenizer = ? AND content_hash IN ({})"
+_STORE_SQL = "INSERT OR IGNORE INTO token_cache (tokenizer, content_hash, token_count) VALUES (?, ?, ?)"
+
+
+def lookup_cached_counts(db, tokenizer_id: str, hashes: Iterable[str]) -> Dict[str, int]:
+    """Fetch cached counts for the given content hashes."""
+    connection = _connection(db)
+    cached: Dict[str, int] = {}
+    unique_hashes = list(dict.fromkeys(hashes))
+    for start in range(0, len(unique_hashes), _LOOKUP_CHUNK_SIZE):
+        chunk = unique_hashes[start:start + _LOOKUP_CHUNK_SIZE]
+        rows = connection.exec_driver_sql(_LOOKUP_SQL.format(", ".join("?" * len(chunk))), (tokenizer_id, *chunk))
+        cached.update(rows.all())
+    return cached
+
+
+def store_cached_counts(db, tokenizer_id: str, counts: Dict[str, int]) -> None:
+    """Persist newly computed counts, keeping existing entries."""
+    if not counts:
+        return
+    _connection(db).exec_driver_sql(
+        _STORE_SQL, [(tokenizer_id, digest, n_tokens) for digest, n_tokens in counts.items()]
+    )
+
+
+def count_tokens_cached(db, contents: Sequence[Optional[str]], counter: Optional[TokenCounter] = None):
+    """Count tokens for `contents`, going through the persisted token cache.
+
+    `db` may be a Session or a Connection; new cache entries are written
+    in its current transaction. Returns `(tokenizer_id, hashes, counts)`.
+    """
+    counter = counter or get_token_counter()
+    hashes = [content_hash(content) for content in contents]
+    cached = lookup_cached_counts(db, counter.id, hashes)
+
+    missing: Dict[str, Optional[str]] = {}
+    for digest, content in zip(hashes, contents):
+        if digest not in cached:
+            missing.setdefault(digest, content)
+    if missing:
+        new_counts = dict(zip(missing, counter.count_batch(list(missing.values()))))
+        store_cached_counts(db, counter.id, new_counts)
+        cached.update(new_counts)
+
+    return counter.id, hashes, [cached[digest] for digest in hashes]
+
+
+def assign_token_counts(db, messages: Iterable[Message]) -> None:
+    """Set `token_count` on ORM messages whose stored count is missing or stale."""
+    counter = get_token_counter()
+    stale = [
+        msg for msg in messages
+        if msg.tokenizer != counter.id or msg.content_hash != content_hash(msg.content)
+    ]
+    if not stale:
+        return
+
+    tokenizer_id, hashes, counts = count_tokens_cached(db, [msg.content for msg in stale], counter)
+    for msg, digest, n_tokens in zip(stale, hashes, counts):
+        msg.tokenizer = tokenizer_id
+        msg.content_hash = digest
+        msg.token_count = n_tokens
+
+
+def current_token_counts(db, messages: Sequence[Message]) -> List[int]:
+    """Token counts of ORM messages under the current tokenizer, without writing anything.
+
+    Stale stored counts are replaced by cached or freshly computed ones in
+    memory only; persisting them is left to the retokenize job.
+    """
+    counter = get_token_counter()
+    counts = [msg.token_count or 0 for msg in messages]
+    stale = [
+        i for i, msg in enumerate(messages)
+        if msg.tokenizer != counter.id or msg.content_hash != content_hash(msg.content)
+    ]
+    if not stale:
+        return counts
+
+    hashes = [content_hash(messages[i].content) for i in stale]
+    cached = lookup_cached_counts(db, counter.id, hashes)
+    missing = [i for i, digest in zip(stale, hashes) if digest not in cached]
+    fresh = dict(zip(missing, counter.count_batch([messages[i].content for i in missing])))
+    for i, digest in zip(stale, hashes):
+        counts[i] = cached[digest] if digest in cached else fresh[i]
+    return counts
+
+
+def drop_stale_cache_entries(db, counter: Optional[TokenCounter] = None) -> None:
+    """Remove cached counts made by tokenizers other than the current one."""
+    counter = counter or get_token_counter()
+    db.execute(TokenCacheEntry.__table__.delete().where(TokenCacheEntry.tokenizer != counter.id))
@@ -0,0 +1,155 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase
+from lima_gui.models.db import get_chat_db
+
+
+@pytest.fixture()
+def client_and_engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def create_chat(client):
+    chat_id = client.post("/chats").json()["id"]
+    client.post(f"/chat/{chat_id}/tools", json={"name": "search", "description": "Search", "parameters": {}})
+    first = client.post(f"/chat/{chat_id}/message").json()["id"]
+    client.put(f"/chat/{chat_id}/message/{first}", json={"content": "You are helpful"})
+    second = client.post(f"/chat/{chat_id}/message").json()["id"]
+    client.put(f"/chat/{chat_id}/message/{second}", json={"content": "Hi"})
+    return chat_id, first, second
+
+
+def test_batch_applies_all_operations_in_one_commit(client_and_engine):
+    client, engine = client_and_engine
+    chat_id, first, second = create_chat(client)
+
+    commits = []
+
+    def record_commit(connection):
+        commits.append(connection)
+
+    event.listen(engine, "commit", record_commit)
+    try:
+        response = client.patch(f"/chat/{chat_id}/batch", json={"operations": [
+            {"op": "update_chat", "name": "Renamed", "language": "en"},
+            {"op": "set_tags", "tags": ["greeting", "tools"]},
+            {"op": "update_message", "message_id": second, "content": "Hello there"},
+            {"op": "add_message", "ref": "answer", "content": "Let me search"},
+            {"op": "add_tool_call", "message_id": "answer", "name": "search", "arguments": "{}"},
+            {"op": "add_message", "ref": "intro", "before_id": second, "role": "assistant", "content": "Welcome"},
+            {"op": "move_message", "message_id": "intro", "before_id": first},
+            {"op": "delete_message", "message_id": first},
+            {"op": "edit_tool", "tool_name": "search", "name": "lookup", "description": "Look up", "parameters": {}},
+            {"op": "add_tool", "name": "calculator", "description": "Calculate", "parameters": {}},
+        ]})
+    finally:
+        event.remove(engine, "commit", record_commit)
+
+    assert response.status_code == 200
+    assert len(commits) == 1
+
+    chat = response.json()
+    assert chat["name"] == "Renamed"
+    assert chat["language"] == "en"
+    assert sorted(chat["tags"]) == ["greeting", "tools"]
+    assert [(m["role"], m["content"]) for m in chat["messages"]] == [
+        ("assistant", "Welcome"),
+        ("assistant", "Hello there"),
+        ("user", "Let me search"),
+    ]
+    assert [call["tool_name"] for call in chat["messages"][2]["tool_calls"]] == ["search"]
+    assert sorted(tool["name"] for tool in chat["tools"]) == ["calculator", "lookup"]
+
+
+def test_failed_operation_rolls_back_the_batch(client_and_engine):
+    client, _ = client_and_engine
+    chat_id, _, second = create_chat(client)
+    before = client.get(f"/chat/{chat_id}").json()
+
+    response = client.patch(f"/chat/{chat_id}/batch", json={"operations": [
+        {"op": "update_chat", "name": "Renamed"},
+        {"op": "add_message", "content": "Extra"},
+        {"op": "delete_message", "message_id": second},
+        {"op": "update_message", "message_id": 9999, "content": "Missing"},
+    ]})
+
+    assert response.status_code == 404
+    assert response.json()["detail"].startswith("Operation 3 (update_message)")
+    assert client.get(f"/chat/{chat_id}").json() == before
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "add_tool", "name": "calculator", "description": "Calculate", "parameters": {"type": "nope"}},
+    {"op": "edit_tool", "tool_name": "search", "name": "search", "description": "Search", "parameters": {"type": "nope"}},
+])
+def test_invalid_tool_schema_rolls_back_the_batch(client_and_engine, operation):
+    client, _ = client_and_engine
+    chat_id, _, _ = create_chat(client)
+    before = client.get(f"/chat/{chat_id}").json()
+
+    response = client.patch(f"/chat/{chat_id}/batch", json={"operations": [
+        {"op": "update_chat", "name": "Renamed"},
+        {"op": "add_message", "content": "Extra"},
+        operation,
+    ]})
+
+    assert response.status_code == 422
+    assert response.json()["detail"].startswith(f"Operation 2 ({operation['op']})")
+    assert client.get(f"/chat/{chat_id}").json() == before
+
+
+@pytest.mark.parametrize("operation, status_code", [
+    ({"op": "add_tool", "name": "search", "description": "Duplicate", "parameters": {}}, 409),
+    ({"op": "update_message", "message_id": "unknown", "content": "x"}, 422),
+    ({"op": "update_message", "message_id": 0, "role": "narrator"}, 422),
+    ({"op": "delete_tool", "tool_name": "missing"}, 404),
+])
+def test_batch_errors(client_and_engine, operation, status_code):
+    client, _ = client_and_engine
+    chat_id, first, _ = create_chat(client)
+    if operation.get("message_id") == 0:
+        operation = {**operation, "message_id": first}
+
+    response = client.patch(f"/chat/{chat_id}/batch", json={"operations": [
+        {"op": "update_chat", "name": "Renamed"},
+        operation,
+    ]})
+
+    assert response.status_code == status_code
+    assert client.get(f"/chat/{chat_id}").json()["name"] != "Renamed"
+
+
+def test_batch_rejects_unknown_operations_and_missing_chat(client_and_engine):
+    client, _ = client_and_engine
+    chat_id, _, _ = create_chat(client)
+
+    response = client.patch(f"/chat/{chat_id}/batch", json={"operations": [{"op": "rename_everything"}]})
+    assert response.status_code == 422
+
+    response = client.patch("/chat/9999/batch", json={"operations": []})
+    assert response.status_code == 404
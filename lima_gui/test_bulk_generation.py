@@ -0,0 +1,261 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, RoleEnum, Tag
+from lima_gui.models.db import get_chat_db
+from lima_gui.routers.settings import get_config_manager
+from lima_gui.services import bulk_generation
+from lima_gui.services.bulk_generation import GenerationJobOptions, TokenBucket, generate_replies
+from lima_gui.services.completion_cache import CompletionCache
+from lima_gui.services.generation import GenerationConfig
+from lima_gui.services.jobs import Job
+from lima_gui.testing import MockCompletion, MockOpenAIServer
+
+
+class StaticConfigManager:
+    def __init__(self, openai_config):
+        self.openai_config = openai_config
+
+    def get_openai_config(self):
+        return self.openai_config
+
+
+@pytest.fixture()
+def mock_api():
+    with MockOpenAIServer() as server:
+        yield server
+
+
+@pytest.fixture()
+def openai_config(mock_api):
+    return {"enabled": True, "model": "mock-model", "api_type": "chat", "api_base": mock_api.api_base}
+
+
+@pytest.fixture()
+def engine(tmp_path, openai_config):
+    # A file database: the job writes from its own thread while requests read.
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+    app.dependency_overrides[get_config_manager] = lambda: StaticConfigManager(openai_config)
+    yield engine
+    app.dependency_overrides.pop(get_chat_db, None)
+    app.dependency_overrides.pop(get_config_manager, None)
+    engine.dispose()
+
+
+@pytest.fixture()
+def client(engine):
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture()
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(bulk_generation, "RETRY_BACKOFF", 0.01)
+
+
+def create_chats(engine, questions, tag=None, answered=False):
+    with sessionmaker(bind=engine)() as session:
+        tags = [session.get(Tag, tag) or Tag(name=tag)] if tag else []
+        chats = []
+        for question in questions:
+            chat = Chat(name=question, language="en", tags=list(tags))
+            chat.messages = [Message(role=RoleEnum.user, content=question, position=1024)]
+            if answered:
+                chat.messages.append(Message(role=RoleEnum.assistant, content="Already answered", position=2048))
+            chats.append(chat)
+        session.add_all(chats)
+        session.commit()
+        return [chat.id for chat in chats]
+
+
+def last_message(client, chat_id):
+    return client.get(f"/chat/{chat_id}").json()["messages"][-1]
+
+
+def wait_for_job(client, job_id):
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("pending", "running") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.01)
+
+
+def run_job(engine, chat_ids, mock_api, cache=None, **options):
+    config = GenerationConfig(enabled=True, model="mock-model", api_base=mock_api.api_base)
+    options = GenerationJobOptions(**options)
+    job = Job(0, "generate")
+    job.run(lambda job: asyncio.run(generate_replies(engine, chat_ids, config, options, job, cache)))
+    return job
+
+
+def test_generates_replies_for_chats_waiting_for_an_answer(client, engine, mock_api):
+    waiting = create_chats(engine, [f"Question {i}?" for i in range(7)], tag="question answering")
+    answered = create_chats(engine, ["Answered?"], tag="question answering", answered=True)
+    other = create_chats(engine, ["Untagged?"])
+    mock_api.responder = lambda body: MockCompletion(
+        content=f"Answer to {body['messages'][-1]['content']}", delay=0.05
+    )
+
+    response = client.post(
+        "/jobs/generate",
+        json={"filter": {"tag": "question answering"}, "concurrency": 3, "write_batch_size": 2},
+    )
+
+    assert response.status_code == 200
+    job = wait_for_job(client, response.json()["id"])
+    assert job["status"] == "completed"
+    assert job["kind"] == "generate"
+    assert job["params"]["concurrency"] == 3
+    assert job["processed"] == job["total"] == 7
+    assert job["throughput"] > 0
+    result = job["result"]
+    assert (result["selected"], result["generated"], result["saved"], result["failed"]) == (7, 7, 7, 0)
+    assert result["completion_tokens"] > 0
+    # Never more requests at once than allowed, but more than one.
+    assert 2 <= mock_api.max_in_flight <= 3
+
+    for i, chat_id in enumerate(waiting):
+        message = last_message(client, chat_id)
+        assert (message["role"], message["content"]) == ("assistant", f"Answer to Question {i}?")
+    assert last_message(client, answered[0])["content"] == "Already answered"
+    assert last_message(client, other[0])["role"] == "user"
+    assert len(mock_api.requests) == 7
+
+
+def test_every_selected_chat_without_last_role(engine, mock_api):
+    chat_ids = create_chats(engine, ["One", "Two"], answered=True)
+
+    job = run_job(engine, chat_ids + [999], mock_api, last_role=None)
+
+    assert job.result["generated"] == 2
+    assert job.total == 2
+
+
+def test_retries_rate_limits_and_server_errors(engine, mock_api, fast_retries):
+    chat_ids = create_chats(engine, ["a", "b", "c", "bad request"])
+    calls = Counter()
+
+    def responder(body):
+        content = body["messages"][-1]["content"]
+        calls[content] += 1
+        if content == "bad request":
+            return MockCompletion(status=400)
+        if calls[content] == 1:
+            return MockCompletion(status=429, headers={"Retry-After": "0"})
+        if calls[content] == 2:
+            return MockCompletion(status=503)
+        return MockCompletion(content="Finally")
+
+    mock_api.responder = responder
+
+    job = run_job(engine, chat_ids, mock_api, concurrency=2)
+
+    assert job.status == Job.COMPLETED
+    assert (job.result["generated"], job.result["failed"], job.result["retries"]) == (3, 1, 6)
+    assert job.result["errors"][0]["chat_id"] == chat_ids[3]
+    # Client errors aren't retried.
+    assert calls["bad request"] == 1
+    assert job.processed == 4
+
+
+def test_gives_up_after_max_retries(engine, mock_api, fast_retries):
+    chat_ids = create_chats(engine, ["a"])
+    mock_api.responder = lambda body: MockCompletion(status=500)
+
+    job = run_job(engine, chat_ids, mock_api, max_retries=2)
+
+    assert (job.result["generated"], job.result["failed"], job.result["retries"]) == (0, 1, 2)
+    assert len(mock_api.requests) == 3
+
+
+def test_requests_per_minute_paces_the_job(engine, mock_api):
+    chat_ids = create_chats(engine, ["a", "b", "c"])
+
+    started = time.perf_counter()
+    job = run_job(engine, chat_ids, mock_api, concurrency=3, requests_per_minute=120)
+
+    # Two requests per second, with a burst of two: the third waits half a second.
+    assert time.perf_counter() - started >= 0.45
+    assert job.result["generated"] == 3
+
+
+def test_cached_completions_are_reused(engine, mock_api):
+    cache = CompletionCache("sqlite://")
+    first = create_chats(engine, ["Same question", "Another question"])
+    run_job(engine, first, mock_api, cache=cache)
+    second = create_chats(engine, ["Same question"])
+
+    job = run_job(engine, second, mock_api, cache=cache)
+    assert (job.result["generated"], job.result["cached"], job.result["saved"]) == (0, 1, 1)
+    assert len(mock_api.requests) == 2
+
+    job = run_job(engine, create_chats(engine, ["Same question"]), mock_api, cache=cache, use_cache=False)
+    assert (job.result["generated"], job.result["cached"]) == (1, 0)
+    assert len(mock_api.requests) == 3
+
+
+def test_token_bucket():
+    async def timed(bucket, amounts):
+        started = time.perf_counter()
+        for amount in amounts:
+            await bucket.acquire(amount)
+        return time.perf_counter() - started
+
+    assert asyncio.run(timed(TokenBucket(50, capacity=1), [1] * 6)) >= 0.09
+    # A large request borrows against the refills that come after it.
+    assert asyncio.run(timed(TokenBucket(100, capacity=10), [30, 1])) >= 0.2
+
+
+def test_cancel_generation_job(client, engine, mock_api):
+    chat_ids = create_chats(engine, [f"Question {i}?" for i in range(10)])
+    release = threading.Event()
+
+    def responder(body):
+        release.wait(timeout=10)
+        return MockCompletion()
+
+    mock_api.responder = responder
+    try:
+        job_id = client.post("/jobs/generate", json={"ids": chat_ids, "concurrency": 2}).json()["id"]
+        deadline = time.monotonic() + 10
+        while mock_api.in_flight < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert client.delete(f"/jobs/{job_id}").status_code == 200
+        job = wait_for_job(client, job_id)
+    finally:
+        release.set()
+
+    assert job["status"] == "cancelled"
+    assert job["processed"] < job["total"] == 10
+    assert all(last_message(client, chat_id)["role"] == "user" for chat_id in chat_ids)
+
+
+def test_generation_job_validation(client, engine, openai_config):
+    chat_ids = create_chats(engine, ["a"])
+
+    assert client.post("/jobs/generate", json={}).status_code == 422
+    assert client.post("/jobs/generate", json={"ids": chat_ids, "concurrency": 0}).status_code == 422
+    assert client.post("/jobs/generate", json={"ids": chat_ids, "last_role": "robot"}).status_code == 422
+    openai_config["enabled"] = False
+    assert client.post("/jobs/generate", json={"ids": chat_ids}).status_code == 400
@@ -0,0 +1,140 @@
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat
+from lima_gui.models.db import add_missing_columns, get_chat_db
+from lima_gui.services.aggregates import rebuild_chat_aggregates
+from lima_gui.services.retokenize import retokenize_messages
+
+
+@pytest.fixture()
+def client_and_session():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, TestingSessionLocal, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def add_message(client, chat_id, content, role):
+    message_id = client.post(f"/chat/{chat_id}/message").json()["id"]
+    response = client.put(f"/chat/{chat_id}/message/{message_id}", json={"content": content, "role": role})
+    assert response.status_code == 200
+    return message_id
+
+
+def read_aggregates(session_factory, chat_id):
+    with session_factory() as session:
+        chat = session.get(Chat, chat_id)
+        return chat.message_count, chat.token_count, chat.preview
+
+
+def test_message_mutations_maintain_aggregates(client_and_session):
+    client, session_factory, _ = client_and_session
+    chat_id = client.post("/chats").json()["id"]
+
+    add_message(client, chat_id, "be helpful", "system")
+    question_id = add_message(client, chat_id, "what is two plus two", "user")
+    add_message(client, chat_id, "four", "assistant")
+    assert read_aggregates(session_factory, chat_id) == (3, 8, "what is two plus two")
+
+    client.put(f"/chat/{chat_id}/message/{question_id}", json={"content": "and three plus three"})
+    assert read_aggregates(session_factory, chat_id) == (3, 7, "and three plus three")
+
+    client.delete(f"/chat/{chat_id}/message/{question_id}")
+    assert read_aggregates(session_factory, chat_id) == (2, 3, None)
+
+    detail = client.get(f"/chat/{chat_id}").json()
+    assert detail["n_msgs"] == 2
+    assert detail["tokens"] == 3
+
+    summary = client.get("/chats").json()[0]
+    assert summary["message_count"] == 2
+    assert summary["tokens"] == 3
+    assert summary["last_modified"] is not None
+
+
+def test_upload_maintains_aggregates(client_and_session):
+    client, session_factory, _ = client_and_session
+    payload = '{"name": "Imported", "messages": [{"role": "user", "content": "hello there"}, {"role": "assistant", "content": "hi"}]}\n'
+
+    response = client.post(
+        "/chats/upload",
+        files={"file": ("import.jsonl", payload.encode("utf-8"), "application/jsonl")},
+    )
+    assert response.status_code == 200
+
+    summary = client.get("/chats").json()[0]
+    assert summary["message_count"] == 2
+    assert summary["tokens"] == 3
+    assert summary["preview"] == "hello there"
+
+
+def test_rebuild_repairs_corrupted_aggregates(client_and_session):
+    client, session_factory, engine = client_and_session
+    chat_id = client.post("/chats").json()["id"]
+    add_message(client, chat_id, "count these three", "user")
+
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE messages SET token_count = 0"))
+        connection.execute(text("UPDATE chats SET message_count = 42, token_count = 0, preview = NULL"))
+    assert read_aggregates(session_factory, chat_id) == (42, 0, None)
+
+    retokenize_messages(engine, only_stale=False)
+    with engine.begin() as connection:
+        rebuild_chat_aggregates(connection)
+    assert read_aggregates(session_factory, chat_id) == (1, 3, "count these three")
+
+
+def test_add_missing_columns_upgrades_old_database():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE chats (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, language VARCHAR NOT NULL)"))
+            connection.execute(text(
+                "CREATE TABLE messages (id INTEGER PRIMARY KEY, chat_id INTEGER, role VARCHAR(9) NOT NULL, "
+                "content VARCHAR, position INTEGER NOT NULL)"
+            ))
+            connection.execute(text("INSERT INTO chats (id, name, language) VALUES (1, 'Old', 'en')"))
+            connection.execute(text(
+                "INSERT INTO messages (chat_id, role, content, position) VALUES (1, 'user', 'old message', 1)"
+            ))
+
+        added = add_missing_columns(engine)
+        assert "chats.message_count" in added
+        assert "messages.token_count" in added
+
+        ChatBase.metadata.create_all(engine)
+        retokenize_messages(engine)
+        with engine.begin() as connection:
+            rebuild_chat_aggregates(connection)
+            row = connection.execute(text("SELECT message_count, token_count, preview FROM chats")).one()
+        assert tuple(row) == (1, 2, "old message")
+    finally:
+        engine.dispose()
+        os.remove(path)
@@ -0,0 +1,111 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase
+from lima_gui.models.db import get_chat_db
+from lima_gui.services.chat_cache import ChatDetailsCache, get_chat_details_cache
+
+
+@pytest.fixture()
+def client_and_engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def create_chat(client, content="Hello"):
+    chat_id = client.post("/chats").json()["id"]
+    message_id = client.post(f"/chat/{chat_id}/message").json()["id"]
+    client.put(f"/chat/{chat_id}/message/{message_id}", json={"content": content})
+    return chat_id, message_id
+
+
+def test_lru_is_bounded_by_bytes():
+    cache = ChatDetailsCache(max_bytes=10)
+    cache.put(1, "a", b"1234")
+    cache.put(2, "a", b"1234")
+    assert cache.get(1, "a") == b"1234"  # 1 is now the most recently used
+
+    cache.put(3, "a", b"1234")
+
+    assert cache.get(2, "a") is None
+    assert cache.get(1, "a") == b"1234"
+    assert cache.get(3, "a") == b"1234"
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions) == (3, 1, 1)
+    assert (stats.entries, stats.size_bytes) == (2, 8)
+
+
+def test_lru_replaces_older_versions_and_skips_oversized_bodies():
+    cache = ChatDetailsCache(max_bytes=10)
+    cache.put(1, "v1", b"old")
+    cache.put(1, "v2", b"new")
+    cache.put(2, "v1", b"much too large")
+
+    assert cache.get(1, "v1") is None
+    assert cache.get(1, "v2") == b"new"
+    assert cache.get(2, "v1") is None
+    assert cache.stats().size_bytes == 3
+
+
+def test_repeated_reads_are_served_from_the_cache(client_and_engine):
+    client, engine = client_and_engine
+    chat_id, _ = create_chat(client)
+
+    first = client.get(f"/chat/{chat_id}")
+    second = client.get(f"/chat/{chat_id}")
+
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    stats = client.get("/metrics/chat-cache").json()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_mutations_invalidate_the_cached_chat(client_and_engine):
+    client, engine = client_and_engine
+    chat_id, message_id = create_chat(client)
+    client.get(f"/chat/{chat_id}")
+
+    client.put(f"/chat/{chat_id}/message/{message_id}", json={"content": "Edited"})
+
+    assert get_chat_details_cache(engine).stats().entries == 0
+    assert client.get(f"/chat/{chat_id}").json()["messages"][0]["content"] == "Edited"
+
+    client.delete(f"/chats/{chat_id}")
+    stats = get_chat_details_cache(engine).stats()
+    assert (stats.entries, stats.invalidations) == (0, 2)
+    assert client.get(f"/chat/{chat_id}").status_code == 404
+
+
+def test_stale_body_is_not_served_after_an_uninvalidated_write(client_and_engine):
+    client, engine = client_and_engine
+    chat_id, _ = create_chat(client)
+    client.get(f"/chat/{chat_id}")
+
+    # A write that bypasses the endpoints still bumps the chat version.
+    with engine.begin() as connection:
+        connection.exec_driver_sql("UPDATE chats SET name = 'Renamed' WHERE id = ?", (chat_id,))
+
+    assert client.get(f"/chat/{chat_id}").json()["name"] == "Renamed"
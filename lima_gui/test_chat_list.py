@@ -0,0 +1,109 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, Tag, RoleEnum
+from lima_gui.models.db import get_chat_db
+
+
+@pytest.fixture()
+def client_and_session():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, TestingSessionLocal
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def seed_chats(session_factory):
+    with session_factory() as session:
+        alpha = Tag(name="alpha")
+        beta = Tag(name="beta")
+        session.add_all([alpha, beta])
+
+        specs = [
+            ("Weather report", "en", [alpha], ["what is the weather"]),
+            ("Recette de cuisine", "fr", [beta], ["bonjour", "salut toi"]),
+            ("weather 100%_sure", "en", [alpha, beta], []),
+            ("Coding help", "en", [], ["fix my bug please"]),
+        ]
+        chat_ids = []
+        for name, language, tags, contents in specs:
+            chat = Chat(name=name, language=language)
+            chat.tags = list(tags)
+            for position, content in enumerate(contents, start=1):
+                chat.messages.append(Message(role=RoleEnum.user, content=content, position=position))
+            session.add(chat)
+            session.flush()
+            chat_ids.append(chat.id)
+        session.commit()
+        return chat_ids
+
+
+def test_list_chats_keyset_pagination(client_and_session):
+    client, session_factory = client_and_session
+    chat_ids = seed_chats(session_factory)
+
+    first_page = client.get("/chats", params={"limit": 3})
+    assert first_page.status_code == 200
+    assert [chat["id"] for chat in first_page.json()] == chat_ids[:3]
+    cursor = first_page.headers["X-Next-After-Id"]
+    assert cursor == str(chat_ids[2])
+
+    second_page = client.get("/chats", params={"limit": 3, "after_id": cursor})
+    assert [chat["id"] for chat in second_page.json()] == chat_ids[3:]
+    assert "X-Next-After-Id" not in second_page.headers
+
+
+def test_list_chats_aggregates(client_and_session):
+    client, session_factory = client_and_session
+    chat_ids = seed_chats(session_factory)
+
+    chats = {chat["id"]: chat for chat in client.get("/chats").json()}
+    assert chats[chat_ids[1]]["message_count"] == 2
+    assert chats[chat_ids[1]]["tokens"] == 3
+    assert chats[chat_ids[2]]["message_count"] == 0
+    assert chats[chat_ids[2]]["tokens"] == 0
+    assert chats[chat_ids[2]]["tags"] == ["alpha", "beta"]
+    assert chats[chat_ids[3]]["tags"] == []
+    assert chats[chat_ids[3]]["tools"] == []
+
+
+def test_list_chats_filters(client_and_session):
+    client, session_factory = client_and_session
+    chat_ids = seed_chats(session_factory)
+
+    by_tag = client.get("/chats", params={"tag": "alpha"}).json()
+    assert [chat["id"] for chat in by_tag] == [chat_ids[0], chat_ids[2]]
+
+    by_language = client.get("/chats", params={"language": "fr"}).json()
+    assert [chat["id"] for chat in by_language] == [chat_ids[1]]
+
+    by_name = client.get("/chats", params={"name": "WEATHER"}).json()
+    assert [chat["id"] for chat in by_name] == [chat_ids[0], chat_ids[2]]
+
+    # LIKE wildcards in the search string are matched literally.
+    by_wildcard = client.get("/chats", params={"name": "%_"}).json()
+    assert [chat["id"] for chat in by_wildcard] == [chat_ids[2]]
+
+    combined = client.get("/chats", params={"tag": "beta", "language": "en"}).json()
+    assert [chat["id"] for chat in combined] == [chat_ids[2]]
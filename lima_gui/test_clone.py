@@ -0,0 +1,142 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, RoleEnum, Tag, Tool, ToolCall
+from lima_gui.models.db import get_chat_db
+from lima_gui.services.clone import clone_chats
+from lima_gui.testing import count_queries
+
+
+@pytest.fixture()
+def client_and_engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def create_chats(engine, n_chats, n_messages=3, language="en", prefix="Chat"):
+    # Messages of the chats are added round-robin, so their ids interleave.
+    with sessionmaker(bind=engine)() as session:
+        chats = [
+            Chat(name=f"{prefix} {i}", language=language, tags=[Tag(name=f"tag-{prefix}-{language}-{i}")])
+            for i in range(n_chats)
+        ]
+        for i, chat in enumerate(chats):
+            chat.tools = [Tool(name=f"tool-{i}", description="Tool", parameters={"type": "object"})]
+        session.add_all(chats)
+        session.flush()
+        for position in range(n_messages):
+            for i, chat in enumerate(chats):
+                role = RoleEnum.user if position % 2 == 0 else RoleEnum.assistant
+                message = Message(role=role, content=f"chat {i} message {position}", position=position * 1024)
+                message.tool_calls = [ToolCall(name=f"call-{i}-{position}", arguments="{}")]
+                chat.messages.append(message)
+        session.commit()
+        return [chat.id for chat in chats]
+
+
+def without_ids(chat):
+    return {
+        **{key: value for key, value in chat.items() if key not in ("id", "name", "version")},
+        "messages": [
+            {
+                "role": m["role"],
+                "content": m["content"],
+                "tool_calls": [call["tool_name"] for call in m["tool_calls"]],
+            }
+            for m in chat["messages"]
+        ],
+    }
+
+
+def test_bulk_copy_by_ids(client_and_engine):
+    client, engine = client_and_engine
+    chat_ids = create_chats(engine, 3)
+
+    response = client.post("/chats/copy", json={"ids": [chat_ids[2], chat_ids[0], 999]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["copied"] == 2
+    assert [pair["source_id"] for pair in body["chats"]] == [chat_ids[0], chat_ids[2]]
+    for pair in body["chats"]:
+        original = client.get(f"/chat/{pair['source_id']}").json()
+        copied = client.get(f"/chat/{pair['id']}").json()
+        assert copied["name"] == original["name"] + " - Copy"
+        assert without_ids(copied) == without_ids(original)
+
+
+def test_bulk_copy_by_filter(client_and_engine):
+    client, engine = client_and_engine
+    create_chats(engine, 2, language="en")
+    french_ids = create_chats(engine, 2, language="fr")
+
+    response = client.post("/chats/copy", json={"filter": {"language": "fr"}})
+
+    assert [pair["source_id"] for pair in response.json()["chats"]] == french_ids
+    listed = client.get("/chats", params={"language": "fr"}).json()
+    assert [chat["name"] for chat in listed] == ["Chat 0", "Chat 1", "Chat 0 - Copy", "Chat 1 - Copy"]
+    assert [chat["message_count"] for chat in listed] == [3, 3, 3, 3]
+    assert listed[2]["preview"] == listed[0]["preview"]
+    assert listed[2]["tokens"] == listed[0]["tokens"]
+
+
+def test_copies_are_searchable(client_and_engine):
+    client, engine = client_and_engine
+    chat_id = create_chats(engine, 1)[0]
+    copy_id = client.post(f"/chats/{chat_id}/copy").json()["id"]
+
+    hits = client.get("/search", params={"q": "message", "chat_id": copy_id}).json()["hits"]
+    assert len(hits) == 3
+
+
+def test_query_count_does_not_grow_with_chats(client_and_engine):
+    _, engine = client_and_engine
+    few = create_chats(engine, 2)
+    many = create_chats(engine, 40, n_messages=10, prefix="Many")
+
+    with sessionmaker(bind=engine)() as session:
+        with count_queries(engine) as few_queries:
+            clone_chats(session, few)
+        with count_queries(engine) as many_queries:
+            clone_chats(session, many)
+        session.commit()
+
+    assert many_queries.count == few_queries.count
+
+
+@pytest.mark.parametrize("payload", [
+    {},
+    {"ids": [1], "filter": {"language": "en"}},
+    {"filter": {}},
+])
+def test_bulk_copy_rejects_ambiguous_requests(client_and_engine, payload):
+    client, _ = client_and_engine
+    assert client.post("/chats/copy", json=payload).status_code == 422
+
+
+def test_copy_missing_chat(client_and_engine):
+    client, _ = client_and_engine
+    assert client.post("/chats/999/copy").status_code == 404
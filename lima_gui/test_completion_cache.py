@@ -0,0 +1,200 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, RoleEnum
+from lima_gui.models.db import get_chat_db
+from lima_gui.routers.settings import get_config_manager
+from lima_gui.services.completion_cache import CachedCompletion, CompletionCache, completion_fingerprint
+from lima_gui.services.generation import GenerationConfig
+from lima_gui.testing import MockCompletion, MockOpenAIServer
+
+
+class StaticConfigManager:
+    def __init__(self, openai_config):
+        self.openai_config = openai_config
+
+    def get_openai_config(self):
+        return self.openai_config
+
+
+@pytest.fixture()
+def mock_api():
+    with MockOpenAIServer() as server:
+        yield server
+
+
+@pytest.fixture()
+def openai_config(mock_api):
+    return {"enabled": True, "model": "mock-model", "temperature": 0.7, "api_type": "chat", "api_base": mock_api.api_base}
+
+
+@pytest.fixture()
+def client(openai_config):
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+    app.dependency_overrides[get_config_manager] = lambda: StaticConfigManager(openai_config)
+
+    with TestClient(app) as test_client:
+        test_client.engine = engine
+        yield test_client
+
+    app.dependency_overrides.pop(get_chat_db, None)
+    app.dependency_overrides.pop(get_config_manager, None)
+
+
+def create_chat(engine, question="What is the weather?"):
+    with sessionmaker(bind=engine)() as session:
+        chat = Chat(name="Chat", language="en")
+        chat.messages = [Message(role=RoleEnum.user, content=question, position=1024)]
+        session.add(chat)
+        session.commit()
+        return chat.id
+
+
+def completion(content):
+    return CachedCompletion(content=content, finish_reason="stop")
+
+
+def test_fingerprint_covers_the_request_and_api():
+    config = GenerationConfig(model="m", api_base="http://a/v1")
+    request = {"model": "m", "messages": [{"role": "user", "content": "Hi"}], "temperature": 0.7}
+
+    key = completion_fingerprint(config, request)
+
+    assert key == completion_fingerprint(config, {**request, "stream": True})
+    assert key == completion_fingerprint(config, dict(reversed(request.items())))
+    assert key != completion_fingerprint(config, {**request, "temperature": 0.8})
+    assert key != completion_fingerprint(config, {**request, "extra_body": {"top_k": 5}})
+    assert key != completion_fingerprint(config.model_copy(update={"api_base": "http://b/v1"}), request)
+
+
+def test_cache_persists_between_instances(tmp_path):
+    url = f"sqlite:///{tmp_path / 'cache.db'}"
+    cache = CompletionCache(url)
+    cache.put("key", "m", CachedCompletion(content="Hi", tool_calls=[{"name": "f", "arguments": "{}"}]))
+    cache.close()
+
+    reopened = CompletionCache(url)
+
+    assert reopened.get("key").tool_calls == [{"name": "f", "arguments": "{}"}]
+    assert reopened.get("other") is None
+    stats = reopened.stats()
+    assert (stats.hits, stats.misses, stats.hit_rate, stats.entries) == (1, 1, 0.5, 1)
+    assert stats.size_bytes > 0
+    reopened.close()
+
+
+def test_least_recently_used_entries_are_evicted():
+    entry_size = len("key0") + len(completion("x" * 100).model_dump_json())
+    # Room for three entries and a half; eviction frees down to 90%.
+    cache = CompletionCache("sqlite://", max_bytes=int(3.5 * entry_size))
+    for i in range(3):
+        cache.put(f"key{i}", "m", completion("x" * 100))
+        time.sleep(0.002)
+    cache.get("key0")  # Now the most recently used
+
+    cache.put("key3", "m", completion("x" * 100))
+
+    assert [key for key in ("key0", "key1", "key2", "key3") if cache.get(key)] == ["key0", "key2", "key3"]
+    stats = cache.stats()
+    assert (stats.evictions, stats.entries) == (1, 3)
+    assert stats.size_bytes <= stats.max_bytes
+
+
+def test_old_entries_expire():
+    cache = CompletionCache("sqlite://", max_age=0.05)
+    cache.put("old", "m", completion("Old"))
+    time.sleep(0.1)
+
+    assert cache.get("old") is None
+    cache.put("new", "m", completion("New"))
+
+    stats = cache.stats()
+    assert (stats.expirations, stats.entries) == (1, 1)
+    assert cache.get("new").content == "New"
+
+
+def test_regenerating_the_same_prompt_answers_from_the_cache(client, mock_api):
+    chat_id = create_chat(client.engine)
+    other_id = create_chat(client.engine)
+
+    first = client.post(f"/chat/{chat_id}/generate")
+    started = time.perf_counter()
+    second = client.post(f"/chat/{other_id}/generate")
+    elapsed = time.perf_counter() - started
+
+    assert first.headers["x-completion-cache"] == "miss"
+    assert second.headers["x-completion-cache"] == "hit"
+    assert len(mock_api.requests) == 1
+    assert elapsed < 0.5
+    replies = [client.get(f"/chat/{id}").json()["messages"][-1] for id in (chat_id, other_id)]
+    assert [reply["content"] for reply in replies] == ["Hello from the mock model."] * 2
+    assert "event: done" in second.text
+
+    stats = client.get("/metrics/completion-cache").json()
+    assert (stats["hits"], stats["misses"], stats["stores"], stats["entries"]) == (1, 1, 1, 1)
+
+
+def test_opting_out_calls_the_api_and_refreshes_the_entry(client, mock_api):
+    chat_id = create_chat(client.engine)
+    client.post(f"/chat/{chat_id}/generate")
+    mock_api.responder = lambda body: MockCompletion(content="A new sample.")
+    other_id = create_chat(client.engine)
+
+    bypassed = client.post(f"/chat/{other_id}/generate", params={"cache": False})
+    third_id = create_chat(client.engine)
+    cached = client.post(f"/chat/{third_id}/generate")
+
+    assert bypassed.headers["x-completion-cache"] == "bypass"
+    assert len(mock_api.requests) == 2
+    assert cached.headers["x-completion-cache"] == "hit"
+    assert client.get(f"/chat/{third_id}").json()["messages"][-1]["content"] == "A new sample."
+
+
+def test_settings_are_part_of_the_key(client, mock_api, openai_config):
+    chat_id = create_chat(client.engine)
+    client.post(f"/chat/{chat_id}/generate")
+    openai_config["temperature"] = 0.1
+
+    response = client.post(f"/chat/{chat_id}/generate")
+
+    assert response.headers["x-completion-cache"] == "miss"
+    assert len(mock_api.requests) == 2
+
+
+def test_failed_completions_are_not_cached(client, mock_api):
+    chat_id = create_chat(client.engine)
+    mock_api.responder = lambda body: MockCompletion(status=500)
+    client.post(f"/chat/{chat_id}/generate")
+
+    assert client.get("/metrics/completion-cache").json()["stores"] == 0
+
+
+def test_clear_completion_cache(client):
+    chat_id = create_chat(client.engine)
+    client.post(f"/chat/{chat_id}/generate")
+
+    assert client.delete("/completion-cache").status_code == 200
+
+    assert client.get("/metrics/completion-cache").json()["entries"] == 0
+    assert client.post(f"/chat/{chat_id}/generate").headers["x-completion-cache"] == "miss"
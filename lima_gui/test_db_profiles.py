@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from lima_gui.models.db import (
+    DEV_PROFILE,
+    PRODUCTION_PROFILE,
+    create_chat_engine,
+    get_engine_profile,
+)
+
+
+def pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_production_profile_sets_pragmas(tmp_path):
+    engine = create_chat_engine(f"sqlite:///{tmp_path / 'chat.db'}", get_engine_profile(PRODUCTION_PROFILE))
+
+    assert engine.echo is False
+    assert pragma(engine, "journal_mode") == "wal"
+    assert pragma(engine, "synchronous") == 1  # NORMAL
+    assert pragma(engine, "foreign_keys") == 1
+    assert pragma(engine, "busy_timeout") == 5000
+    assert pragma(engine, "cache_size") == -64000
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 10
+
+
+def test_dev_profile_keeps_sqlite_defaults_but_enforces_foreign_keys(tmp_path):
+    engine = create_chat_engine(f"sqlite:///{tmp_path / 'chat.db'}", get_engine_profile(DEV_PROFILE))
+
+    assert engine.echo is True
+    assert pragma(engine, "journal_mode") == "delete"
+    assert pragma(engine, "foreign_keys") == 1
+
+
+def test_profile_from_environment(monkeypatch):
+    monkeypatch.setenv("LIMA_GUI_DB_PROFILE", DEV_PROFILE)
+    assert get_engine_profile().name == DEV_PROFILE
+
+    monkeypatch.delenv("LIMA_GUI_DB_PROFILE")
+    assert get_engine_profile().name == PRODUCTION_PROFILE
+
+    with pytest.raises(ValueError):
+        get_engine_profile("turbo")
+
+
+def test_memory_database_ignores_pool_settings():
+    engine = create_chat_engine("sqlite://", get_engine_profile(PRODUCTION_PROFILE))
+    assert pragma(engine, "foreign_keys") == 1
@@ -0,0 +1,146 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase
+from lima_gui.models.db import get_chat_db
+from lima_gui.services.dedup import minhash_signatures, shingle_hashes, update_duplicate_index
+
+
+@pytest.fixture()
+def client_and_engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+WORDS = [f"word{i}" for i in range(200)]
+TEXT = " ".join(WORDS)
+
+
+def upload(client, contents, **params):
+    lines = [json.dumps({"name": f"Chat {i}", "messages": [{"role": "user", "content": c}]}) for i, c in enumerate(contents)]
+    return client.post(
+        "/chats/upload",
+        params=params,
+        files={"file": ("import.jsonl", ("\n".join(lines) + "\n").encode("utf-8"), "application/jsonl")},
+    )
+
+
+def chat_ids(client):
+    return [chat["id"] for chat in client.get("/chats").json()]
+
+
+def test_signatures_estimate_jaccard_similarity():
+    a = shingle_hashes(TEXT)
+    b = shingle_hashes(" ".join(WORDS[:150] + [f"other{i}" for i in range(50)]))
+    exact = len(np.intersect1d(a, b)) / len(np.union1d(a, b))
+
+    signatures = minhash_signatures([a, b])
+
+    assert signatures.shape == (2, 128)
+    assert abs((signatures[0] == signatures[1]).mean() - exact) < 0.1
+    # Batched signatures match one-by-one ones
+    assert (minhash_signatures([b])[0] == signatures[1]).all()
+
+
+def test_shingles_ignore_case_and_punctuation():
+    assert (shingle_hashes("Hello, World! How are you?") == shingle_hashes("hello world how are you")).all()
+    assert len(shingle_hashes("two words")) == 1
+    assert len(shingle_hashes("  ...  ")) == 0
+
+
+def test_duplicate_clusters(client_and_engine):
+    client, _ = client_and_engine
+    near_copy = TEXT.replace("word100", "changed")
+    upload(client, [TEXT, "something else entirely, not like the others at all", near_copy, TEXT.upper(), ""])
+    first, unrelated, copy, upper, empty = chat_ids(client)
+
+    response = client.get("/duplicates")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["chats_indexed"] == 4
+    assert [cluster["chat_ids"] for cluster in body["clusters"]] == [[first, copy, upper]]
+    assert 0.8 <= body["clusters"][0]["similarity"] < 1.0
+
+
+def test_index_follows_edits_and_deletes(client_and_engine):
+    client, engine = client_and_engine
+    upload(client, [TEXT, TEXT, TEXT])
+    first, second, third = chat_ids(client)
+    assert client.get("/duplicates").json()["clusters"][0]["chat_ids"] == [first, second, third]
+
+    message_id = client.get(f"/chat/{second}").json()["messages"][0]["id"]
+    client.put(f"/chat/{second}/message/{message_id}", json={"content": "completely rewritten by an annotator"})
+    client.delete(f"/chats/{third}")
+
+    with sessionmaker(bind=engine)() as session:
+        # Only the edited chat is re-signed
+        assert update_duplicate_index(session) == 1
+        session.commit()
+    body = client.get("/duplicates").json()
+    assert body["clusters"] == []
+    assert body["chats_indexed"] == 2
+    with engine.connect() as connection:
+        assert connection.execute(text(
+            "SELECT count(*) FROM chat_lsh_buckets WHERE chat_id = :id"), {"id": third}
+        ).scalar() == 0
+
+
+def test_import_flags_near_duplicates(client_and_engine):
+    client, _ = client_and_engine
+    upload(client, [TEXT])
+    existing = chat_ids(client)[0]
+
+    response = upload(
+        client,
+        ["unrelated words in a new chat", TEXT.replace("word5", "five"), "unrelated words in a new chat"],
+        check_duplicates=True,
+        batch_size=2,
+    )
+
+    body = response.json()
+    assert body["chats_added"] == 3
+    assert body["duplicate_count"] == 2
+    new_ids = chat_ids(client)[1:]
+    assert [(d["line"], d["chat_id"], d["duplicate_of"]) for d in body["duplicates"]] == [
+        (2, new_ids[1], existing),
+        (3, new_ids[2], new_ids[0]),
+    ]
+    assert body["duplicates"][1]["similarity"] == 1.0
+
+
+def test_import_without_check_reports_nothing(client_and_engine):
+    client, _ = client_and_engine
+    body = upload(client, [TEXT, TEXT]).json()
+    assert (body["duplicate_count"], body["duplicates"]) == (0, [])
+
+
+def test_threshold_is_validated(client_and_engine):
+    client, _ = client_and_engine
+    assert client.get("/duplicates", params={"threshold": 0.1}).status_code == 422
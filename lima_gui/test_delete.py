@@ -0,0 +1,135 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, RoleEnum, Tag, Tool, ToolCall
+from lima_gui.models.db import get_chat_db
+from lima_gui.services.delete import delete_chats
+from lima_gui.testing import count_queries
+
+
+@pytest.fixture(params=[True, False], ids=["foreign_keys", "no_foreign_keys"])
+def client_and_engine(request):
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    if request.param:
+        @event.listens_for(engine, "connect")
+        def _enable_foreign_keys(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA foreign_keys = ON")
+
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def create_chats(engine, n_chats, language="en", tags=("shared",), prefix="Chat"):
+    with sessionmaker(bind=engine)() as session:
+        chats = []
+        for i in range(n_chats):
+            chat = Chat(name=f"{prefix} {i}", language=language)
+            chat.tags = [session.get(Tag, name) or Tag(name=name) for name in (*tags, f"{prefix}-{i}")]
+            chat.tools = [Tool(name="search", description="Search", parameters={"type": "object"})]
+            message = Message(role=RoleEnum.user, content=f"{prefix.lower()} question {i}", position=0)
+            message.tool_calls = [ToolCall(name="search", arguments="{}")]
+            chat.messages = [message, Message(role=RoleEnum.assistant, content="answer", position=1024)]
+            session.add(chat)
+            session.flush()
+            chats.append(chat.id)
+        session.commit()
+        return chats
+
+
+def count_rows(engine):
+    with engine.connect() as connection:
+        return {
+            table: connection.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+            for table in ("chats", "messages", "tool_calls", "tools", "chat_tag", "tags")
+        }
+
+
+def test_delete_chat_removes_everything_it_owns(client_and_engine):
+    client, engine = client_and_engine
+    chat_id = create_chats(engine, 1)[0]
+
+    assert client.delete(f"/chats/{chat_id}").status_code == 200
+
+    assert count_rows(engine) == dict.fromkeys(("chats", "messages", "tool_calls", "tools", "chat_tag", "tags"), 0)
+    assert client.get("/search", params={"q": "question"}).json()["hits"] == []
+    assert client.get(f"/chat/{chat_id}").status_code == 404
+    assert client.delete(f"/chats/{chat_id}").status_code == 404
+
+
+@pytest.mark.parametrize("selection, expected", [
+    ({"ids": [1, 3, 999]}, ["Chat 1", "Other 0", "Other 1"]),
+    ({"filter": {"language": "fr"}}, ["Chat 0", "Chat 1", "Chat 2"]),
+    ({"filter": {"tag": "Chat-1"}}, ["Chat 0", "Chat 2", "Other 0", "Other 1"]),
+    ({"filter": {"search": "other"}}, ["Chat 0", "Chat 1", "Chat 2"]),
+    ({"filter": {"language": "en", "search": "question 2"}}, ["Chat 0", "Chat 1", "Other 0", "Other 1"]),
+])
+def test_bulk_delete(client_and_engine, selection, expected):
+    client, engine = client_and_engine
+    create_chats(engine, 3)
+    create_chats(engine, 2, language="fr", tags=("french",), prefix="Other")
+
+    response = client.post("/chats/delete", json=selection)
+
+    assert response.status_code == 200
+    assert response.json()["chats_deleted"] == 5 - len(expected)
+    assert [chat["name"] for chat in client.get("/chats").json()] == expected
+    rows = count_rows(engine)
+    assert rows["messages"] == rows["tool_calls"] * 2 == rows["tools"] * 2 == len(expected) * 2
+
+
+def test_bulk_delete_removes_only_unused_tags(client_and_engine):
+    client, engine = client_and_engine
+    create_chats(engine, 3)
+
+    response = client.post("/chats/delete", json={"ids": [1, 2]})
+
+    assert response.json()["tags_deleted"] == 2
+    with engine.connect() as connection:
+        assert sorted(connection.execute(text("SELECT name FROM tags")).scalars()) == ["Chat-2", "shared"]
+
+
+def test_statement_count_does_not_grow_with_chats(client_and_engine):
+    _, engine = client_and_engine
+    few = create_chats(engine, 2)
+    many = create_chats(engine, 50, prefix="Many")
+
+    with sessionmaker(bind=engine)() as session:
+        with count_queries(engine) as few_queries:
+            delete_chats(session, few)
+        with count_queries(engine) as many_queries:
+            delete_chats(session, many)
+        session.commit()
+
+    assert many_queries.count == few_queries.count <= 8
+    assert count_rows(engine)["messages"] == 0
+
+
+@pytest.mark.parametrize("selection", [{}, {"filter": {}}, {"ids": [1], "filter": {"tag": "shared"}}])
+def test_bulk_delete_rejects_ambiguous_requests(client_and_engine, selection):
+    client, engine = client_and_engine
+    create_chats(engine, 1)
+
+    assert client.post("/chats/delete", json=selection).status_code == 422
+    assert count_rows(engine)["chats"] == 1
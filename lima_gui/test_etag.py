@@ -0,0 +1,143 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase
+from lima_gui.models.db import get_chat_db
+from lima_gui.services import tokenizer as tokenizer_service
+from lima_gui.services.tokenizer import TokenCounter
+from lima_gui.testing import count_queries
+
+
+@pytest.fixture()
+def client_and_engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def create_chat(client, contents=("Hello",)):
+    chat_id = client.post("/chats").json()["id"]
+    for content in contents:
+        message_id = client.post(f"/chat/{chat_id}/message").json()["id"]
+        client.put(f"/chat/{chat_id}/message/{message_id}", json={"content": content})
+    return chat_id
+
+
+def test_unchanged_chat_is_not_modified_without_loading_messages(client_and_engine):
+    client, engine = client_and_engine
+    chat_id = create_chat(client, ["Hello", "Hi"])
+
+    response = client.get(f"/chat/{chat_id}")
+    etag = response.headers["ETag"]
+
+    with count_queries(engine) as queries:
+        revalidated = client.get(f"/chat/{chat_id}", headers={"If-None-Match": etag})
+
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.content == b""
+    assert len(queries.statements) == 1
+    assert "messages" not in queries.statements[0]
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda client, chat_id, message_id: client.put(f"/chat/{chat_id}", json={"name": "Renamed"}),
+    lambda client, chat_id, message_id: client.put(f"/chat/{chat_id}", json={"tags": ["a"]}),
+    lambda client, chat_id, message_id: client.post(f"/chat/{chat_id}/message"),
+    lambda client, chat_id, message_id: client.put(f"/chat/{chat_id}/message/{message_id}", json={"content": "Edited"}),
+    lambda client, chat_id, message_id: client.delete(f"/chat/{chat_id}/message/{message_id}"),
+    lambda client, chat_id, message_id: client.post(
+        f"/chat/{chat_id}/message/{message_id}/tool_call", json={"name": "search", "arguments": "{}"}
+    ),
+    lambda client, chat_id, message_id: client.post(
+        f"/chat/{chat_id}/tools", json={"name": "search", "description": "Search", "parameters": {}}
+    ),
+    lambda client, chat_id, message_id: client.patch(
+        f"/chat/{chat_id}/batch", json={"operations": [{"op": "update_chat", "language": "de"}]}
+    ),
+])
+def test_every_mutation_changes_the_etags(client_and_engine, mutate):
+    client, _ = client_and_engine
+    chat_id = create_chat(client)
+    message_id = client.get(f"/chat/{chat_id}").json()["messages"][0]["id"]
+    chat_etag = client.get(f"/chat/{chat_id}").headers["ETag"]
+    list_etag = client.get("/chats").headers["ETag"]
+
+    assert mutate(client, chat_id, message_id).status_code == 200
+
+    response = client.get(f"/chat/{chat_id}", headers={"If-None-Match": chat_etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != chat_etag
+    response = client.get("/chats", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != list_etag
+
+
+def test_other_chats_keep_their_etag(client_and_engine):
+    client, _ = client_and_engine
+    chat_id = create_chat(client)
+    other_id = create_chat(client)
+    etag = client.get(f"/chat/{chat_id}").headers["ETag"]
+
+    client.put(f"/chat/{other_id}", json={"name": "Renamed"})
+
+    assert client.get(f"/chat/{chat_id}", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_chat_list_etag(client_and_engine):
+    client, _ = client_and_engine
+    chat_id = create_chat(client)
+    etag = client.get("/chats").headers["ETag"]
+
+    assert client.get("/chats", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/chats", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+
+    client.delete(f"/chats/{chat_id}")
+    response = client.get("/chats", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_chat_list_etag_changes_with_the_tokenizer(client_and_engine):
+    client, _ = client_and_engine
+    create_chat(client)
+    etag = client.get("/chats").headers["ETag"]
+    previous = tokenizer_service._token_counter
+    tokenizer_service._token_counter = TokenCounter("chars", lambda texts: [len(text) for text in texts])
+    try:
+        assert client.get("/chats", headers={"If-None-Match": etag}).status_code == 200
+    finally:
+        tokenizer_service._token_counter = previous
+
+
+def test_reused_chat_id_gets_a_new_etag(client_and_engine):
+    client, _ = client_and_engine
+    chat_id = create_chat(client)
+    etag = client.get(f"/chat/{chat_id}").headers["ETag"]
+
+    client.delete(f"/chats/{chat_id}")
+    assert create_chat(client) == chat_id
+
+    assert client.get(f"/chat/{chat_id}", headers={"If-None-Match": etag}).status_code == 200
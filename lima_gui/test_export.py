@@ -0,0 +1,198 @@
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase
+from lima_gui.models.db import get_chat_db
+from lima_gui.testing import count_queries
+
+
+@pytest.fixture()
+def client_and_engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def make_chat(i):
+    return {
+        "name": f"Chat {i}",
+        "lang": "en",
+        "tags": ["export", f"group-{i % 3}"],
+        "messages": [
+            {"role": "user", "content": f"question {i}"},
+            {"role": "assistant", "content": "", "function_call": {"name": "search", "arguments": {"q": i}}},
+            {"role": "tool", "content": "result"},
+            {"role": "assistant", "content": f"answer {i}"},
+        ],
+        "tools": [
+            {
+                "type": "function",
+                "function": {"name": "search", "description": "Lookup", "parameters": {"type": "object"}},
+            }
+        ],
+    }
+
+
+def import_chats(client, chats):
+    content = "".join(json.dumps(chat) + "\n" for chat in chats)
+    response = client.post("/import", files={"file": ("chats.jsonl", content.encode("utf-8"), "application/jsonl")})
+    assert response.json()["chats_added"] == len(chats)
+
+
+def test_export_streams_all_chats_in_round_trip_format(client_and_engine):
+    client, _ = client_and_engine
+    chats = [make_chat(i) for i in range(25)]
+    import_chats(client, chats)
+
+    response = client.get("/export", params={"filename": "out.jsonl", "chunk_size": 4})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/jsonl")
+    assert 'filename="out.jsonl"' in response.headers["content-disposition"]
+
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == chats
+
+
+def test_export_query_count_is_constant_per_chunk(client_and_engine):
+    client, engine = client_and_engine
+    import_chats(client, [make_chat(i) for i in range(20)])
+
+    with count_queries(engine) as queries:
+        response = client.get("/export", params={"chunk_size": 10})
+
+    assert len(response.text.splitlines()) == 20
+    # One chats query plus, per chunk of 10, one query per eager-loaded
+    # collection (messages, tool calls, tags, tools).
+    assert len(queries.selects) == 1 + 2 * 4
+
+
+def test_save_chats_streams_messages_only(client_and_engine):
+    client, _ = client_and_engine
+    import_chats(client, [make_chat(i) for i in range(3)])
+
+    response = client.get("/chats/save")
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 3
+    assert lines[0] == {
+        "messages": [
+            {"role": "user", "content": "question 0"},
+            {"role": "assistant", "content": ""},
+            {"role": "tool", "content": "result"},
+            {"role": "assistant", "content": "answer 0"},
+        ]
+    }
+
+
+def test_export_keeps_multiple_tool_calls(client_and_engine):
+    client, _ = client_and_engine
+    chat = make_chat(0)
+    chat["messages"][1] = {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [
+            {"id": "call_1", "type": "function", "function": {"name": "search", "arguments": "{\"q\": 1}"}},
+            {"id": "call_2", "type": "function", "function": {"name": "search", "arguments": "{\"q\": 2}"}},
+        ],
+    }
+    import_chats(client, [chat])
+
+    exported = json.loads(client.get("/export").text)
+    assert exported["messages"][1]["tool_calls"] == chat["messages"][1]["tool_calls"]
+
+
+def test_export_filters_chats(client_and_engine):
+    client, _ = client_and_engine
+    import_chats(client, [make_chat(i) for i in range(9)])
+
+    response = client.get("/export", params={"tag": "group-1", "search": "question"})
+
+    assert [json.loads(line)["name"] for line in response.text.splitlines()] == ["Chat 1", "Chat 4", "Chat 7"]
+    assert client.get("/export", params={"search": "*"}).status_code == 400
+
+
+def test_parquet_export_has_nested_and_flat_columns(client_and_engine):
+    pq = pytest.importorskip("pyarrow.parquet")
+    client, _ = client_and_engine
+    import_chats(client, [make_chat(i) for i in range(25)])
+
+    response = client.get("/export", params={"format": "parquet", "chunk_size": 10})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    assert 'filename="lima-chats.parquet"' in response.headers["content-disposition"]
+    parquet_file = pq.ParquetFile(io.BytesIO(response.content))
+    # One row group per chunk of chats read from the database
+    assert [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)] == [10, 10, 5]
+
+    rows = parquet_file.read().to_pylist()
+    assert [row["name"] for row in rows] == [f"Chat {i}" for i in range(25)]
+    row = rows[3]
+    assert (row["language"], row["tags"], row["message_count"]) == ("en", ["export", "group-0"], 4)
+    assert row["token_count"] == sum(message["token_count"] for message in row["messages"]) > 0
+    assert [message["role"] for message in row["messages"]] == ["user", "assistant", "tool", "assistant"]
+    assert row["messages"][1]["tool_calls"][0]["name"] == "search"
+    assert json.loads(row["messages"][1]["tool_calls"][0]["arguments"]) == {"q": 3}
+    assert json.loads(row["tools"][0]["parameters"]) == {"type": "object"}
+
+
+def test_parquet_supports_column_pruning_and_predicate_pushdown(client_and_engine, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    client, _ = client_and_engine
+    import_chats(client, [make_chat(i) for i in range(6)])
+    path = tmp_path / "chats.parquet"
+    path.write_bytes(client.get("/export", params={"format": "parquet", "compression": "gzip"}).content)
+
+    table = pq.read_table(path, columns=["id", "token_count"], filters=[("id", ">", 3)])
+
+    assert table.column_names == ["id", "token_count"]
+    assert table.num_rows == 3
+
+
+def test_arrow_stream_export_with_filter(client_and_engine):
+    ipc = pytest.importorskip("pyarrow.ipc")
+    client, _ = client_and_engine
+    import_chats(client, [make_chat(i) for i in range(7)])
+
+    response = client.get("/export", params={"format": "arrow", "tag": "group-2", "chunk_size": 1})
+
+    reader = ipc.open_stream(response.content)
+    batches = list(reader)
+    assert [batch.num_rows for batch in batches] == [1, 1]
+    assert [row["name"] for batch in batches for row in batch.to_pylist()] == ["Chat 2", "Chat 5"]
+
+
+def test_parquet_export_of_an_empty_selection(client_and_engine):
+    pq = pytest.importorskip("pyarrow.parquet")
+    client, _ = client_and_engine
+
+    response = client.get("/export", params={"format": "parquet", "language": "fr"})
+
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 0
+    assert "messages" in table.column_names
@@ -0,0 +1,193 @@
+import json
+import threading
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, RoleEnum, Tool, ToolCall
+from lima_gui.models.db import get_chat_db
+from lima_gui.routers.settings import get_config_manager
+from lima_gui.testing import MockCompletion, MockOpenAIServer, serve_app
+
+
+class StaticConfigManager:
+    def __init__(self, openai_config):
+        self.openai_config = openai_config
+
+    def get_openai_config(self):
+        return self.openai_config
+
+
+@pytest.fixture()
+def mock_api():
+    with MockOpenAIServer() as server:
+        yield server
+
+
+@pytest.fixture()
+def openai_config(mock_api):
+    return {
+        "enabled": True,
+        "model": "mock-model",
+        "temperature": 0.3,
+        "api_type": "chat",
+        "max_completion_tokens": 50,
+        "api_base": mock_api.api_base,
+        "api_key": None,
+        "extra_body": {"top_k": 5},
+    }
+
+
+@pytest.fixture()
+def engine(openai_config):
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+    app.dependency_overrides[get_config_manager] = lambda: StaticConfigManager(openai_config)
+    yield engine
+    app.dependency_overrides.pop(get_chat_db, None)
+    app.dependency_overrides.pop(get_config_manager, None)
+
+
+@pytest.fixture()
+def client(engine):
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def create_chat(engine, with_tools=False):
+    with sessionmaker(bind=engine)() as session:
+        chat = Chat(name="Chat", language="en")
+        chat.messages = [
+            Message(role=RoleEnum.system, content="Be brief.", position=1024),
+            Message(role=RoleEnum.user, content="What is the weather?", position=2048),
+        ]
+        if with_tools:
+            chat.tools = [Tool(name="weather", description="Look up the weather", parameters={"type": "object"})]
+            call = Message(role=RoleEnum.assistant, content="", position=3072)
+            call.tool_calls = [ToolCall(name="weather", arguments='{"city": "Paris"}', tool_call_id=7)]
+            chat.messages += [call, Message(role=RoleEnum.tool, content="Sunny", position=4096)]
+        session.add(chat)
+        session.commit()
+        return chat.id
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_generate_streams_and_saves_the_reply(client, engine, mock_api):
+    chat_id = create_chat(engine)
+
+    response = client.post(f"/chat/{chat_id}/generate")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    deltas = [data["content"] for event, data in events if event == "delta"]
+    assert deltas == ["Hello ", "from ", "the ", "mock ", "model."]
+    event, data = events[-1]
+    assert event == "done"
+    assert data["finish_reason"] == "stop"
+    assert data["message"]["role"] == "assistant"
+    assert data["message"]["content"] == "Hello from the mock model."
+
+    chat = client.get(f"/chat/{chat_id}").json()
+    assert chat["messages"][-1] == data["message"]
+    assert chat["tokens"] > 0
+
+    request = mock_api.requests[0]
+    assert request["model"] == "mock-model"
+    assert request["stream"] is True
+    assert (request["temperature"], request["max_completion_tokens"], request["top_k"]) == (0.3, 50, 5)
+    assert request["messages"] == [
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": "What is the weather?"},
+    ]
+
+
+def test_request_carries_tools_and_tool_calls(client, engine, mock_api):
+    chat_id = create_chat(engine, with_tools=True)
+    mock_api.responder = lambda body: MockCompletion(content="", tool_calls=[{"name": "weather", "arguments": "{}"}])
+
+    events = parse_events(client.post(f"/chat/{chat_id}/generate").text)
+
+    request = mock_api.requests[0]
+    assert request["tools"][0]["function"]["name"] == "weather"
+    assistant, tool = request["messages"][2:]
+    assert assistant["tool_calls"][0]["id"] == "call_7"
+    assert tool == {"role": "tool", "content": "Sunny", "tool_call_id": "call_7"}
+
+    assert events[-1][1]["finish_reason"] == "tool_calls"
+    saved = client.get(f"/chat/{chat_id}").json()["messages"][-1]
+    assert [call["tool_name"] for call in saved["tool_calls"]] == ["weather"]
+
+
+def test_first_tokens_arrive_before_the_completion_ends(engine, mock_api):
+    chat_id = create_chat(engine)
+    gate = threading.Event()
+    mock_api.responder = lambda body: MockCompletion(content="First then the rest", gate=gate)
+
+    with serve_app(app) as base_url:
+        with httpx.stream("POST", f"{base_url}/chat/{chat_id}/generate", timeout=10) as response:
+            lines = response.iter_lines()
+            first_data = next(line for line in lines if line.startswith("data: "))
+            # The backend is still holding the rest of the completion back.
+            assert not gate.is_set()
+            assert json.loads(first_data[len("data: "):]) == {"content": "First "}
+            gate.set()
+            rest = "\n".join(lines)
+
+    assert "event: done" in rest
+
+
+def test_clients_are_shared_between_requests(client, engine):
+    chat_id = create_chat(engine)
+    client.post(f"/chat/{chat_id}/generate")
+    client.post(f"/chat/{chat_id}/generate")
+
+    assert len(app.state.openai_clients._clients) == 1
+    assert client.get(f"/chat/{chat_id}").json()["n_msgs"] == 4
+
+
+def test_upstream_errors_are_reported_and_nothing_is_saved(client, engine, mock_api):
+    chat_id = create_chat(engine)
+    mock_api.responder = lambda body: MockCompletion(status=500)
+
+    response = client.post(f"/chat/{chat_id}/generate")
+
+    assert response.status_code == 502
+    assert "500" in response.json()["detail"]
+    assert client.get(f"/chat/{chat_id}").json()["n_msgs"] == 2
+
+
+def test_disabled_generation(client, engine, openai_config):
+    chat_id = create_chat(engine)
+    openai_config["enabled"] = False
+    assert client.post(f"/chat/{chat_id}/generate").status_code == 400
+
+
+def test_generate_for_missing_chat(client):
+    assert client.post("/chat/999/generate").status_code == 404
@@ -0,0 +1,173 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, Tag, Tool, ToolCall, RoleEnum
+from lima_gui.models.db import get_chat_db
+from lima_gui.services.aggregates import rebuild_chat_aggregates
+
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
+
+
+@pytest.fixture()
+def client_and_session():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, TestingSessionLocal
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def upload(client, lines, endpoint="/chats/upload", **params):
+    content = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines) + "\n"
+    return client.post(
+        endpoint,
+        params=params,
+        files={"file": ("import.jsonl", content.encode("utf-8"), "application/jsonl")},
+    )
+
+
+def test_import_reports_line_errors_without_aborting(client_and_session):
+    client, session_factory = client_and_session
+    lines = [
+        {"name": "First", "messages": [{"role": "user", "content": "hi"}]},
+        "{not json",
+        {"name": "Bad role", "messages": [{"role": "wizard", "content": "x"}]},
+        "",
+        {"name": "Dup tools", "tools": [{"name": "a"}, {"name": "a"}]},
+        ["not", "an", "object"],
+        {"name": "Last", "messages": []},
+    ]
+
+    response = upload(client, lines, batch_size=2)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["chats_added"] == 2
+    assert result["lines_read"] == 7
+    assert result["error_count"] == 4
+    assert [error["line"] for error in result["errors"]] == [2, 3, 5, 6]
+
+    with session_factory() as session:
+        assert sorted(chat.name for chat in session.query(Chat)) == ["First", "Last"]
+
+
+def test_import_batches_tags_tools_and_tool_calls(client_and_session):
+    client, session_factory = client_and_session
+    with session_factory() as session:
+        session.add(Tag(name="existing"))
+        session.commit()
+
+    lines = [
+        {
+            "name": f"Chat {i}",
+            "language": "de",
+            "tags": ["existing", f"tag-{i % 2}", "existing"],
+            "tools": [{"name": "search", "description": "Lookup", "parameters": {"type": "object"}}],
+            "messages": [
+                {"role": "user", "content": "find it"},
+                {
+                    "role": "assistant",
+                    "content": "",
+                    "tool_calls": [{"tool_call_id": 7, "name": "search", "arguments": {"q": "it"}}],
+                },
+            ],
+        }
+        for i in range(5)
+    ]
+
+    result = upload(client, lines, endpoint="/import", batch_size=2).json()
+    assert result["chats_added"] == 5
+    assert result["error_count"] == 0
+
+    with session_factory() as session:
+        assert sorted(tag.name for tag in session.query(Tag)) == ["existing", "tag-0", "tag-1"]
+        chats = session.query(Chat).order_by(Chat.id).all()
+        assert [chat.name for chat in chats] == [f"Chat {i}" for i in range(5)]
+        assert [tag.name for tag in chats[1].tags] == ["existing", "tag-1"]
+        assert chats[0].language == "de"
+        assert chats[0].message_count == 2
+        assert chats[0].token_count == 2
+        assert chats[0].preview == "find it"
+        assert session.query(Tool).count() == 5
+
+        message = chats[4].messages[1]
+        assert message.role == RoleEnum.assistant
+        assert [(tc.name, json.loads(tc.arguments)) for tc in message.tool_calls] == [("search", {"q": "it"})]
+
+
+def test_import_does_the_insert_triggers_work_per_batch(client_and_session):
+    client, session_factory = client_and_session
+    existing = client.post("/chats").json()["id"]
+    list_etag = client.get("/chats").headers["ETag"]
+    with session_factory() as session:
+        version_before = session.scalar(text("SELECT version FROM dataset_version"))
+
+    lines = [
+        {"name": f"Chat {i}", "tags": ["bulk"], "messages": [
+            {"role": "system", "content": "be brief"},
+            {"role": "user", "content": f"question {i} about zebras"},
+            {"role": "assistant", "content": "answer " * i},
+        ]}
+        for i in range(7)
+    ]
+    assert upload(client, lines, batch_size=3).json()["chats_added"] == 7
+
+    with session_factory() as session:
+        assert session.scalar(text("SELECT active FROM bulk_import_state")) == 0
+        imported = session.query(Chat).filter(Chat.id != existing).order_by(Chat.id).all()
+        assert all(chat.version > version_before for chat in imported)
+        maintained = [(chat.message_count, chat.token_count, chat.preview) for chat in imported]
+        rebuild_chat_aggregates(session.connection())
+        session.expire_all()
+        assert maintained == [(chat.message_count, chat.token_count, chat.preview) for chat in imported]
+        assert maintained[2] == (3, 2 + 4 + 2, "question 2 about zebras")
+
+    assert client.get("/chats", headers={"If-None-Match": list_etag}).status_code == 200
+    assert len(client.get("/search", params={"q": "zebras"}).json()["hits"]) == 7
+    # The per-row triggers work again once the import is done.
+    message_id = client.post(f"/chat/{existing}/message").json()["id"]
+    client.put(f"/chat/{existing}/message/{message_id}", json={"content": "zebras too"})
+    assert len(client.get("/search", params={"q": "zebras"}).json()["hits"]) == 8
+    assert client.get(f"/chat/{existing}").json()["n_msgs"] == 1
+
+
+@pytest.mark.parametrize("example", ["function_calling.jsonl", "chatgpt_chats.jsonl"])
+def test_import_example_datasets(client_and_session, example):
+    client, session_factory = client_and_session
+    path = EXAMPLES_DIR / example
+    n_lines = sum(1 for line in path.read_text(encoding="utf-8").splitlines() if line.strip())
+
+    with open(path, "rb") as f:
+        response = client.post("/import", files={"file": (example, f, "application/jsonl")})
+    result = response.json()
+    assert result["error_count"] == 0, result["errors"]
+    assert result["chats_added"] == n_lines
+
+    with session_factory() as session:
+        assert session.query(Chat).count() == n_lines
+        if example == "function_calling.jsonl":
+            assert session.query(ToolCall).count() > 0
+            assert session.query(Message).filter(Message.role == RoleEnum.tool).count() > 0
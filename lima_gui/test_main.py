@@ -18,25 +18,27 @@ def test_db():
 
     fd, path = tempfile.mkstemp(suffix=".db")
     os.close(fd)
+    previous_url = os.environ.get("CHAT_DB_URL")
     os.environ["CHAT_DB_URL"] = f"sqlite:///{path}"
 
     if db_module._chat_engine is not None:
         db_module._chat_engine.dispose()
     db_module._chat_engine = None
-    db_module._chat_session = None
+    db_module._chat_sessionmaker = None
 
     init_chat()
 
     try:
         yield
     finally:
-        if db_module._chat_session is not None:
-            db_module._chat_session.remove()
-            db_module._chat_session = None
+        db_module._chat_sessionmaker = None
         if db_module._chat_engine is not None:
             db_module._chat_engine.dispose()
             db_module._chat_engine = None
-        os.environ.pop("CHAT_DB_URL", None)
+        if previous_url is None:
+            os.environ.pop("CHAT_DB_URL", None)
+        else:
+            os.environ["CHAT_DB_URL"] = previous_url
         if os.path.exists(path):
             os.remove(path)
 
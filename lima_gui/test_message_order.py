@@ -0,0 +1,127 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, POSITION_GAP
+from lima_gui.models.db import get_chat_db
+from lima_gui.testing import count_queries
+
+
+@pytest.fixture()
+def client_and_engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def create_chat(client, contents):
+    chat_id = client.post("/chats").json()["id"]
+    ids = []
+    for content in contents:
+        message_id = client.post(f"/chat/{chat_id}/message").json()["id"]
+        client.put(f"/chat/{chat_id}/message/{message_id}", json={"content": content})
+        ids.append(message_id)
+    return chat_id, ids
+
+
+def contents(client, chat_id):
+    return [message["content"] for message in client.get(f"/chat/{chat_id}").json()["messages"]]
+
+
+def message_writes(queries):
+    return [s for s in queries.statements if s.lstrip().upper().startswith(("UPDATE MESSAGES", "INSERT INTO MESSAGES"))]
+
+
+def test_appended_messages_are_gapped(client_and_engine):
+    client, engine = client_and_engine
+    chat_id, _ = create_chat(client, ["a", "b", "c"])
+
+    with sessionmaker(bind=engine)() as session:
+        positions = [m.position for m in session.get(Chat, chat_id).messages]
+    assert positions == [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP]
+
+
+def test_insert_before_writes_one_row(client_and_engine):
+    client, engine = client_and_engine
+    chat_id, ids = create_chat(client, ["system", "question", "answer"])
+
+    with count_queries(engine) as queries:
+        response = client.post(f"/chat/{chat_id}/message", params={"before_id": ids[2]})
+    assert response.status_code == 200
+    assert len(message_writes(queries)) == 1
+    # Roles alternate system, assistant, user: the new message follows an assistant one
+    assert response.json()["role"] == "user"
+
+    client.put(f"/chat/{chat_id}/message/{response.json()['id']}", json={"content": "inserted"})
+    first = client.post(f"/chat/{chat_id}/message", params={"before_id": ids[0]}).json()
+    client.put(f"/chat/{chat_id}/message/{first['id']}", json={"content": "first"})
+
+    assert first["role"] == "system"
+    assert contents(client, chat_id) == ["first", "system", "question", "inserted", "answer"]
+
+
+def test_move_message(client_and_engine):
+    client, engine = client_and_engine
+    chat_id, ids = create_chat(client, ["a", "b", "c", "d"])
+
+    with count_queries(engine) as queries:
+        response = client.put(f"/chat/{chat_id}/message/{ids[3]}/move", json={"before_id": ids[1]})
+    assert response.status_code == 200
+    assert len(message_writes(queries)) == 1
+    assert contents(client, chat_id) == ["a", "d", "b", "c"]
+
+    client.put(f"/chat/{chat_id}/message/{ids[0]}/move", json={"before_id": None})
+    assert contents(client, chat_id) == ["d", "b", "c", "a"]
+
+    client.put(f"/chat/{chat_id}/message/{ids[2]}/move", json={"before_id": ids[3]})
+    assert contents(client, chat_id) == ["c", "d", "b", "a"]
+
+
+def test_repeated_inserts_rebalance_the_chat(client_and_engine):
+    client, engine = client_and_engine
+    chat_id, ids = create_chat(client, ["start", "end"])
+
+    # Each insert halves the gap before "end" until it is used up.
+    before_id = ids[1]
+    for i in range(15):
+        response = client.post(f"/chat/{chat_id}/message", params={"before_id": before_id})
+        assert response.status_code == 200
+        client.put(f"/chat/{chat_id}/message/{response.json()['id']}", json={"content": str(i)})
+        before_id = response.json()["id"]
+
+    assert contents(client, chat_id) == ["start", *[str(i) for i in reversed(range(15))], "end"]
+    with sessionmaker(bind=engine)() as session:
+        positions = [m.position for m in session.get(Chat, chat_id).messages]
+    assert len(set(positions)) == len(positions)
+
+
+def test_invalid_targets(client_and_engine):
+    client, _ = client_and_engine
+    chat_id, ids = create_chat(client, ["a"])
+    other_chat_id, other_ids = create_chat(client, ["b"])
+
+    assert client.post(f"/chat/{chat_id}/message", params={"before_id": other_ids[0]}).status_code == 422
+    assert client.put(f"/chat/{chat_id}/message/{ids[0]}/move", json={"before_id": other_ids[0]}).status_code == 422
+    assert client.put(f"/chat/{chat_id}/message/{other_ids[0]}/move", json={"before_id": None}).status_code == 404
+    assert client.put(f"/chat/{chat_id}/message/{ids[0]}/move", json={"before_id": "x"}).status_code == 422
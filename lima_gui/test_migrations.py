@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from lima_gui.models.migrations import MIGRATIONS, Migration, get_schema_version, migrate
+
+
+LATEST = MIGRATIONS[-1].version
+
+# Schema written by versions before aggregates and migrations existed.
+LEGACY_SCHEMA = [
+    "CREATE TABLE tags (name VARCHAR NOT NULL PRIMARY KEY)",
+    "CREATE TABLE chats (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, language VARCHAR NOT NULL)",
+    "CREATE TABLE chat_tag (chat_id INTEGER REFERENCES chats (id), tag_name VARCHAR REFERENCES tags (name))",
+    "CREATE TABLE messages (id INTEGER PRIMARY KEY, chat_id INTEGER REFERENCES chats (id), "
+    "role VARCHAR(9) NOT NULL, content VARCHAR, position INTEGER NOT NULL)",
+    "CREATE TABLE tool_calls (id INTEGER PRIMARY KEY, tool_call_id INTEGER, name VARCHAR NOT NULL, "
+    "arguments TEXT, message_id INTEGER REFERENCES messages (id))",
+    "CREATE TABLE tools (chat_id INTEGER REFERENCES chats (id), name VARCHAR NOT NULL, description VARCHAR, "
+    "parameters JSON, CONSTRAINT pk_tool_chat_name PRIMARY KEY (chat_id, name))",
+    "INSERT INTO tags (name) VALUES ('old')",
+    "INSERT INTO chats (id, name, language) VALUES (1, 'Old', 'en')",
+    "INSERT INTO chat_tag (chat_id, tag_name) VALUES (1, 'old')",
+    "INSERT INTO messages (id, chat_id, role, content, position) VALUES (1, 1, 'user', 'old message', 1)",
+    "INSERT INTO messages (id, chat_id, role, content, position) VALUES (2, 1, 'assistant', 'old reply here', 2)",
+    "INSERT INTO tool_calls (name, arguments, message_id) VALUES ('search', '{}', 2)",
+    # Left behind by a chat deleted without foreign keys enforced
+    "INSERT INTO messages (id, chat_id, role, content, position) VALUES (3, 7, 'user', 'orphan', 1)",
+    "INSERT INTO tool_calls (name, arguments, message_id) VALUES ('orphan', '{}', 3)",
+]
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_new_database_is_created_at_latest_version(engine):
+    assert get_schema_version(engine) is None
+
+    assert migrate(engine) == []
+
+    assert get_schema_version(engine) == LATEST
+    assert "ix_tool_calls_message_id" in index_names(engine, "tool_calls")
+    assert {"ix_chat_tag_chat_id_tag_name", "ix_chat_tag_tag_name_chat_id"} <= index_names(engine, "chat_tag")
+
+
+def test_legacy_database_is_upgraded(engine):
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(text(statement))
+    assert get_schema_version(engine) == 0
+
+    assert migrate(engine) == [migration.name for migration in MIGRATIONS]
+
+    assert get_schema_version(engine) == LATEST
+    with engine.connect() as connection:
+        row = connection.execute(text("SELECT message_count, token_count, preview FROM chats")).one()
+    assert tuple(row) == (2, 5, "old message")
+    with engine.connect() as connection:
+        stats = connection.execute(text(
+            "SELECT dimension, chats, messages, tokens FROM chat_stats WHERE chats != 0 ORDER BY dimension"
+        )).all()
+    assert [tuple(row) for row in stats] == [("language", 1, 2, 5), ("tag", 1, 2, 5)]
+    assert "ix_messages_chat_id_position" in index_names(engine, "messages")
+    assert "ix_tool_calls_message_id" in index_names(engine, "tool_calls")
+    assert {"ix_chat_tag_chat_id_tag_name", "ix_chat_tag_tag_name_chat_id"} <= index_names(engine, "chat_tag")
+
+    # Nothing left to do the second time
+    assert migrate(engine) == []
+
+
+def test_legacy_database_gets_delete_cascades(engine):
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(text(statement))
+    migrate(engine)
+
+    for table in ("messages", "tool_calls", "tools", "chat_tag"):
+        assert {fk["options"].get("ondelete") for fk in inspect(engine).get_foreign_keys(table)} == {"CASCADE"}
+    with engine.begin() as connection:
+        assert connection.execute(text("SELECT count(*) FROM messages")).scalar() == 2
+        assert connection.execute(text("SELECT count(*) FROM tool_calls")).scalar() == 1
+        # Triggers were recreated after the rebuild
+        connection.execute(text("INSERT INTO messages (chat_id, role, content, position) VALUES (1, 'user', 'new', 3)"))
+        assert connection.execute(text("SELECT message_count FROM chats")).scalar() == 3
+    with engine.begin() as connection:
+        connection.execute(text("PRAGMA foreign_keys = ON"))
+        connection.execute(text("DELETE FROM chats WHERE id = 1"))
+        assert connection.execute(text("SELECT count(*) FROM tool_calls")).scalar() == 0
+
+
+def test_failed_migration_resumes_from_the_failed_step(engine):
+    migrate(engine)
+    calls = []
+
+    def fail(engine):
+        calls.append("fail")
+        raise RuntimeError("interrupted")
+
+    def succeed(engine):
+        calls.append("succeed")
+
+    pending = [*MIGRATIONS, Migration(version=LATEST + 1, name="ok", upgrade=succeed)]
+    with pytest.raises(RuntimeError):
+        migrate(engine, [*pending, Migration(version=LATEST + 2, name="broken", upgrade=fail)])
+    assert get_schema_version(engine) == LATEST + 1
+
+    migrate(engine, [*pending, Migration(version=LATEST + 2, name="fixed", upgrade=succeed)])
+    assert calls == ["succeed", "fail", "succeed"]
+    assert get_schema_version(engine) == LATEST + 2
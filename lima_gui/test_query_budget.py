@@ -0,0 +1,122 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, RoleEnum, Tag, Tool, ToolCall
+from lima_gui.models.db import get_chat_db
+from lima_gui.testing import assert_max_queries, count_queries
+
+
+@pytest.fixture()
+def client_and_engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def create_chat(engine, n_messages):
+    with sessionmaker(bind=engine)() as session:
+        chat = Chat(name=f"Chat {n_messages}", language="en", tags=[Tag(name=f"tag-{n_messages}")])
+        chat.tools = [Tool(name="search", description="Lookup", parameters={"type": "object"})]
+        for position in range(1, n_messages + 1):
+            role = RoleEnum.user if position % 2 else RoleEnum.assistant
+            message = Message(role=role, content=f"message {position}", position=position)
+            message.tool_calls = [ToolCall(name="search", arguments="{}")]
+            chat.messages.append(message)
+        session.add(chat)
+        session.commit()
+        return chat.id
+
+
+def test_get_chat_query_count_does_not_grow_with_messages(client_and_engine):
+    client, engine = client_and_engine
+    short_id = create_chat(engine, 1)
+    long_id = create_chat(engine, 40)
+
+    with count_queries(engine) as short_queries:
+        assert client.get(f"/chat/{short_id}").status_code == 200
+    with count_queries(engine) as long_queries:
+        response = client.get(f"/chat/{long_id}")
+
+    assert response.status_code == 200
+    assert len(response.json()["messages"]) == 40
+    assert [m["content"] for m in response.json()["messages"]][:2] == ["message 1", "message 2"]
+    assert long_queries.count == short_queries.count
+
+
+def test_get_chat_budget(client_and_engine):
+    client, engine = client_and_engine
+    chat_id = create_chat(engine, 25)
+
+    # version, chat, messages, tool calls, tags, tools
+    with assert_max_queries(engine, 6, selects_only=True):
+        client.get(f"/chat/{chat_id}")
+    # Served from the chat details cache: version only
+    with assert_max_queries(engine, 1):
+        client.get(f"/chat/{chat_id}")
+
+
+def test_update_chat_budget(client_and_engine):
+    client, engine = client_and_engine
+    chat_id = create_chat(engine, 25)
+
+    # chat, update, existing tags, tag insert, tag collection, link changes,
+    # then the five get_chat queries
+    with assert_max_queries(engine, 12):
+        response = client.put(f"/chat/{chat_id}", json={"name": "Renamed", "tags": ["a", "b"]})
+
+    assert response.status_code == 200
+    assert response.json()["tags"] == ["a", "b"]
+
+
+def test_add_message_budget(client_and_engine):
+    client, engine = client_and_engine
+    chat_id = create_chat(engine, 25)
+
+    # chat, last message, token cache
+    with assert_max_queries(engine, 3, selects_only=True):
+        response = client.post(f"/chat/{chat_id}/message")
+
+    assert response.status_code == 200
+    # The last (25th) message is the user's, so the assistant replies next
+    assert response.json()["role"] == "assistant"
+
+
+def test_add_message_to_missing_chat(client_and_engine):
+    client, _ = client_and_engine
+    assert client.post("/chat/999/message").status_code == 404
+
+
+def test_copy_chat_budget(client_and_engine):
+    client, engine = client_and_engine
+    chat_id = create_chat(engine, 25)
+
+    with assert_max_queries(engine, 8, selects_only=True):
+        response = client.post(f"/chats/{chat_id}/copy")
+
+    copied = client.get(f"/chat/{response.json()['id']}").json()
+    original = client.get(f"/chat/{chat_id}").json()
+    assert len(copied["messages"]) == 25
+    assert [m["content"] for m in copied["messages"]] == [m["content"] for m in original["messages"]]
+    assert copied["tags"] == original["tags"]
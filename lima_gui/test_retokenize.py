@@ -0,0 +1,184 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, RoleEnum, TokenCacheEntry
+from lima_gui.models.db import get_chat_db
+from lima_gui.services import tokenizer as tokenizer_service
+from lima_gui.services.jobs import Job
+from lima_gui.services.retokenize import has_stale_token_counts, retokenize_if_stale, retokenize_messages
+from lima_gui.services.tokenizer import TokenCounter
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    ChatBase.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def client(engine):
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+@pytest.fixture()
+def restore_tokenizer():
+    previous = tokenizer_service._token_counter
+    yield
+    tokenizer_service._token_counter = previous
+
+
+class CharCounter(TokenCounter):
+    """Counts characters, so results differ from the whitespace tokenizer."""
+
+    def __init__(self):
+        self.encoded = 0
+        super().__init__("chars", self._encode)
+
+    def _encode(self, texts):
+        self.encoded += len(texts)
+        return [len(text) for text in texts]
+
+
+def seed(engine, n_chats=5, n_messages=9):
+    with sessionmaker(bind=engine)() as session:
+        for chat_index in range(n_chats):
+            chat = Chat(name=f"Chat {chat_index}", language="en")
+            for position in range(1, n_messages + 1):
+                # Every chat repeats the same contents, so the cache is exercised.
+                content = "word " * position
+                chat.messages.append(Message(role=RoleEnum.user, content=content.strip(), position=position))
+            session.add(chat)
+        session.commit()
+
+
+def test_retokenize_recounts_in_chunks(engine):
+    seed(engine)
+    counter = CharCounter()
+    job = Job(0, "retokenize")
+
+    job.run(lambda job: retokenize_messages(engine, counter, chunk_size=4, workers=3, job=job))
+
+    assert job.status == Job.COMPLETED
+    assert job.total == job.processed == job.result == 45
+    assert job.throughput() > 0
+    # Nine distinct contents: once cached, repeats are not tokenized again
+    # (only chunks read ahead before the cache was filled are).
+    assert counter.encoded < 45
+
+    with sessionmaker(bind=engine)() as session:
+        messages = session.query(Message).all()
+        assert all(msg.tokenizer == "chars" for msg in messages)
+        assert all(msg.token_count == len(msg.content) for msg in messages)
+        expected_total = sum(len(("word " * p).strip()) for p in range(1, 10))
+        assert {chat.token_count for chat in session.query(Chat)} == {expected_total}
+        assert session.query(TokenCacheEntry).filter(TokenCacheEntry.tokenizer == "chars").count() == 9
+
+
+def test_retokenize_skips_current_messages(engine):
+    seed(engine, n_chats=2, n_messages=3)
+    counter = CharCounter()
+
+    assert retokenize_messages(engine, counter, chunk_size=2) == 6
+    assert retokenize_messages(engine, counter, chunk_size=2) == 0
+    assert retokenize_messages(engine, counter, only_stale=False) == 6
+
+
+def test_retokenize_keeps_messages_edited_mid_job(engine):
+    seed(engine, n_chats=1, n_messages=3)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as session:
+        first_id = session.query(Message).order_by(Message.id).first().id
+
+    class EditingCounter(CharCounter):
+        def _encode(self, texts):
+            # A user edits a message after the job read it, before its counts are written.
+            with session_factory() as session:
+                message = session.get(Message, first_id)
+                message.content = "edited content"
+                message.token_count = 2
+                message.tokenizer = "chars"
+                session.commit()
+            return super()._encode(texts)
+
+    retokenize_messages(engine, EditingCounter(), chunk_size=10, workers=1)
+
+    with session_factory() as session:
+        edited = session.get(Message, first_id)
+        assert (edited.content, edited.token_count) == ("edited content", 2)
+        others = session.query(Message).filter(Message.id != first_id).all()
+        assert all(msg.token_count == len(msg.content) for msg in others)
+        assert session.query(Chat).one().token_count == 2 + sum(msg.token_count for msg in others)
+
+
+def test_stale_counts_are_recounted_on_startup(engine, restore_tokenizer):
+    seed(engine, n_chats=2, n_messages=3)
+    tokenizer_service._token_counter = CharCounter()
+    assert has_stale_token_counts(engine)
+
+    job = retokenize_if_stale(engine)
+
+    deadline = time.monotonic() + 10
+    while job.status in (Job.PENDING, Job.RUNNING) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.status == Job.COMPLETED
+    assert job.result == {"recounted": 6}
+    assert not has_stale_token_counts(engine)
+    assert retokenize_if_stale(engine) is None
+
+
+def test_retokenize_can_be_cancelled(engine):
+    seed(engine)
+    job = Job(0, "retokenize")
+    job.cancel()
+
+    job.run(lambda job: retokenize_messages(engine, CharCounter(), chunk_size=4, workers=1, job=job))
+
+    assert job.status == Job.CANCELLED
+    assert job.processed < 45
+
+
+def test_retokenize_job_endpoint(client, engine, restore_tokenizer):
+    seed(engine, n_chats=3, n_messages=4)
+    tokenizer_service._token_counter = CharCounter()
+
+    response = client.post("/jobs/retokenize", params={"chunk_size": 5, "workers": 2})
+    assert response.status_code == 200
+    job_id = response.json()["id"]
+
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("pending", "running") or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+
+    assert job["status"] == "completed"
+    assert job["kind"] == "retokenize"
+    assert job["params"]["tokenizer"] == "chars"
+    assert job["processed"] == job["total"] == 12
+    assert job["progress"] == 1.0
+    assert job["throughput"] > 0
+    assert any(item["id"] == job_id for item in client.get("/jobs").json())
+
+    assert client.get("/jobs/999999").status_code == 404
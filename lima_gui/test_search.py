@@ -0,0 +1,134 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase
+from lima_gui.models.db import get_chat_db
+
+
+@pytest.fixture()
+def client():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def import_chats(client, chats):
+    content = "".join(json.dumps(chat) + "\n" for chat in chats)
+    response = client.post("/import", files={"file": ("chats.jsonl", content.encode("utf-8"), "application/jsonl")})
+    assert response.json()["chats_added"] == len(chats)
+
+
+def search(client, q, **params):
+    response = client.get("/search", params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_search_ranks_hits_and_highlights_snippets(client):
+    import_chats(client, [
+        {"name": "Cooking", "messages": [
+            {"role": "user", "content": "How do I bake sourdough bread?"},
+            {"role": "assistant", "content": "Sourdough bread, sourdough bread!"},
+        ]},
+        {"name": "Travel", "messages": [{"role": "user", "content": "Where can I buy bread in Paris?"}]},
+        {"name": "Other", "messages": [{"role": "user", "content": "Nothing relevant here"}]},
+    ])
+
+    hits = search(client, "sourdough bread")["hits"]
+
+    assert [hit["chat_name"] for hit in hits] == ["Cooking", "Cooking"]
+    assert hits[0]["message_id"] == 2  # both terms, twice
+    assert "<mark>Sourdough</mark> <mark>bread</mark>" in hits[0]["snippet"]
+    assert hits[1]["role"] == "user"
+    assert {hit["chat_name"] for hit in search(client, "bread")["hits"]} == {"Cooking", "Travel"}
+
+
+def test_search_snippets_escape_message_content(client):
+    import_chats(client, [{"name": "Chat", "messages": [
+        {"role": "user", "content": "Use <mark>tags</mark> & <script>alert(1)</script> in html"},
+    ]}])
+
+    hits = search(client, "html")["hits"]
+
+    assert hits[0]["snippet"] == (
+        "Use &lt;mark&gt;tags&lt;/mark&gt; &amp; &lt;script&gt;alert(1)&lt;/script&gt; in <mark>html</mark>"
+    )
+
+
+def test_search_follows_edits_and_deletes(client):
+    import_chats(client, [{"name": "Chat", "messages": [{"role": "user", "content": "original wording"}]}])
+    chat = client.get("/chat/1").json()
+    message_id = chat["messages"][0]["id"]
+
+    client.put(f"/chat/1/message/{message_id}", json={"content": "replacement text"})
+    assert search(client, "original")["hits"] == []
+    assert search(client, "replacement")["hits"][0]["message_id"] == message_id
+
+    client.post("/chat/1/message")
+    client.delete(f"/chat/1/message/{message_id}")
+    assert search(client, "replacement")["hits"] == []
+
+
+def test_search_keyset_pagination(client):
+    import_chats(client, [
+        {"name": f"Chat {i}", "messages": [{"role": "user", "content": "needle " * (i % 4 + 1) + "hay " * i}]}
+        for i in range(23)
+    ])
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 5}
+        if cursor:
+            params["cursor"] = cursor
+        page = search(client, "needle", **params)
+        pages.append(page["hits"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    hits = [hit for page in pages for hit in page]
+    assert len(hits) == 23
+    assert len({hit["message_id"] for hit in hits}) == 23
+    assert [hit["rank"] for hit in hits] == sorted(hit["rank"] for hit in hits)
+
+
+def test_search_filters_and_literal_terms(client):
+    import_chats(client, [
+        {"name": "A", "messages": [
+            {"role": "user", "content": "call foo-bar(1) please"},
+            {"role": "assistant", "content": "foo-bar called"},
+        ]},
+        {"name": "B", "messages": [{"role": "user", "content": "foobarbaz"}]},
+    ])
+
+    assert len(search(client, "foo-bar(1)")["hits"]) == 1
+    assert [hit["role"] for hit in search(client, "foo-bar", role="assistant")["hits"]] == ["assistant"]
+    assert [hit["chat_name"] for hit in search(client, "foobar*")["hits"]] == ["B"]
+    assert search(client, "foo", chat_id=2)["hits"] == []
+
+    assert client.get("/search", params={"q": "***"}).status_code == 400
+    assert client.get("/search", params={"q": "foo", "cursor": "nonsense"}).status_code == 400
@@ -0,0 +1,90 @@
+import random
+
+import anyio
+import httpx
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from lima_gui.main import app
+from lima_gui.models import db as db_module
+from lima_gui.models.chat import Chat, ChatBase, Message
+from lima_gui.models.db import PRODUCTION_PROFILE, create_chat_engine, get_engine_profile
+
+
+N_CHATS = 20
+ROUNDS = 10
+
+
+@pytest.fixture()
+def engine(tmp_path, monkeypatch):
+    # A file database with a real connection pool: each session gets its own
+    # connection and transaction, as in production.
+    engine = create_chat_engine(f"sqlite:///{tmp_path / 'chat.db'}", get_engine_profile(PRODUCTION_PROFILE))
+    ChatBase.metadata.create_all(engine)
+    monkeypatch.setattr(db_module, "_chat_engine", engine)
+    monkeypatch.setattr(db_module, "_chat_sessionmaker", None)
+    yield engine
+    engine.dispose()
+
+
+def test_get_chat_db_opens_a_session_per_request(engine):
+    first = db_module.get_chat_db()
+    second = db_module.get_chat_db()
+    session_a, session_b = next(first), next(second)
+    assert session_a is not session_b
+    first.close()
+    second.close()
+
+
+def test_interleaved_requests_stay_isolated(engine):
+    with sessionmaker(bind=engine)() as session:
+        chats = [Chat(name=f"chat-{i}", language="en") for i in range(N_CHATS)]
+        session.add_all(chats)
+        session.commit()
+        chat_ids = [chat.id for chat in chats]
+
+    failures = []
+
+    async def worker(client, chat_id, rng):
+        for round_ in range(ROUNDS):
+            await anyio.sleep(rng.random() / 100)
+            name = f"chat-{chat_id}-round-{round_}"
+
+            # Fails validation after the name was set on the session; the
+            # change must not leak into any other request's commit.
+            response = await client.put(f"/chat/{chat_id}", json={"name": "leaked", "tags": [1]})
+            if response.status_code != 422:
+                failures.append(f"invalid update of {chat_id}: {response.status_code}")
+
+            response = await client.put(f"/chat/{chat_id}", json={"name": name})
+            if response.status_code != 200 or response.json()["name"] != name:
+                failures.append(f"update of {chat_id}: {response.status_code} {response.text}")
+
+            response = await client.post(f"/chat/{chat_id}/message")
+            if response.status_code != 200:
+                failures.append(f"add message to {chat_id}: {response.status_code} {response.text}")
+
+            response = await client.get(f"/chat/{chat_id}")
+            payload = response.json()
+            if response.status_code != 200 or payload["id"] != chat_id:
+                failures.append(f"read of {chat_id}: {response.status_code} {response.text}")
+            elif payload["name"] != name or len(payload["messages"]) != round_ + 1:
+                failures.append(f"stale read of {chat_id}: {payload['name']}, {len(payload['messages'])} messages")
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async with anyio.create_task_group() as tg:
+                for chat_id in chat_ids:
+                    tg.start_soon(worker, client, chat_id, random.Random(chat_id))
+
+    anyio.run(main)
+
+    assert failures == []
+    with sessionmaker(bind=engine)() as session:
+        assert session.scalar(select(func.count()).where(Chat.name == "leaked")) == 0
+        assert session.scalar(select(func.count()).select_from(Message)) == N_CHATS * ROUNDS
+        for chat in session.scalars(select(Chat)):
+            assert chat.name == f"chat-{chat.id}-round-{ROUNDS - 1}"
+            assert chat.message_count == ROUNDS
@@ -0,0 +1,205 @@
+import gzip
+import hashlib
+import io
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase
+from lima_gui.models.db import get_chat_db
+from lima_gui.services.chat import ChatFilter
+from lima_gui.services.jobs import Job
+from lima_gui.services.sharded_export import ExportError, ShardedExportOptions, export_shards
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    # A file database: the export job reads it from its own thread.
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    ChatBase.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def client(engine):
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def make_chat(i):
+    return {
+        "name": f"Chat {i}",
+        "lang": "en",
+        "tags": [f"group-{i % 3}"],
+        "messages": [
+            {"role": "user", "content": f"question {i} " * 20},
+            {"role": "assistant", "content": f"answer {i} " * 20},
+        ],
+        "tools": [],
+    }
+
+
+def import_chats(client, chats):
+    content = "".join(json.dumps(chat) + "\n" for chat in chats)
+    response = client.post("/import", files={"file": ("chats.jsonl", content.encode("utf-8"), "application/jsonl")})
+    assert response.json()["chats_added"] == len(chats)
+
+
+def read_shards(directory, manifest, decompress):
+    chats = []
+    for shard in manifest["shards"]:
+        data = (directory / shard["file"]).read_bytes()
+        assert len(data) == shard["bytes"]
+        assert hashlib.sha256(data).hexdigest() == shard["sha256"]
+        lines = decompress(data).decode("utf-8").splitlines()
+        assert len(lines) == shard["chats"]
+        assert sum(len(line) + 1 for line in lines) == shard["uncompressed_bytes"]
+        chats.append([json.loads(line) for line in lines])
+    return chats
+
+
+def test_shards_by_chat_count(client, engine, tmp_path):
+    chats = [make_chat(i) for i in range(25)]
+    import_chats(client, chats)
+    options = ShardedExportOptions(compression="gzip", shard_chats=10, chunk_size=4, workers=2)
+
+    manifest = export_shards(engine, str(tmp_path / "out"), options).model_dump(mode="json")
+
+    assert manifest == json.loads((tmp_path / "out" / "manifest.json").read_text())
+    assert [shard["file"] for shard in manifest["shards"]] == [
+        "lima-chats-00000.jsonl.gz", "lima-chats-00001.jsonl.gz", "lima-chats-00002.jsonl.gz"
+    ]
+    shards = read_shards(tmp_path / "out", manifest, gzip.decompress)
+    assert [len(shard) for shard in shards] == [10, 10, 5]
+    # Shards are in id order and hold the same records as /export.
+    assert [chat for shard in shards for chat in shard] == chats
+    assert manifest["chats"] == 25
+    assert manifest["bytes"] == sum(shard["bytes"] for shard in manifest["shards"])
+
+
+def test_shards_match_export_for_tools_and_tool_calls(client, engine, tmp_path):
+    tool = {"name": "search", "description": "Web search",
+            "parameters": {"type": "object", "properties": {"q": {"type": "string"}}}}
+    chats = [
+        {"name": "Tools", "lang": "en", "tags": ["b", "a", "c"], "tools": [tool], "messages": [
+            {"role": "user", "content": "find it"},
+            {"role": "assistant", "content": None, "function_call": {"name": "search", "arguments": {"q": "it"}}},
+            {"role": "function", "content": "found"},
+        ]},
+        {"name": "Parallel calls", "lang": "fr", "tags": [], "tools": [tool], "messages": [
+            {"role": "user", "content": "find both"},
+            {"role": "assistant", "content": None, "tool_calls": [
+                {"id": "call_1", "type": "function", "function": {"name": "search", "arguments": '{"q": "one"}'}},
+                {"id": "call_2", "type": "function", "function": {"name": "search", "arguments": '{"q": "two"}'}},
+            ]},
+        ]},
+        make_chat(2),
+    ]
+    import_chats(client, chats)
+    options = ShardedExportOptions(compression="gzip", chunk_size=2, workers=2)
+
+    manifest = export_shards(engine, str(tmp_path / "out"), options).model_dump(mode="json")
+
+    exported = [json.loads(line) for line in client.get("/export").text.splitlines()]
+    shards = read_shards(tmp_path / "out", manifest, gzip.decompress)
+    assert [chat for shard in shards for chat in shard] == exported
+    assert exported[0]["tags"] == ["a", "b", "c"]
+    assert len(exported[1]["messages"][1]["tool_calls"]) == 2
+
+
+def test_shards_by_size_with_zstd_and_a_filter(client, engine, tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    import_chats(client, [make_chat(i) for i in range(30)])
+    options = ShardedExportOptions(shard_bytes=300, chunk_size=1, workers=2, filter=ChatFilter(tag="group-1"))
+
+    manifest = export_shards(engine, str(tmp_path), options).model_dump(mode="json")
+
+    assert manifest["compression"] == "zstd"
+    assert manifest["filter"]["tag"] == "group-1"
+    assert len(manifest["shards"]) > 1
+    # Several chunks, i.e. several zstd frames, per shard
+    assert max(shard["chats"] for shard in manifest["shards"]) > 1
+    assert all(shard["file"].endswith(".jsonl.zst") for shard in manifest["shards"])
+    decompress = lambda data: zstandard.ZstdDecompressor().stream_reader(
+        io.BytesIO(data), read_across_frames=True
+    ).read()
+    names = [chat["name"] for shard in read_shards(tmp_path, manifest, decompress) for chat in shard]
+    assert names == [f"Chat {i}" for i in range(1, 30, 3)]
+
+
+def test_export_refuses_to_overwrite(engine, tmp_path):
+    options = ShardedExportOptions(compression="gzip", workers=1)
+    manifest = export_shards(engine, str(tmp_path), options)
+    assert (manifest.chats, manifest.shards) == (0, [])
+
+    with pytest.raises(ExportError):
+        export_shards(engine, str(tmp_path), options)
+
+
+def test_cancelled_export_writes_no_manifest(client, engine, tmp_path):
+    import_chats(client, [make_chat(i) for i in range(10)])
+    job = Job(0, "export")
+    job.cancel()
+
+    job.run(lambda job: export_shards(engine, str(tmp_path), ShardedExportOptions(chunk_size=2, workers=1), job=job))
+
+    assert job.status == Job.CANCELLED
+    assert job.processed < 10
+    assert not (tmp_path / "manifest.json").exists()
+
+
+def test_export_job_endpoint(client, tmp_path, monkeypatch):
+    monkeypatch.setattr("lima_gui.routers.jobs.get_app_data_dir", lambda: tmp_path)
+    import_chats(client, [make_chat(i) for i in range(12)])
+
+    response = client.post("/jobs/export", json={
+        "name": "export", "compression": "gzip", "shard_chats": 5, "workers": 2,
+    })
+    assert response.status_code == 200
+    job_id = response.json()["id"]
+
+    deadline = time.monotonic() + 30
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("pending", "running") or time.monotonic() > deadline:
+            break
+        time.sleep(0.02)
+
+    assert job["status"] == "completed"
+    assert job["processed"] == job["total"] == 12
+    assert [shard["chats"] for shard in job["result"]["shards"]] == [5, 5, 2]
+    assert job["params"]["shard_chats"] == 5
+    assert (tmp_path / "exports" / "export" / "manifest.json").exists()
+
+    again = client.post("/jobs/export", json={"name": "export"})
+    assert again.status_code == 400
+    assert client.post("/jobs/export", json={"compression": "gzip", "level": 12}).status_code == 422
+
+
+@pytest.mark.parametrize("name", ["", "/tmp/export", "../export", "nested/../../export", "."])
+def test_export_job_rejects_names_outside_exports_dir(client, tmp_path, monkeypatch, name):
+    monkeypatch.setattr("lima_gui.routers.jobs.get_app_data_dir", lambda: tmp_path)
+
+    response = client.post("/jobs/export", json={"name": name})
+
+    assert response.status_code == 400
+    assert not (tmp_path / "export").exists()
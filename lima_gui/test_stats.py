@@ -0,0 +1,153 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, MESSAGE_BUCKETS, TOKEN_BUCKETS
+from lima_gui.models.db import get_chat_db
+from lima_gui.services.stats import _percentiles, rebuild_chat_stats
+from lima_gui.testing import assert_max_queries
+
+
+@pytest.fixture(params=[True, False], ids=["foreign_keys", "no_foreign_keys"])
+def client_and_engine(request):
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    if request.param:
+        @event.listens_for(engine, "connect")
+        def _enable_foreign_keys(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA foreign_keys = ON")
+
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, engine
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+def create_chat(client, contents, language="en", tags=()):
+    chat_id = client.post("/chats").json()["id"]
+    client.put(f"/chat/{chat_id}", json={"language": language, "tags": list(tags)})
+    for content in contents:
+        message_id = client.post(f"/chat/{chat_id}/message").json()["id"]
+        client.put(f"/chat/{chat_id}/message/{message_id}", json={"content": content})
+    return chat_id
+
+
+def snapshot(engine):
+    with engine.connect() as connection:
+        chats = connection.execute(text(
+            "SELECT dimension, value, token_bucket, message_bucket, chats, messages, tokens "
+            "FROM chat_stats WHERE chats != 0 OR messages != 0 OR tokens != 0 ORDER BY 1, 2, 3, 4"
+        )).all()
+        roles = connection.execute(text(
+            "SELECT role, messages, tokens FROM role_stats WHERE messages != 0 OR tokens != 0 ORDER BY role"
+        )).all()
+    return chats, roles
+
+
+def assert_stats_match_rebuild(engine):
+    maintained = snapshot(engine)
+    with engine.begin() as connection:
+        rebuild_chat_stats(connection)
+    assert maintained == snapshot(engine)
+
+
+def test_triggers_keep_stats_in_sync(client_and_engine):
+    client, engine = client_and_engine
+    first = create_chat(client, ["one two three", "four five"], tags=["a", "b"])
+    second = create_chat(client, ["six"] * 5, language="fr", tags=["b"])
+    create_chat(client, [], tags=["a"])
+    assert_stats_match_rebuild(engine)
+
+    # Message edits move the chat to another token bucket
+    message_id = client.get(f"/chat/{first}").json()["messages"][0]["id"]
+    client.put(f"/chat/{first}/message/{message_id}", json={"content": " ".join(["word"] * 100)})
+    # Language and tag changes move it to other groups
+    client.put(f"/chat/{second}", json={"language": "de", "tags": ["a", "c"]})
+    message_id = client.get(f"/chat/{second}").json()["messages"][0]["id"]
+    client.delete(f"/chat/{second}/message/{message_id}")
+    assert_stats_match_rebuild(engine)
+
+    client.post("/chats/copy", json={"ids": [first, second]})
+    assert_stats_match_rebuild(engine)
+
+    client.delete(f"/chats/{first}")
+    client.post("/chats/delete", json={"filter": {"language": "de"}})
+    assert_stats_match_rebuild(engine)
+
+
+def test_import_updates_stats(client_and_engine):
+    client, engine = client_and_engine
+    lines = [
+        {"name": f"Imported {i}", "language": "es", "tags": ["imported"],
+         "messages": [{"role": "user", "content": "hola " * i}, {"role": "assistant", "content": "adios"}]}
+        for i in range(1, 20)
+    ]
+    content = "\n".join(json.dumps(line) for line in lines) + "\n"
+    client.post("/chats/upload", files={"file": ("import.jsonl", content.encode("utf-8"), "application/jsonl")})
+
+    assert_stats_match_rebuild(engine)
+    assert client.get("/stats").json()["tags"]["imported"]["chats"] == 19
+
+
+def test_stats_endpoint(client_and_engine):
+    client, engine = client_and_engine
+    create_chat(client, ["one two three", "four five"], tags=["a", "b"])
+    create_chat(client, ["six"] * 5, language="fr", tags=["b"])
+    create_chat(client, [], tags=["a"])
+
+    with assert_max_queries(engine, 2, selects_only=True):
+        stats = client.get("/stats").json()
+
+    with engine.connect() as connection:
+        messages, tokens = connection.execute(text(
+            "SELECT count(*), sum(token_count) FROM messages"
+        )).one()
+        role_counts = dict(connection.execute(text("SELECT role, count(*) FROM messages GROUP BY role")).all())
+    overall = stats["overall"]
+    assert (overall["chats"], overall["messages"], overall["tokens"]) == (3, messages, tokens)
+    assert [bucket["min"] for bucket in overall["message_histogram"]] == MESSAGE_BUCKETS
+    assert [bucket["chats"] for bucket in overall["message_histogram"]][:3] == [1, 1, 1]
+    assert sum(bucket["chats"] for bucket in overall["token_histogram"]) == 3
+    assert overall["token_histogram"][-1] == {"min": TOKEN_BUCKETS[-1], "max": None, "chats": 0}
+
+    assert sorted(stats["languages"]) == ["en", "fr"]
+    assert (stats["languages"]["en"]["chats"], stats["languages"]["en"]["messages"]) == (2, 2)
+    assert {tag: group["chats"] for tag, group in stats["tags"].items()} == {"a": 2, "b": 2}
+    assert stats["tags"]["b"]["messages"] == 7
+
+    assert {role["role"]: role["messages"] for role in stats["roles"]} == role_counts
+
+
+def test_empty_dataset(client_and_engine):
+    client, _ = client_and_engine
+    stats = client.get("/stats").json()
+    assert stats["overall"]["chats"] == 0
+    assert stats["overall"]["token_percentiles"] == {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+    assert (stats["roles"], stats["languages"], stats["tags"]) == ([], {}, {})
+
+
+def test_percentiles_interpolate_within_buckets():
+    # 10 chats in [0, 10), 10 in [10, 20), none in the open-ended [20, ...)
+    assert _percentiles([10, 10, 0], [0, 10, 20]) == {"p50": 10.0, "p90": 18.0, "p99": 19.8}
+    # The open-ended bucket only knows its lower bound
+    assert _percentiles([0, 0, 4], [0, 10, 20])["p99"] == 20.0
@@ -0,0 +1,206 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+from lima_gui.main import app
+from lima_gui.models.chat import ChatBase, Chat, Message, RoleEnum, TokenCacheEntry
+from lima_gui.models.db import get_chat_db
+from lima_gui.routers.settings import get_config_manager
+from lima_gui.services import tokenizer as tokenizer_service
+from lima_gui.services.retokenize import retokenize_messages
+from lima_gui.services.tokenizer import TokenCounter, count_tokens_cached, load_token_counter
+
+
+@pytest.fixture()
+def client_and_session():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ChatBase.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(bind=engine)
+
+    def override_get_chat_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_db] = override_get_chat_db
+
+    with TestClient(app) as test_client:
+        yield test_client, TestingSessionLocal
+
+    app.dependency_overrides.pop(get_chat_db, None)
+
+
+@pytest.fixture()
+def restore_tokenizer():
+    previous = tokenizer_service._token_counter
+    yield
+    tokenizer_service._token_counter = previous
+
+
+@pytest.fixture()
+def tokenizer_file(tmp_path):
+    # Word-level tokenizer splitting on whitespace and punctuation.
+    tokenizer = Tokenizer(WordLevel({"[UNK]": 0, "hello": 1}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    path = tmp_path / "tokenizer.json"
+    tokenizer.save(str(path))
+    return path
+
+
+class SpyCounter(TokenCounter):
+    def __init__(self):
+        self.encoded = []
+        super().__init__("spy", self._encode)
+
+    def _encode(self, texts):
+        self.encoded.extend(texts)
+        return [len(text.split()) for text in texts]
+
+
+def test_load_tokenizer_from_local_file(tokenizer_file):
+    counter = load_token_counter(str(tokenizer_file))
+    assert counter.id == str(tokenizer_file)
+    assert counter.count("hello, world!") == 4
+    assert counter.count_batch(["hello", "", None]) == [1, 0, 0]
+
+
+def test_unknown_tokenizer_falls_back_to_whitespace():
+    counter = load_token_counter("no-such-org/no-such-model")
+    assert counter.id == "whitespace"
+    assert counter.count("two words") == 2
+
+
+def test_cached_counts_are_not_retokenized(client_and_session):
+    _, session_factory = client_and_session
+    counter = SpyCounter()
+
+    with session_factory() as session:
+        _, _, counts = count_tokens_cached(session, ["a b c", "a b c", "d"], counter)
+        assert counts == [3, 3, 1]
+        assert counter.encoded == ["a b c", "d"]
+
+        _, _, counts = count_tokens_cached(session, ["d", "a b c", "e f"], counter)
+        assert counts == [1, 3, 2]
+        assert counter.encoded == ["a b c", "d", "e f"]
+        session.commit()
+
+    with session_factory() as session:
+        assert session.query(TokenCacheEntry).filter(TokenCacheEntry.tokenizer == "spy").count() == 3
+
+
+def test_unchanged_message_is_not_retokenized(client_and_session, restore_tokenizer):
+    client, session_factory = client_and_session
+    counter = SpyCounter()
+    tokenizer_service._token_counter = counter
+
+    chat_id = client.post("/chats").json()["id"]
+    message_id = client.post(f"/chat/{chat_id}/message").json()["id"]
+    client.put(f"/chat/{chat_id}/message/{message_id}", json={"content": "some unique words"})
+    assert counter.encoded == ["some unique words"]
+
+    client.put(f"/chat/{chat_id}/message/{message_id}", json={"role": "user"})
+    client.get(f"/chat/{chat_id}")
+    assert counter.encoded == ["some unique words"]
+
+    with session_factory() as session:
+        message = session.get(Message, message_id)
+        assert (message.tokenizer, message.token_count) == ("spy", 3)
+
+
+def test_tokenizer_change_invalidates_counts(client_and_session, restore_tokenizer, tokenizer_file):
+    client, session_factory = client_and_session
+    tokenizer_service.set_tokenizer("whitespace")
+
+    with session_factory() as session:
+        chat = Chat(name="Chat", language="en")
+        chat.messages.append(Message(role=RoleEnum.user, content="hello, world!", position=1))
+        session.add(chat)
+        session.commit()
+        chat_id = chat.id
+
+    assert client.get(f"/chat/{chat_id}").json()["tokens"] == 2
+
+    tokenizer_service.set_tokenizer(str(tokenizer_file))
+    assert client.get(f"/chat/{chat_id}").json()["tokens"] == 4
+
+    # Reading recounts in memory only; storing new counts is the retokenize job's.
+    with session_factory() as session:
+        message = session.query(Message).filter(Message.chat_id == chat_id).one()
+        assert message.tokenizer == "whitespace"
+        assert session.get(Chat, chat_id).token_count == 2
+
+    retokenize_messages(session_factory.kw["bind"], workers=1)
+
+    with session_factory() as session:
+        message = session.query(Message).filter(Message.chat_id == chat_id).one()
+        assert message.tokenizer == str(tokenizer_file)
+        assert session.get(Chat, chat_id).token_count == 4
+
+
+class FakeConfigManager:
+    def __init__(self, tokenizer="whitespace"):
+        self.app_config = {"tokenizer": tokenizer, "theme": "dark"}
+
+    def get_app_config(self):
+        return dict(self.app_config)
+
+    def save_app_config(self, config):
+        self.app_config = dict(config)
+
+
+@pytest.fixture()
+def settings_client(client_and_session, restore_tokenizer, monkeypatch):
+    client, _ = client_and_session
+    config_manager = FakeConfigManager()
+    started = []
+    app.dependency_overrides[get_config_manager] = lambda: config_manager
+    monkeypatch.setattr("lima_gui.routers.settings.start_retokenize_job", lambda engine: started.append(engine))
+    yield client, config_manager, started
+    app.dependency_overrides.pop(get_config_manager, None)
+
+
+@pytest.mark.parametrize("tokenizer", [None, "", "  ", "no-such-org/no-such-model", "tiktoken:no-such-encoding"])
+def test_invalid_tokenizer_setting_is_rejected(settings_client, tokenizer):
+    client, config_manager, started = settings_client
+
+    response = client.post("/settings/app", json={"tokenizer": tokenizer})
+
+    assert response.status_code == 422
+    assert config_manager.app_config["tokenizer"] == "whitespace"
+    assert started == []
+
+
+def test_tokenizer_setting_switches_tokenizer(settings_client, tokenizer_file, monkeypatch):
+    client, config_manager, started = settings_client
+    monkeypatch.delenv("LIMA_GUI_TOKENIZER")
+
+    response = client.post("/settings/app", json={"tokenizer": str(tokenizer_file)})
+
+    assert response.json() == {"status": "success"}
+    assert config_manager.app_config["tokenizer"] == str(tokenizer_file)
+    assert tokenizer_service.get_token_counter().id == str(tokenizer_file)
+    assert len(started) == 1
+
+
+def test_tokenizer_env_override_wins_over_setting(settings_client, tokenizer_file):
+    client, config_manager, started = settings_client
+    tokenizer_service.set_tokenizer("whitespace")
+
+    response = client.post("/settings/app", json={"tokenizer": str(tokenizer_file)})
+
+    assert response.status_code == 200
+    assert "LIMA_GUI_TOKENIZER" in response.json()["warning"]
+    assert config_manager.app_config["tokenizer"] == str(tokenizer_file)
+    assert tokenizer_service.get_token_counter().id == "whitespace"
+    assert started == []
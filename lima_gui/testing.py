@@ -0,0 +1,229 @@
+import json
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import uvicorn
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    """Records the SQL statements executed on an engine.
+
+    Statements are counted at the cursor level, so ORM loads, Core queries
+    and raw driver SQL are all included. Each `executemany` counts once.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.statements: List[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def start(self) -> None:
+        event.listen(self.engine, "before_cursor_execute", self._record)
+
+    def stop(self) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def selects(self) -> List[str]:
+        return [s for s in self.statements if s.lstrip().upper().startswith("SELECT")]
+
+
+@contextmanager
+def count_queries(engine: Engine) -> Iterator[QueryCounter]:
+    """Count the statements executed on `engine` inside the block."""
+    counter = QueryCounter(engine)
+    counter.start()
+    try:
+        yield counter
+    finally:
+        counter.stop()
+
+
+@contextmanager
+def assert_max_queries(engine: Engine, budget: int, selects_only: bool = False) -> Iterator[QueryCounter]:
+    """Fail if the block executes more than `budget` statements on `engine`.
+
+    Used by the tests to lock in the query budget of each endpoint, so a
+    lazy load sneaking into a request path shows up as a test failure.
+    """
+    with count_queries(engine) as counter:
+        yield counter
+    executed = counter.selects if selects_only else counter.statements
+    if len(executed) > budget:
+        listing = "\n".join(f"  {i}. {s.strip()}" for i, s in enumerate(executed, start=1))
+        raise AssertionError(f"Expected at most {budget} queries, {len(executed)} were executed:\n{listing}")
+
+
+@dataclass
+class MockCompletion:
+    """What `MockOpenAIServer` answers to one request.
+
+    Streamed content is sent a word per chunk. With `gate`, the stream
+    pauses after its first chunk until the event is set (or 10 seconds
+    pass), so tests can observe what reaches the client before the end.
+    """
+    content: str = "Hello from the mock model."
+    tool_calls: List[Dict[str, str]] = field(default_factory=list)  # {"name": ..., "arguments": ...}
+    status: int = 200
+    headers: Dict[str, str] = field(default_factory=dict)  # Sent with error statuses, e.g. Retry-After
+    delay: float = 0.0
+    gate: Optional[threading.Event] = None
+
+
+class MockOpenAIServer:
+    """A local OpenAI-compatible chat completions endpoint, for tests.
+
+    `responder` maps each request body to a `MockCompletion`; request
+    bodies are recorded in `requests`, and `max_in_flight` is the largest
+    number of requests handled at once. Use as a context manager; its
+    `api_base` property is the URL to put in the OpenAI settings.
+    """
+
+    def __init__(self, responder: Optional[Callable[[Dict[str, Any]], MockCompletion]] = None):
+        self.responder = responder or (lambda body: MockCompletion())
+        self.requests: List[Dict[str, Any]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def api_base(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "MockOpenAIServer":
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with mock._lock:
+                    mock.requests.append(body)
+                    mock.in_flight += 1
+                    mock.max_in_flight = max(mock.max_in_flight, mock.in_flight)
+                try:
+                    mock._respond(self, body, mock.responder(body))
+                finally:
+                    with mock._lock:
+                        mock.in_flight -= 1
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _send_json(
+        handler: BaseHTTPRequestHandler, status: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        payload = json.dumps(data).encode()
+        handler.send_response(status)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _respond(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any], completion: MockCompletion) -> None:
+        if completion.delay:
+            time.sleep(completion.delay)
+        if completion.status != 200:
+            error = {"message": f"Mock error {completion.status}", "type": "mock_error", "code": None}
+            self._send_json(handler, completion.status, {"error": error}, completion.headers)
+            return
+
+        finish_reason = "tool_calls" if completion.tool_calls else "stop"
+        tool_calls = [
+            {"index": i, "id": f"call_{i}", "type": "function", "function": call}
+            for i, call in enumerate(completion.tool_calls)
+        ]
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": completion.content}
+            if tool_calls:
+                message["tool_calls"] = [{k: v for k, v in call.items() if k != "index"} for call in tool_calls]
+            # Words stand in for tokens.
+            prompt_tokens = sum(len(str(m.get("content") or "").split()) for m in body["messages"])
+            completion_tokens = len(completion.content.split())
+            self._send_json(handler, 200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.end_headers()
+
+        def send(delta: Dict[str, Any], finish: Optional[str] = None) -> None:
+            chunk = {
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            handler.wfile.flush()
+
+        for i, piece in enumerate(re.findall(r"\S+\s*", completion.content)):
+            send({"role": "assistant", "content": piece} if i == 0 else {"content": piece})
+            if i == 0 and completion.gate is not None:
+                completion.gate.wait(timeout=10)
+        if tool_calls:
+            send({"tool_calls": tool_calls})
+        send({}, finish_reason)
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+
+@contextmanager
+def serve_app(app) -> Iterator[str]:
+    """Run `app` with uvicorn on a free local port and yield its base URL.
+
+    Unlike `TestClient`, which buffers whole responses, this lets tests
+    see streamed responses arrive chunk by chunk.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("The test server did not start")
+        time.sleep(0.01)
+    try:
+        yield "http://{}:{}".format(*sock.getsockname())
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        sock.close()